@@ -362,19 +362,59 @@ class BaseTransactionModelFormSet(forms.BaseModelFormSet):
                 return True
 
 
+def check_goods_and_vat(goods, vat):
+    """
+    A line must have a value.  Used by the line form and the import.
+    """
+    if goods == 0 and vat == 0:
+        raise forms.ValidationError(
+            _(
+                "Goods and Vat cannot both be zero."
+            ),
+            code="zero-value-line"
+        )
+
+
+def check_vat_type(header, vat_code):
+    """
+    Vat can only be analysed if the header says whether it is input or output.  Used by
+    the line form and the import.
+    """
+    if vat_code and not header.vat_type:
+        raise forms.ValidationError(
+            _(
+                "If you want to analyse the vat you need to state at the top of the page whether it is input or output"
+            )
+        )
+
+
+def total_lines(header, lines):
+    """
+    The total of the lines must equal the total of the header, if one is entered.  Sets
+    the goods, vat, total and due of the header from the lines.  Used by the line formset
+    and the import.
+    """
+    goods = sum(line.goods for line in lines)
+    vat = sum(line.vat for line in lines)
+    total = goods + vat
+    if header.total != 0 and header.total != total:
+        raise forms.ValidationError(
+            _(
+                "The total of the lines does not equal the total you entered."
+            ),
+            code="invalid-total"
+        )
+    header.goods = goods
+    header.vat = vat
+    header.total = total
+    header.due = header.total - header.paid
+
+
 class BaseTransactionLineForm(BaseTransactionMixin, forms.ModelForm):
 
     def clean(self):
         cleaned_data = super().clean()
-        goods = cleaned_data.get("goods")
-        vat = cleaned_data.get("vat")
-        if goods == 0 and vat == 0:
-            raise forms.ValidationError(
-                _(
-                    "Goods and Vat cannot both be zero."
-                ),
-                code="zero-value-line"
-            )
+        check_goods_and_vat(cleaned_data.get("goods"), cleaned_data.get("vat"))
 
     def save(self, commit=True):
         instance = super().save(commit=False)
@@ -426,8 +466,7 @@ class SaleAndPurchaseLineFormset(BaseLineFormset):
         super().clean()
         if(any(self.errors) or not hasattr(self, 'header')):
             return
-        goods = 0
-        vat = 0
+        lines = []
         for form in self.forms:
             # empty_permitted = False is set on forms for existing data
             # empty_permitted = True is set new forms i.e. for non existent data
@@ -439,20 +478,8 @@ class SaleAndPurchaseLineFormset(BaseLineFormset):
                     # We can't remove the assignment in the aforementioned view because the nominal app relies on this
                     form.instance.ui_goods = form.instance.goods
                     form.instance.ui_vat = form.instance.vat
-                    goods += form.instance.goods
-                    vat += form.instance.vat
-        total = goods + vat
-        if self.header.total != 0 and self.header.total != total:
-            raise forms.ValidationError(
-                _(
-                    "The total of the lines does not equal the total you entered."
-                ),
-                code="invalid-total"
-            )
-        self.header.goods = goods
-        self.header.vat = vat
-        self.header.total = total
-        self.header.due = self.header.total - self.header.paid
+                    lines.append(form.instance)
+        total_lines(self.header, lines)
 
 
 line_css_classes = {
@@ -504,12 +531,7 @@ class UserDefinedVatTypeLineForm:
 
     def clean_vat_code(self):
         vat_code = self.cleaned_data.get('vat_code')
-        if vat_code and not self.header.vat_type:
-            raise forms.ValidationError(
-                _(
-                    "If you want to analyse the vat you need to state at the top of the page whether it is input or output"
-                )
-            )
+        check_vat_type(self.header, vat_code)
         return vat_code
 
 
@@ -1131,6 +1153,30 @@ class SaleAndPurchaseVoidTransactionForm(BaseVoidTransactionForm):
         self.matches = matches
 
 
+class AgedByDaysFormMixin(forms.Form):
+    """
+    Adds the date to age at for the aged creditors and debtors reports by days.
+
+    To be mixed with the creditors and debtors forms.  The field goes on the same row
+    as the contact range and period.
+    """
+    as_at = forms.DateField(
+        label="Age as at",
+        input_formats=['%d-%m-%Y', '%Y-%m-%d'],
+        widget=forms.DateInput(format='%Y-%m-%d', attrs={"type": "date"})
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper.layout[0].append(
+            Div(
+                LabelAndFieldAndErrors(
+                    "as_at", css_class="w-100 form-control form-control-sm"),
+                css_class="col"
+            )
+        )
+
+
 def aged_matching_report_factory(
         contact_model,
         contact_creation_url,
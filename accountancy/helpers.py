@@ -1,14 +1,16 @@
 import re
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
 from functools import reduce
 from itertools import groupby
 from uuid import uuid4
 
+from controls.exceptions import MissingPeriodError
 from django import forms
 from django.contrib.auth import get_user_model
-from django.db import models, transaction
-from django.db.models import Q
+from django.db import connection, connections, models, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
 from django.urls import reverse_lazy
 from django.utils import timezone
 from more_itertools import pairwise
@@ -380,3 +382,405 @@ def sort_multiple(sequence, *sort_order):
         reversed(sort_order),
         sequence
     )
+
+
+class AgedMatchingReport:
+    """
+    Ages the outstanding transactions of a matching ledger - PL or SL - at a period.
+
+    Each header outstanding at the period is put in one of the buckets below based on the period
+    of the header.  Payment types are always unallocated.  The bucketing is done in the database
+    with conditional expressions so the rows, or the totals per contact, come straight from a
+    single query.
+
+    The rows are the same as those which used to be built per header by the
+    AgeMatchingReportMixin i.e. -
+
+        {
+            "meta": {
+                "contact_pk": 1
+            },
+            "supplier": "some supplier",
+            "date": date,
+            "due_date": date,
+            "ref": "1",
+            "total": Decimal,
+            "unallocated": 0,
+            "current": Decimal,
+            "1 month": 0,
+            "2 month": 0,
+            "3 month": 0,
+            "4 month": 0
+        }
+
+    A bucket the header does not fall into is 0 rather than Decimal 0.00.
+    """
+    buckets = [
+        # (report key, db alias)
+        ("unallocated", "unallocated"),
+        ("current", "current"),
+        ("1 month", "month_1"),
+        ("2 month", "month_2"),
+        ("3 month", "month_3"),
+        ("4 month", "month_4"),
+    ]
+
+    def __init__(self, header_model, match_model, contact_field_name):
+        self.header_model = header_model
+        self.match_model = match_model
+        self.contact_field_name = contact_field_name
+
+    def get_bucket_periods(self, period):
+        """
+        Work out the previous periods once for the whole report rather than once per header.
+        A bucket is None if the period does not exist.
+        """
+        bucket_periods = [period]
+        for i in range(1, 5):
+            try:
+                bucket_periods.append(period - i)
+            except MissingPeriodError:
+                bucket_periods.append(None)
+        return bucket_periods
+
+    def get_bucket_expressions(self, period):
+        output_field = models.DecimalField(decimal_places=2, max_digits=10)
+        payment_types = self.header_model.payment_types
+        due = F('due_at_period')
+        current, month_1, month_2, month_3, month_4 = self.get_bucket_periods(
+            period)
+        conditions = {
+            "unallocated": Q(type__in=payment_types),
+            "current": Q(period=current),
+            "month_1": Q(period=month_1) if month_1 else None,
+            "month_2": Q(period=month_2) if month_2 else None,
+            "month_3": Q(period=month_3) if month_3 else None,
+            "month_4": Q(period__fy_and_period__lte=month_4.fy_and_period) if month_4 else None,
+        }
+        expressions = {}
+        for alias, condition in conditions.items():
+            if condition is None:
+                expressions[alias] = Cast(Value(None), output_field=output_field)
+                continue
+            if alias != "unallocated":
+                condition &= ~Q(type__in=payment_types)
+            expressions[alias] = Case(
+                When(condition, then=due),
+                default=None,
+                output_field=output_field
+            )
+        return expressions
+
+    def get_headers(self, period, from_contact=None, to_contact=None):
+        contact_field_name = self.contact_field_name
+        headers = (
+            self.header_model
+            .objects
+            .exclude(status="v")
+            .filter(period__fy_and_period__lte=period.fy_and_period)
+        )
+        if from_contact:
+            headers = headers.filter(
+                **{contact_field_name + "__pk__gte": from_contact.pk})
+        if to_contact:
+            headers = headers.filter(
+                **{contact_field_name + "__pk__lte": to_contact.pk})
+        return self.match_model.annotate_due_at_period(headers, period)
+
+    def get_transactions(self, period, from_contact=None, to_contact=None):
+        contact_field_name = self.contact_field_name
+        return (
+            self.get_headers(period, from_contact, to_contact)
+            .annotate(**self.get_bucket_expressions(period))
+            .values(
+                contact_field_name,
+                contact_field_name + "__name",
+                "date",
+                "due_date",
+                "ref",
+                "total",
+                *[alias for _, alias in self.buckets]
+            )
+            .order_by(contact_field_name, "pk")
+        )
+
+    def get_contact_totals(self, period, from_contact=None, to_contact=None):
+        contact_field_name = self.contact_field_name
+        return (
+            self.get_headers(period, from_contact, to_contact)
+            .annotate(**{
+                "bucket_" + alias: expression
+                for alias, expression in self.get_bucket_expressions(period).items()
+            })
+            .values(contact_field_name, contact_field_name + "__name")
+            .annotate(
+                total=Sum("total"),
+                **{
+                    alias: Sum("bucket_" + alias)
+                    for _, alias in self.buckets
+                }
+            )
+            .order_by(contact_field_name)
+        )
+
+    def report_transaction(self, row):
+        contact_field_name = self.contact_field_name
+        report_tran = {
+            "meta": {
+                "contact_pk": row[contact_field_name]
+            },
+            contact_field_name: row[contact_field_name + "__name"],
+            "date": row["date"],
+            # JSONBlankDate just returns "" instead of the datetime when serialized.
+            # we need this because otherwise the order_objects cannot work
+            # i.e. str < date object will not work
+            "due_date": row["due_date"] or JSONBlankDate(1900, 1, 1),
+            "ref": row["ref"],
+            "total": row["total"],
+        }
+        for key, alias in self.buckets:
+            report_tran[key] = 0 if row[alias] is None else row[alias]
+        return report_tran
+
+    def report_contact_total(self, row):
+        contact_field_name = self.contact_field_name
+        report_tran = {
+            "meta": {
+                "contact_pk": row[contact_field_name]
+            },
+            contact_field_name: row[contact_field_name + "__name"],
+            "date": '',
+            "due_date": '',
+            "ref": '',
+            "total": row["total"],
+        }
+        for key, alias in self.buckets:
+            report_tran[key] = 0 if row[alias] is None else row[alias]
+        return report_tran
+
+    def is_zero(self, report_tran):
+        return not (
+            report_tran["total"]
+            or any(report_tran[key] for key, _ in self.buckets)
+        )
+
+    def transactions(self, period):
+        return [
+            self.report_transaction(row)
+            for row in self.get_transactions(period)
+        ]
+
+    def contact_totals(self, period):
+        contact_totals = [
+            self.report_contact_total(row)
+            for row in self.get_contact_totals(period)
+        ]
+        return [
+            contact_total
+            for contact_total in contact_totals
+            if not self.is_zero(contact_total)
+        ]
+
+    def iter_transactions(self, period, from_contact=None, to_contact=None, chunk_size=2000):
+        """
+        Like `transactions` but the rows are read from a server side cursor,
+        `chunk_size` at a time, so the whole report is never held in memory.
+        """
+        rows = self.get_transactions(period, from_contact, to_contact)
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield self.report_transaction(row)
+
+    def iter_contact_totals(self, period, from_contact=None, to_contact=None, chunk_size=2000):
+        rows = self.get_contact_totals(period, from_contact, to_contact)
+        for row in rows.iterator(chunk_size=chunk_size):
+            contact_total = self.report_contact_total(row)
+            if not self.is_zero(contact_total):
+                yield contact_total
+
+    def get_trend_bucket(self, periods_old, is_payment):
+        """
+        The report key of the bucket for a header `periods_old` periods before the report period
+        """
+        if is_payment:
+            return "unallocated"
+        if periods_old == 0:
+            return "current"
+        return f"{min(periods_old, 4)} month"
+
+    def trend(self, period, number_of_periods):
+        """
+        The totals of each bucket, for the whole ledger, at `period` and at each of the
+        `number_of_periods` - 1 periods before it.  Oldest period first.
+
+        Rather than run the report once per period the dues and the allocations are summed in
+        the database per header period, and the allocations also per allocation period.  The
+        periods are then swept once, latest first, adding the allocations back as we go.
+        The due of a header at a period only depends on the allocations after that period
+        so the totals for every period come from the same two queries.
+        """
+        # controls.models imports from this module
+        period_model = self.header_model._meta.get_field("period").related_model
+        periods = list(
+            period_model
+            .objects
+            .filter(fy_and_period__lte=period.fy_and_period)
+            .order_by("fy_and_period")
+        )
+        period_index = {p.pk: i for i, p in enumerate(periods)}
+        window = periods[-number_of_periods:]
+        window_indexes = [period_index[p.pk] for p in window]
+        payment_types = self.header_model.payment_types
+        headers = (
+            self.header_model
+            .objects
+            .exclude(status="v")
+            .filter(period__fy_and_period__lte=period.fy_and_period)
+        )
+        dues = {}
+        for row in headers.values("period", "type").annotate(due=Sum("due")):
+            key = (period_index[row["period"]], row["type"] in payment_types)
+            dues[key] = dues.get(key, 0) + row["due"]
+        allocations = {}
+        later_allocations = (
+            self.match_model
+            .allocation_model
+            .objects
+            .filter(header__in=headers)
+            .filter(period__fy_and_period__gt=window[0].fy_and_period)
+            .values("header__period", "header__type", "period")
+            .annotate(total=Sum("value"))
+        )
+        for row in later_allocations:
+            key = (
+                period_index[row["header__period"]],
+                row["header__type"] in payment_types
+            )
+            # allocations after `period` are all added back for every period in the window
+            allocation_index = period_index.get(row["period"], len(periods))
+            allocations_for_key = allocations.setdefault(key, {})
+            allocations_for_key[allocation_index] = (
+                allocations_for_key.get(allocation_index, 0) + row["total"]
+            )
+        trend = {
+            i: dict(
+                {"period": p, "total": 0},
+                **{key: 0 for key, _ in self.buckets}
+            )
+            for i, p in zip(window_indexes, window)
+        }
+        for (header_index, is_payment), due in dues.items():
+            allocations_for_key = allocations.get((header_index, is_payment), {})
+            due_at_period = due + sum(
+                value
+                for allocation_index, value in allocations_for_key.items()
+                if allocation_index > window_indexes[-1]
+            )
+            for i in reversed(window_indexes):
+                if header_index <= i:
+                    bucket = self.get_trend_bucket(i - header_index, is_payment)
+                    trend[i][bucket] += due_at_period
+                    trend[i]["total"] += due_at_period
+                due_at_period += allocations_for_key.get(i, 0)
+        return [trend[i] for i in window_indexes]
+
+
+class AgedMatchingDaysReport(AgedMatchingReport):
+    """
+    Ages the outstanding transactions by the number of days they are overdue at the date `as_at`,
+    rather than by period.  Which transactions are outstanding is still decided by the period.
+
+    `day_buckets` are the upper bounds of the buckets.  E.g. [30, 60, 90] gives the buckets
+    0 - 30, 31 - 60, 61 - 90 and 90+.  Transactions not yet due fall into the first bucket.
+    Transactions without a due date are aged from their date.
+    """
+
+    def __init__(self, header_model, match_model, contact_field_name, as_at, day_buckets):
+        super().__init__(header_model, match_model, contact_field_name)
+        self.as_at = as_at
+        self.day_buckets = sorted(day_buckets)
+        self.buckets = self.get_buckets()
+
+    def get_buckets(self):
+        buckets = [("unallocated", "unallocated")]
+        lower = 0
+        for i, upper in enumerate(self.day_buckets):
+            buckets.append((f"{lower} - {upper}", f"days_{i}"))
+            lower = upper + 1
+        buckets.append(
+            (f"{self.day_buckets[-1]}+", f"days_{len(self.day_buckets)}"))
+        return buckets
+
+    def get_headers(self, period, from_contact=None, to_contact=None):
+        return (
+            super()
+            .get_headers(period, from_contact, to_contact)
+            # the date the header is overdue from
+            .annotate(aged_from=Coalesce(F('due_date'), F('date')))
+        )
+
+    def get_bucket_expressions(self, period):
+        output_field = models.DecimalField(decimal_places=2, max_digits=10)
+        payment_types = self.header_model.payment_types
+        due = F('due_at_period')
+        # the earliest date for each bucket e.g. 30 days before `as_at` for 0 - 30
+        cut_offs = [
+            self.as_at - timedelta(days=days)
+            for days in self.day_buckets
+        ]
+        conditions = {"unallocated": Q(type__in=payment_types)}
+        later = None
+        for (_, alias), cut_off in zip(self.buckets[1:], cut_offs):
+            condition = Q(aged_from__gte=cut_off)
+            if later:
+                condition &= Q(aged_from__lt=later)
+            conditions[alias] = condition
+            later = cut_off
+        conditions[self.buckets[-1][1]] = Q(aged_from__lt=later)
+        expressions = {}
+        for alias, condition in conditions.items():
+            if alias != "unallocated":
+                condition &= ~Q(type__in=payment_types)
+            expressions[alias] = Case(
+                When(condition, then=due),
+                default=None,
+                output_field=output_field
+            )
+        return expressions
+
+
+def estimate_count(queryset):
+    """
+    The number of rows the planner expects `queryset` to return.  This comes from the table
+    statistics so is only an estimate but costs nothing like a COUNT on a large table.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        # QuerySet.explain returns the plan as str() of the parsed JSON, which is not JSON
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def reserve_pks(model, n):
+    """
+    `n` primary keys from the sequence of the table for `model`.  Objects given these keys
+    can refer to each other before any of them are inserted.  Postgres only.
+    """
+    if not n:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+            [model._meta.db_table, model._meta.pk.column, n]
+        )
+        return [pk for pk, in cursor.fetchall()]
+
+
+class Echo:
+    """
+    Pseudo buffer for the csv writer.  `write` returns the value rather than
+    storing it so each row can be streamed as soon as it is written.
+    """
+
+    def write(self, value):
+        return value
@@ -0,0 +1,459 @@
+"""
+Bulk import of transactions from CSV or JSON lines e.g. an export from a billing system.
+
+The browser posts one transaction at a time through the header form and line formset.
+Here the same rules are applied to a batch of transactions at once - the contacts,
+nominals, vat codes and cash books for the batch are each looked up in a single query -
+and the valid transactions are then written with a handful of bulk creates per batch,
+whatever the number of transactions.  The nominal, vat and cash book transactions come
+from the same Transaction subclasses, e.g. Invoice, the views use.
+
+Invalid transactions are reported by row and skipped.  They do not stop the rest of the
+file being imported.
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+from itertools import groupby, islice
+
+from controls.models import QueuePosts
+from django import forms
+from django.db import models, transaction
+from django.utils.dateparse import parse_date
+
+from accountancy.forms import check_goods_and_vat, check_vat_type, total_lines
+from accountancy.services import PostLinesMixin
+
+LINE_COLUMNS = ["description", "goods", "nominal", "vat_code", "vat"]
+
+
+def read_jsonl(file):
+    """
+    One transaction per line with its lines, if any, under "lines" e.g.
+
+        {"type": "pi", "supplier": "ACME", "ref": "INV1", "date": "2020-01-01", "total": 120,
+         "lines": [{"description": "widgets", "goods": 100, "nominal": "Sales", "vat_code": "1", "vat": 20}]}
+
+    Yields (row, record).  The record is None if the line is not JSON.
+    """
+    for row, text in enumerate(file, 1):
+        if isinstance(text, bytes):
+            text = text.decode("utf-8")
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text, parse_float=Decimal)
+        except ValueError:
+            record = None
+        yield row, record
+
+
+def read_csv(file):
+    """
+    One row per line of a transaction.  Consecutive rows with the same values for the header
+    columns - every column other than LINE_COLUMNS - are the lines of one transaction.  A
+    transaction without lines e.g. a payment is a single row with the line columns blank.
+
+    Yields (row, record) where row is the row of the first line counting the column names as row 1.
+    """
+    reader = csv.DictReader(file)
+
+    def header_values(numbered_row):
+        row, values = numbered_row
+        return [value for column, value in values.items() if column not in LINE_COLUMNS]
+
+    for key, rows in groupby(enumerate(reader, 2), key=header_values):
+        rows = list(rows)
+        row, first = rows[0]
+        record = {
+            column: value
+            for column, value in first.items()
+            if column not in LINE_COLUMNS
+        }
+        record["lines"] = [
+            {column: values.get(column) for column in LINE_COLUMNS}
+            for _, values in rows
+            if any(values.get(column) for column in LINE_COLUMNS)
+        ]
+        yield row, record
+
+
+def read_transactions(file, format):
+    if format == "csv":
+        return read_csv(file)
+    if format == "jsonl":
+        return read_jsonl(file)
+    raise ValueError(f"Cannot import transactions from {format}.  Use csv or jsonl.")
+
+
+def read_lines(payload, format):
+    """
+    The lines of one transaction posted together rather than a form per line.  JSON is a list
+    of lines each of which is either an object or just the values in the order of LINE_COLUMNS e.g.
+
+        [["wages", 1000, "Wages", "", 0], ["wages", -1000, "Bank Account", "", 0]]
+
+    CSV is a row per line with the column names first.  Raises ValueError if the payload
+    cannot be read.
+    """
+    if format == "json":
+        lines = json.loads(payload, parse_float=Decimal)
+        if not isinstance(lines, list):
+            raise ValueError("The lines must be a list.")
+        return [
+            dict(zip(LINE_COLUMNS, line)) if isinstance(line, list) else line
+            for line in lines
+        ]
+    if format == "csv":
+        return [
+            {column: values.get(column) for column in LINE_COLUMNS}
+            for values in csv.DictReader(io.StringIO(payload))
+        ]
+    raise ValueError(f"Cannot read lines from {format}.  Use csv or json.")
+
+
+def lookup(queryset, field, values):
+    """
+    Map each of `values` to the object with that value for `field`.  A value shared
+    by more than one object maps to None.  Values which are already objects are skipped.
+    """
+    values = {str(value) for value in values if not isinstance(value, models.Model)}
+    found = {}
+    for obj in queryset.filter(**{field + "__in": values}):
+        key = getattr(obj, field)
+        found[key] = None if key in found else obj
+    return found
+
+
+class TransactionImport(PostLinesMixin):
+    """
+    Subclass per ledger.  The attributes are the same as those of the create view for the ledger.
+
+        importer = PurchaseImport(user=user)
+        report = importer.run(read_transactions(file, "csv"))
+
+    The values are entered as they would be in the browser i.e. a credit note for 120.00 is
+    entered as 120.00 not -120.00.
+    """
+    header_model = None
+    line_model = None
+    # the form the view validates the header with.  The types and periods it allows are
+    # those allowed here.
+    header_form = None
+    header_form_kwargs = {}
+    nominal_model = None
+    nominal_transaction_model = None
+    vat_transaction_model = None
+    cash_book_transaction_model = None
+    control_nominal_name = None
+    batch_size = 1000
+
+    def __init__(self, user=None, batch_size=None):
+        self.user = user
+        if batch_size:
+            self.batch_size = batch_size
+        self.created = 0
+        self.errors = []
+
+    def run(self, records):
+        """
+        `records` are (row, record) pairs e.g. from read_transactions.  Each batch is
+        posted in its own transaction.
+        """
+        self.setup()
+        records = iter(records)
+        while batch := list(islice(records, self.batch_size)):
+            self.import_batch(batch)
+        return self.report()
+
+    def report(self):
+        return {
+            "created": self.created,
+            "errors": self.errors
+        }
+
+    def setup(self):
+        form = self.header_form(**self.header_form_kwargs)
+        self.types = {
+            code: label
+            for code, label in form.fields["type"].choices
+            if code
+        }
+        periods = list(form.fields["period"].queryset)
+        self.periods = {period.fy_and_period: period for period in periods}
+        self.periods_by_month = {
+            (period.month_start.year, period.month_start.month): period
+            for period in periods
+        }
+        self.queue_module = QueuePosts.get_module(
+            self.header_model._meta.app_label)
+        self.has_vat_type = hasattr(self.header_model, "vat_types")
+        # the amounts are limited to the digits and decimal places the model fields store,
+        # as they are in the forms
+        self.decimal_fields = {
+            "total": self.header_model._meta.get_field("total").formfield(required=False),
+            "goods": self.line_model._meta.get_field("goods").formfield(required=False),
+            "vat": self.line_model._meta.get_field("vat").formfield(required=False)
+        }
+
+    def has_perm(self, type_label):
+        if self.user is None:
+            return True
+        t = type_label.replace(" ", "_").lower()
+        return self.user.has_perm(
+            f"{self.header_model._meta.app_label}.create_{t}_transaction")
+
+    def get_lookups(self, records):
+        """
+        The objects the records in the batch refer to, each from a single query
+        """
+        lookups = {}
+        # the records with values which are not single values are rejected by validate
+        records = [record for record in records if not self.check_values(record)]
+        lines = [
+            line
+            for record in records
+            for line in record.get("lines") or []
+            if isinstance(line, dict)
+        ]
+        nominals = {line.get("nominal") for line in lines if line.get("nominal")}
+        lookups["nominal"] = lookup(
+            self.nominal_model.objects.filter(children__isnull=True), "name", nominals)
+        vat_codes = {line.get("vat_code") for line in lines if line.get("vat_code")}
+        lookups["vat_code"] = lookup(
+            self.line_model._meta.get_field("vat_code").related_model.objects, "code", vat_codes)
+        if contact_field := self.header_model.contact_field:
+            codes = {record.get(contact_field) for record in records if record.get(contact_field)}
+            lookups[contact_field] = lookup(
+                self.header_model._meta.get_field(contact_field).related_model.objects, "code", codes)
+        if hasattr(self.header_model, "cash_book"):
+            names = {record.get("cash_book") for record in records if record.get("cash_book")}
+            lookups["cash_book"] = lookup(
+                self.header_model._meta.get_field("cash_book").related_model.objects, "name", names)
+        return lookups
+
+    def import_batch(self, batch):
+        records = [record for row, record in batch if isinstance(record, dict)]
+        lookups = self.get_lookups(records)
+        valid = []
+        for row, record in batch:
+            if not isinstance(record, dict):
+                self.errors.append({
+                    "row": row,
+                    "errors": {"__all__": ["The transaction could not be read."]}
+                })
+                continue
+            header, lines, errors = self.validate(record, lookups)
+            if errors:
+                self.errors.append({
+                    "row": row,
+                    "ref": record.get("ref"),
+                    "errors": errors
+                })
+            else:
+                valid.append((header, lines))
+        if valid:
+            with transaction.atomic():
+                # queue behind the browser posts to the ledger like QueuePostsMixin
+                list(QueuePosts.objects.select_for_update().filter(module=self.queue_module))
+                self.post(valid)
+                QueuePosts.bump_version(self.queue_module)
+            self.created += len(valid)
+
+    def check_values(self, record):
+        """
+        The errors for the values of `record` which are a list or an object rather than a
+        single value, keyed as the errors of validate are.
+        """
+        errors = {}
+        for field, value in record.items():
+            if field != "lines" and isinstance(value, (list, dict)):
+                errors[field] = ["Enter a single value."]
+        lines = record.get("lines") or []
+        if not isinstance(lines, list):
+            errors["lines"] = ["Enter a list of lines."]
+            return errors
+        for i, line in enumerate(lines):
+            if isinstance(line, dict):
+                for field, value in line.items():
+                    if isinstance(value, (list, dict)):
+                        errors[f"line-{i}-{field}"] = ["Enter a single value."]
+        return errors
+
+    def get_object(self, lookups, field, value, errors, label):
+        if not value:
+            errors.setdefault(field, []).append("This field is required.")
+            return
+        if isinstance(value, models.Model):
+            # e.g. from TransactionService.create
+            return value
+        value = str(value)
+        objects = lookups[field]
+        if value not in objects:
+            errors.setdefault(field, []).append(f"No {label} '{value}' exists.")
+        elif (obj := objects[value]) is None:
+            errors.setdefault(field, []).append(f"More than one {label} is '{value}'.")
+        else:
+            return obj
+
+    def get_decimal(self, value, field, errors):
+        if value is None or value == "":
+            return Decimal(0)
+        try:
+            return self.decimal_fields[field].clean(str(value).replace(",", ""))
+        except forms.ValidationError as e:
+            errors.setdefault(field, []).extend(e.messages)
+
+    def get_date(self, value, field, errors, required=True):
+        if not value:
+            if required:
+                errors.setdefault(field, []).append("This field is required.")
+            return
+        try:
+            d = parse_date(str(value))
+        except ValueError:
+            d = None
+        if d is None:
+            errors.setdefault(field, []).append("Enter a valid date.")
+        return d
+
+    def validate(self, record, lookups):
+        """
+        The header and lines for `record`, not yet saved, and the errors if it is invalid.
+        The errors are keyed by field like those of a form.  The errors for a line are
+        keyed like those of the line formset e.g. line-0-goods.
+        """
+        header = self.header_model()
+        if errors := self.check_values(record):
+            return header, [], errors
+        t = record.get("type")
+        if t not in self.types:
+            errors["type"] = [
+                f"Select a valid choice. {t} is not one of the available choices."]
+            return header, [], errors
+        if not self.has_perm(self.types[t]):
+            errors["type"] = [
+                f"You do not have permission to create a {self.types[t].lower()}."]
+            return header, [], errors
+        header.type = t
+        ref = str(record.get("ref") or "")
+        max_length = self.header_model._meta.get_field("ref").max_length
+        if not ref:
+            errors["ref"] = ["This field is required."]
+        elif len(ref) > max_length:
+            errors["ref"] = [
+                f"Ensure this value has at most {max_length} characters (it has {len(ref)})."]
+        header.ref = ref
+        header.date = self.get_date(record.get("date"), "date", errors)
+        if hasattr(self.header_model, "due_date"):
+            header.due_date = self.get_date(
+                record.get("due_date"), "due_date", errors, required=False)
+        if period := record.get("period"):
+            header.period = self.periods.get(str(period))
+        elif header.date:
+            header.period = self.periods_by_month.get(
+                (header.date.year, header.date.month))
+        if header.period is None and (period or "date" not in errors):
+            errors["period"] = [
+                "Select a valid choice. That choice is not one of the available choices."]
+        if contact_field := self.header_model.contact_field:
+            setattr(header, contact_field, self.get_object(
+                lookups, contact_field, record.get(contact_field), errors, contact_field))
+        if hasattr(self.header_model, "cash_book"):
+            if record.get("cash_book") or self.requires_cash_book(header):
+                header.cash_book = self.get_object(
+                    lookups, "cash_book", record.get("cash_book"), errors, "cash book")
+        if self.has_vat_type:
+            vat_type = record.get("vat_type") or None
+            if vat_type and vat_type not in dict(self.header_model.vat_types):
+                errors["vat_type"] = [
+                    f"Select a valid choice. {vat_type} is not one of the available choices."]
+            header.vat_type = vat_type
+        total = self.get_decimal(record.get("total"), "total", errors)
+        if total is not None:
+            # as the header form saves it
+            header.ui_total = total
+            header.due = header.total - header.paid
+            if header.is_payment_type():
+                header.goods = header.total
+        lines = []
+        if header.requires_lines():
+            lines = self.validate_lines(header, record.get("lines") or [], lookups, errors)
+            if not lines and not errors:
+                errors["__all__"] = ["The transaction has no lines."]
+        if not errors:
+            try:
+                self.clean_totals(header, lines)
+            except forms.ValidationError as e:
+                errors["__all__"] = e.messages
+        return header, lines, errors
+
+    def requires_cash_book(self, header):
+        """
+        As the header form decides
+        """
+        field = self.header_model._meta.get_field("cash_book")
+        if not field.null:
+            return True
+        return header.is_payment_type() and header.requires_analysis()
+
+    def validate_lines(self, header, records, lookups, errors):
+        lines = []
+        max_length = self.line_model._meta.get_field("description").max_length
+        for i, record in enumerate(records):
+            line_errors = {}
+            line = self.line_model(type=header.type, line_no=i + 1)
+            if not isinstance(record, dict):
+                errors[f"line-{i}-__all__"] = ["The line could not be read."]
+                continue
+            description = str(record.get("description") or "")
+            if not description:
+                line_errors["description"] = ["This field is required."]
+            elif len(description) > max_length:
+                line_errors["description"] = [
+                    f"Ensure this value has at most {max_length} characters (it has {len(description)})."]
+            line.description = description
+            goods = self.get_decimal(record.get("goods"), "goods", line_errors)
+            vat = self.get_decimal(record.get("vat"), "vat", line_errors)
+            if goods is not None and vat is not None:
+                try:
+                    check_goods_and_vat(goods, vat)
+                except forms.ValidationError as e:
+                    line_errors["__all__"] = e.messages
+                line.ui_goods = goods
+                line.ui_vat = vat
+            # brought forward lines do not need the nominal analysis
+            if record.get("nominal") or header.requires_analysis():
+                line.nominal = self.get_object(
+                    lookups, "nominal", record.get("nominal"), line_errors, "nominal")
+            if record.get("vat_code"):
+                line.vat_code = vat_code = self.get_object(
+                    lookups, "vat_code", record.get("vat_code"), line_errors, "vat code")
+                if self.has_vat_type:
+                    try:
+                        check_vat_type(header, vat_code)
+                    except forms.ValidationError as e:
+                        line_errors.setdefault("vat_code", []).extend(e.messages)
+            for field, messages in line_errors.items():
+                errors[f"line-{i}-{field}"] = messages
+            lines.append(line)
+        return lines
+
+    def clean_totals(self, header, lines):
+        """
+        The rules of the line formset for the ledger.  Raise a forms.ValidationError
+        if the lines do not agree with the header.
+        """
+        if lines:
+            total_lines(header, lines)
+
+    def post(self, transactions):
+        """
+        `transactions` are valid (header, lines) pairs.  Every header, line and transaction
+        is written in bulk, and once, with the audit history for the headers and lines.
+        """
+        headers = [header for header, lines in transactions]
+        self.header_model.objects.audited_bulk_create(
+            headers, batch_size=self.batch_size, user=self.user)
+        self.post_lines(transactions)
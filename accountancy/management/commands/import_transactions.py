@@ -0,0 +1,60 @@
+import csv
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from accountancy.imports import read_transactions
+
+IMPORTS = {
+    "PL": "purchases.imports.PurchaseImport",
+    "SL": "sales.imports.SaleImport",
+    "NL": "nominals.imports.NominalImport",
+    "CB": "cashbook.imports.CashBookImport",
+}
+
+
+class Command(BaseCommand):
+    help = "Import transactions for a ledger from a CSV or JSON lines file.  Invalid transactions are reported and skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("module", choices=list(IMPORTS), help="The ledger e.g. PL")
+        parser.add_argument("path", help="The .csv or .jsonl file")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="The format of the file if the extension does not say"
+        )
+        parser.add_argument("--batch-size", type=int, help="The transactions posted at a time")
+        parser.add_argument("--user", help="The username the audit history is recorded against")
+
+    def handle(self, *args, **options):
+        format = options["format"] or os.path.splitext(options["path"])[1].lstrip(".").lower()
+        if format not in ("csv", "jsonl"):
+            raise CommandError("The format must be csv or jsonl.  Use --format.")
+        user = None
+        if options["user"]:
+            try:
+                user = get_user_model().objects.get(username=options["user"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user {options['user']}")
+        importer = import_string(IMPORTS[options["module"]])(
+            user=user, batch_size=options["batch_size"])
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as f:
+                report = importer.run(read_transactions(f, format))
+        except (ValueError, csv.Error) as e:
+            # the batches before the error are already posted
+            self.write_errors(importer.report())
+            raise CommandError(
+                f"The file could not be read as {format}: {e}.  {importer.created} transactions were imported before the error.")
+        self.write_errors(report)
+        self.stdout.write(
+            f"Imported {report['created']} transactions.  {len(report['errors'])} could not be imported.")
+
+    def write_errors(self, report):
+        for error in report["errors"]:
+            for field, messages in error["errors"].items():
+                for message in messages:
+                    self.stderr.write(f"row {error['row']} {field}: {message}")
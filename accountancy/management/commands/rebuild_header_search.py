@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from accountancy.models import HeaderSearch, TransactionHeader
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cross ledger search rows for the headers e.g. after a bulk load"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Only the header models given e.g. purchases.PurchaseHeader"
+        )
+
+    def handle(self, *args, **options):
+        if options["models"]:
+            header_models = [
+                apps.get_model(label) for label in options["models"]
+            ]
+        else:
+            header_models = [
+                model
+                for model in apps.get_models()
+                if issubclass(model, TransactionHeader) and model.module
+            ]
+        for header_model in header_models:
+            HeaderSearch.rebuild(header_model)
+            self.stdout.write(f"Rebuilt the search rows for {header_model._meta.label}")
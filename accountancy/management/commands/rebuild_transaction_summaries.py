@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from accountancy.models import MultiLedgerTransactions
+
+
+class Command(BaseCommand):
+    help = "Rebuild the transaction summaries the enquiries read e.g. after a bulk load"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Only the transaction models given e.g. nominals.NominalTransaction"
+        )
+
+    def handle(self, *args, **options):
+        if options["models"]:
+            transaction_models = [
+                apps.get_model(label) for label in options["models"]
+            ]
+        else:
+            transaction_models = [
+                model
+                for model in apps.get_models()
+                if issubclass(model, MultiLedgerTransactions)
+            ]
+        for transaction_model in transaction_models:
+            if transaction_model.summary_model is None:
+                continue
+            transaction_model.summary_model.rebuild(transaction_model)
+            self.stdout.write(
+                f"Rebuilt {transaction_model.summary_model._meta.label}")
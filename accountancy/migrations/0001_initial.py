@@ -0,0 +1,95 @@
+# Generated by Django 3.1.14 on 2026-10-17 11:30
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_header_search(apps, schema_editor):
+    HeaderSearch = apps.get_model('accountancy', 'HeaderSearch')
+    header_models = [
+        ('purchases', 'PurchaseHeader', 'PL', 'supplier'),
+        ('sales', 'SaleHeader', 'SL', 'customer'),
+        ('nominals', 'NominalHeader', 'NL', None),
+        ('cashbook', 'CashBookHeader', 'CB', None),
+    ]
+    for app_label, model_name, module, contact_field in header_models:
+        headers = apps.get_model(app_label, model_name).objects.exclude(status="v")
+        if contact_field:
+            headers = headers.select_related(contact_field)
+        HeaderSearch.objects.bulk_create(
+            (
+                HeaderSearch(
+                    module=module,
+                    header=header.pk,
+                    type=header.type,
+                    ref=header.ref,
+                    contact_id=getattr(header, contact_field).pk if contact_field else None,
+                    contact_code=getattr(header, contact_field).code if contact_field else "",
+                    contact_name=getattr(header, contact_field).name if contact_field else "",
+                    total=header.total,
+                    date=header.date,
+                    period_id=header.period_id
+                )
+                for header in headers.iterator()
+            ),
+            batch_size=2000
+        )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('controls', '0002_queueposts_version'),
+        ('contacts', '0002_trigram_indexes'),
+        ('purchases', '0004_trigram_indexes'),
+        ('sales', '0004_trigram_indexes'),
+        ('nominals', '0006_trigram_indexes'),
+        ('cashbook', '0003_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeaderSearch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('module', models.CharField(max_length=3)),
+                ('header', models.PositiveIntegerField()),
+                ('type', models.CharField(max_length=3)),
+                ('ref', models.CharField(max_length=20)),
+                ('contact_code', models.CharField(blank=True, max_length=10)),
+                ('contact_name', models.CharField(blank=True, max_length=100)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('date', models.DateField()),
+                ('contact', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='contacts.contact')),
+                ('period', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='controls.period')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='headersearch',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ref'], name='header_search_ref_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='headersearch',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['contact_code'], name='header_search_code_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='headersearch',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['contact_name'], name='header_search_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='headersearch',
+            index=models.Index(fields=['total'], name='header_search_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='headersearch',
+            index=models.Index(fields=['date'], name='header_search_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='headersearch',
+            constraint=models.UniqueConstraint(fields=('module', 'header'), name='header_search_unique'),
+        ),
+        migrations.RunPython(build_header_search, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,3 @@
-from itertools import groupby
 from uuid import uuid4
 
 from django.conf import settings
@@ -12,6 +11,10 @@ from accountancy.helpers import (
     get_all_historical_changes)
 from accountancy.signals import audit_post_delete
 
+# Django's bulk_update writes a CASE over every object in the batch for each field so one
+# unbounded batch gets slower per row the more rows there are
+EDIT_BATCH_SIZE = 500
+
 
 class AuditMixin:
     """
@@ -109,6 +112,16 @@ class ResponsivePaginationMixin:
         return context
 
 
+def group_by_line(nom_trans):
+    """
+    Map each line pk to the nominal transactions for the line keyed by field
+    """
+    nom_trans_by_line = {}
+    for tran in nom_trans:
+        nom_trans_by_line.setdefault(tran.line, {})[tran.field] = tran
+    return nom_trans_by_line
+
+
 class VatTransactionMixin:
     """
 
@@ -144,15 +157,23 @@ class VatTransactionMixin:
                 field="v"
             )
 
-    def create_vat_transactions(self, vat_tran_cls, **kwargs):
+    def build_vat_transactions(self, vat_tran_cls, **kwargs):
+        """
+        The vat transactions for the lines, not yet saved
+        """
         vat_transactions = []
+        for line in sorted(kwargs.get('lines') or [], key=lambda l: l.pk):
+            if (vat_transaction := self._create_vat_transaction_for_line(
+                line, vat_tran_cls
+            )):
+                vat_transactions.append(vat_transaction)
+        return vat_transactions
+
+    def create_vat_transactions(self, vat_tran_cls, **kwargs):
         if lines := kwargs.get('lines'):
             lines = sorted(lines, key=lambda l: l.pk)
-            for line in lines:
-                if (vat_transaction := self._create_vat_transaction_for_line(
-                    line, vat_tran_cls
-                )):
-                    vat_transactions.append(vat_transaction)
+            vat_transactions = self.build_vat_transactions(
+                vat_tran_cls, **kwargs)
             if vat_transactions:
                 vat_transactions = vat_tran_cls.objects.bulk_create(
                     vat_transactions)
@@ -181,47 +202,29 @@ class VatTransactionMixin:
         return vat_tran
 
     def edit_vat_transactions(self, vat_tran_cls, **kwargs):
+        new_lines = kwargs.get("new_lines") or []
+        lines_to_update = kwargs.get("lines_to_update") or []
+        deleted_lines = kwargs.get("deleted_lines") or []
+        # one to one with the line
+        existing_vat_trans = {
+            tran.line: tran for tran in kwargs.get('existing_vat_trans') or []}
+
         vat_trans_to_update = []
         vat_trans_to_delete = []
+        old_lines_without_vat_trans = []  # any old line without vat tran
 
-        existing_vat_trans = kwargs.get('existing_vat_trans')
-        existing_vat_trans = sorted(existing_vat_trans, key=lambda n: n.line)
-
-        if new_lines := kwargs.get("new_lines"):
-            sorted(new_lines, key=lambda l: l.pk)
-        # this is misleading
-        if lines_to_update := kwargs.get("lines_to_update"):
-            sorted(lines_to_update, key=lambda l: l.pk)
-        if deleted_lines := kwargs.get("deleted_lines"):
-            sorted(deleted_lines, key=lambda l: l.pk)
-
-        old_lines_without_vat_trans = [] # any old line without vat tran
-
-        if lines_to_update:
-            lines_to_update_pk = [line.pk for line in lines_to_update]
-            vat_trans_to_update = [
-                tran for tran in existing_vat_trans if tran.line in lines_to_update_pk]
-            vat_trans_to_update = sorted(
-                vat_trans_to_update, key=lambda n: n.line)
-            line_to_vat_tran_map = { tran.line: tran for tran in vat_trans_to_update }
-            # loop for through the lines instead
-            for line in lines_to_update:
-                if line.pk in line_to_vat_tran_map:
-                    vat_tran = line_to_vat_tran_map[line.pk]
-                    to_delete = self._edit_vat_transaction_for_line(
-                        vat_tran, line)
-                    if to_delete:
-                        vat_trans_to_delete.append(to_delete)
+        for line in lines_to_update:
+            if vat_tran := existing_vat_trans.get(line.pk):
+                if self._edit_vat_transaction_for_line(vat_tran, line):
+                    vat_trans_to_delete.append(vat_tran)
                 else:
-                    old_lines_without_vat_trans.append(line)
-
-        vat_trans_to_update = [
-            tran for tran in vat_trans_to_update if tran not in vat_trans_to_delete]
+                    vat_trans_to_update.append(vat_tran)
+            else:
+                old_lines_without_vat_trans.append(line)
 
-        if deleted_lines:
-            lines_to_delete = [line.pk for line in deleted_lines]
-            vat_trans_to_delete += [
-                tran for tran in existing_vat_trans if tran.line in lines_to_delete]
+        for line in deleted_lines:
+            if vat_tran := existing_vat_trans.get(line.pk):
+                vat_trans_to_delete.append(vat_tran)
 
         line_cls = kwargs.get('line_cls')
         self.create_vat_transactions(
@@ -229,7 +232,8 @@ class VatTransactionMixin:
             line_cls=line_cls,
             lines=new_lines + old_lines_without_vat_trans,
         )
-        vat_tran_cls.objects.bulk_update(vat_trans_to_update)
+        vat_tran_cls.objects.bulk_update(
+            vat_trans_to_update, batch_size=EDIT_BATCH_SIZE)
         vat_tran_cls.objects.filter(
             pk__in=[tran.pk for tran in vat_trans_to_delete]).delete()
 
@@ -240,11 +244,11 @@ class BaseNominalTransactionMixin:
         if (vat_nominal := kwargs.get("vat_nominal")) is None:
             try:
                 vat_nominal_name = kwargs.get('vat_nominal_name')
-                vat_nominal = nom_cls.objects.get(name=vat_nominal_name)
+                vat_nominal = nom_cls.get_system_nominal(vat_nominal_name)
             except nom_cls.DoesNotExist:
                 # bult into system so cannot not exist
-                vat_nominal = nom_cls.objects.get(
-                    name=settings.DEFAULT_SYSTEM_SUSPENSE)
+                vat_nominal = nom_cls.get_system_nominal(
+                    settings.DEFAULT_SYSTEM_SUSPENSE)
         return vat_nominal
 
     @classmethod
@@ -252,12 +256,12 @@ class BaseNominalTransactionMixin:
         if (control_nominal := kwargs.get("control_nominal")) is None:
             try:
                 control_nominal_name = kwargs.get('control_nominal_name')
-                control_nominal = nom_cls.objects.get(
-                    name=control_nominal_name)
+                control_nominal = nom_cls.get_system_nominal(
+                    control_nominal_name)
             except nom_cls.DoesNotExist:
                 # bult into system so cannot not exist
-                control_nominal = nom_cls.objects.get(
-                    name=settings.DEFAULT_SYSTEM_SUSPENSE)
+                control_nominal = nom_cls.get_system_nominal(
+                    settings.DEFAULT_SYSTEM_SUSPENSE)
         return control_nominal
 
 
@@ -298,28 +302,34 @@ class BaseNominalTransactionPerLineMixin:
             )
         return trans
 
-    def create_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
+    def build_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
+        """
+        The nominal transactions for the lines, not yet saved
+        """
         vat_nominal = self.get_vat_nominal(nom_cls, **kwargs)
         nominal_transactions = []
-        if lines := kwargs.get('lines'):
-            lines = sorted(lines, key=lambda l: l.pk)
-        for line in lines:
+        for line in sorted(kwargs.get('lines') or [], key=lambda l: l.pk):
             args = [nom_tran_cls, line, vat_nominal]
             if control_nominal := kwargs.get("control_nominal"):
                 args.append(control_nominal)
             nominal_transactions += self._create_nominal_transactions_for_line(
                 *args)
+        return nominal_transactions
+
+    def create_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
+        if lines := kwargs.get('lines'):
+            lines = sorted(lines, key=lambda l: l.pk)
+        nominal_transactions = self.build_nominal_transactions(
+            nom_cls, nom_tran_cls, **kwargs)
         if nominal_transactions:
             nominal_transactions = nom_tran_cls.objects.bulk_create(
                 nominal_transactions)
             nominal_transactions = sorted(
                 nominal_transactions, key=lambda n: n.line)
-
-            def line_key(n): return n.line
-            for line, (key, line_nominal_trans) in zip(lines, groupby(nominal_transactions, line_key)):
-                nom_tran_map = {
-                    tran.field: tran for tran in list(line_nominal_trans)}
-                line.add_nominal_transactions(nom_tran_map)
+            nom_trans_by_line = group_by_line(nominal_transactions)
+            for line in lines:
+                line.add_nominal_transactions(
+                    nom_trans_by_line.get(line.pk, {}))
             line_cls = kwargs.get('line_cls')
             fields_to_update = [
                 'goods_nominal_transaction', 'vat_nominal_transaction']
@@ -358,50 +368,39 @@ class BaseNominalTransactionPerLineMixin:
 
     def edit_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
         vat_nominal = self.get_vat_nominal(nom_cls, **kwargs)
-        existing_nom_trans = kwargs.get('existing_nom_trans')
-        existing_nom_trans = sorted(existing_nom_trans, key=lambda n: n.line)
+        control_nominal = kwargs.get("control_nominal")
+        new_lines = kwargs.get("new_lines")
+        lines_to_update = kwargs.get("lines_to_update") or []
+        deleted_lines = kwargs.get("deleted_lines") or []
+        existing_nom_trans = group_by_line(
+            kwargs.get('existing_nom_trans') or [])
         nom_trans_to_update = []
         nom_trans_to_delete = []
-        if new_lines := kwargs.get("new_lines"):
-            sorted(new_lines, key=lambda l: l.pk)
-        if lines_to_update := kwargs.get("lines_to_update"):
-            sorted(lines_to_update, key=lambda l: l.pk)
-        if deleted_lines := kwargs.get("deleted_lines"):
-            sorted(deleted_lines, key=lambda l: l.pk)
-        if lines_to_update:
-            lines_to_update_pk = [line.pk for line in lines_to_update]
-            nom_trans_to_update = [
-                tran for tran in existing_nom_trans if tran.line in lines_to_update_pk]
-            nom_trans_to_update = sorted(
-                nom_trans_to_update, key=lambda n: n.line)
-            for line, (key, line_nominal_trans) in zip(lines_to_update, groupby(nom_trans_to_update, key=lambda n: n.line)):
-                nom_tran_map = {
-                    tran.field: tran for tran in list(line_nominal_trans)}
+        for line in lines_to_update:
+            if nom_tran_map := existing_nom_trans.get(line.pk):
                 args = [nom_tran_map, line, vat_nominal]
-                if control_nominal := kwargs.get("control_nominal"):
+                if control_nominal:
                     args.append(control_nominal)
                 to_update, to_delete = self._edit_nominal_transactions_for_line(
                     *args)
+                nom_trans_to_update += to_update
                 nom_trans_to_delete += to_delete
-        nom_trans_to_update = [
-            tran for tran in nom_trans_to_update if tran not in nom_trans_to_delete]
-        if deleted_lines:
-            lines_to_delete = [line.pk for line in deleted_lines]
-            nom_trans_to_delete += [
-                tran for tran in existing_nom_trans if tran.line in lines_to_delete]
+        for line in deleted_lines:
+            nom_trans_to_delete += existing_nom_trans.get(line.pk, {}).values()
         line_cls = kwargs.get('line_cls')
         create_kwargs = {
             "line_cls": line_cls,
             "lines": new_lines,
             "vat_nominal": vat_nominal
         }
-        if control_nominal := kwargs.get("control_nominal"):
+        if control_nominal:
             create_kwargs.update({
                 "control_nominal": control_nominal
             })
         self.create_nominal_transactions(
             nom_cls, nom_tran_cls, **create_kwargs)
-        nom_tran_cls.objects.bulk_update(nom_trans_to_update)
+        nom_tran_cls.objects.bulk_update(
+            nom_trans_to_update, batch_size=EDIT_BATCH_SIZE)
         nom_tran_cls.objects.filter(
             pk__in=[tran.pk for tran in nom_trans_to_delete]).delete()
 
@@ -469,6 +468,10 @@ class ControlAccountInvoiceTransactionMixin(BaseNominalTransactionPerLineMixin,
             )
         return trans
 
+    def build_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
+        kwargs["control_nominal"] = self.get_control_nominal(nom_cls, **kwargs)
+        return super().build_nominal_transactions(nom_cls, nom_tran_cls, **kwargs)
+
     def create_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
         control_nominal = self.get_control_nominal(nom_cls, **kwargs)
         kwargs.update({
@@ -539,9 +542,17 @@ class CashBookEntryMixin:
     """
 
     def create_cash_book_entry(self, cash_book_tran_cls, **kwargs):
+        if cash_book_tran := self.build_cash_book_entry(cash_book_tran_cls, **kwargs):
+            cash_book_tran.save()
+            return cash_book_tran
+
+    def build_cash_book_entry(self, cash_book_tran_cls, **kwargs):
+        """
+        The cash book transaction, not yet saved, if there is one
+        """
         if self.header_obj.total != 0:
             f = self.header_obj.cashbook_transaction_factor
-            return cash_book_tran_cls.objects.create(
+            return cash_book_tran_cls(
                 module=self.module,
                 header=self.header_obj.pk,
                 line=1,
@@ -580,6 +591,10 @@ class CashBookPaymentTransactionMixin(CashBookEntryMixin, ControlAccountInvoiceT
     the cash book or not, which should update the cash book.
     """
 
+    def build_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
+        kwargs["control_nominal"] = self.header_obj.cash_book.nominal
+        return super().build_nominal_transactions(nom_cls, nom_tran_cls, **kwargs)
+
     def create_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
         kwargs["control_nominal"] = self.header_obj.cash_book.nominal
         return super().create_nominal_transactions(nom_cls, nom_tran_cls, **kwargs)
@@ -591,10 +606,17 @@ class CashBookPaymentTransactionMixin(CashBookEntryMixin, ControlAccountInvoiceT
 
 class ControlAccountPaymentTransactionMixin(BaseNominalTransactionMixin):
     def create_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
+        if nom_trans := self.build_nominal_transactions(nom_cls, nom_tran_cls, **kwargs):
+            return nom_tran_cls.objects.bulk_create(nom_trans)
+
+    def build_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
+        """
+        The bank and control account nominal transactions, not yet saved
+        """
+        nom_trans = []
         if self.header_obj.total != 0:
             f = self.header_obj.get_nominal_transaction_factor()
             control_nominal = self.get_control_nominal(nom_cls, **kwargs)
-            nom_trans = []
             # create the bank entry first.  line = 1
             nom_trans.append(
                 nom_tran_cls(
@@ -625,7 +647,7 @@ class ControlAccountPaymentTransactionMixin(BaseNominalTransactionMixin):
                     field="t"
                 )
             )
-            return nom_tran_cls.objects.bulk_create(nom_trans)
+        return nom_trans
 
     def edit_nominal_transactions(self, nom_cls, nom_tran_cls, **kwargs):
         nom_trans = nom_tran_cls.objects.filter(module=self.module,
@@ -1,10 +1,14 @@
 from datetime import date
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from itertools import groupby
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Q
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import models, transaction
+from django.db.models import (Case, ExpressionWrapper, F, OuterRef, Q,
+                              Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce, Greatest
 from controls.models import Period
 from simple_history.utils import (bulk_create_with_history,
                                   bulk_update_with_history)
@@ -48,6 +52,35 @@ class AuditQuerySet(models.QuerySet):
         return bulk_update_with_history(objs, self.model, fields, batch_size=batch_size, default_user=user)
 
 
+class TransactionHeaderQuerySet(AuditQuerySet):
+    """
+    The bulk writes also update the search rows, see HeaderSearch, of the headers written.
+    The audited bulk writes go through these too.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            objs = super().bulk_create(objs, *args, **kwargs)
+            HeaderSearch.index_headers(self.model, objs)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        with transaction.atomic():
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            # e.g. matching only changes what is paid and due
+            if HeaderSearch.depends_on(self.model, fields):
+                HeaderSearch.index_headers(self.model, objs)
+        return updated
+
+    def delete(self):
+        with transaction.atomic():
+            HeaderSearch.objects.filter(
+                module=self.model.module,
+                header__in=self.values("pk")
+            ).delete()
+            return super().delete()
+
+
 class Transaction:
     """
     This is not a model nor a model mixin.  Rather subclasses should encapsulate the
@@ -105,6 +138,18 @@ class Transaction:
     def edit_cash_book_entry(self, *args, **kwargs):
         pass
 
+    # the build methods return the objects the create methods would save, unsaved,
+    # so transactions can be written in bulk for many headers at once
+
+    def build_nominal_transactions(self, *args, **kwargs):
+        return []
+
+    def build_vat_transactions(self, *args, **kwargs):
+        return []
+
+    def build_cash_book_entry(self, *args, **kwargs):
+        pass
+
 
 class TransactionBase:
     def is_negative_type(self):
@@ -172,10 +217,15 @@ class TransactionHeader(AuditMixin, TransactionBase, models.Model):
     lines_required = None
     payment_types = None
 
+    # e.g. 'PL'.  Headers of a module are included in the cross ledger search.
+    module = None
+    # the foreign key to the contact, if there is one, e.g. 'supplier'
+    contact_field = None
+
     class Meta:
         abstract = True
 
-    objects = AuditQuerySet.as_manager()
+    objects = TransactionHeaderQuerySet.as_manager()
 
     def __init_subclass__(cls):
         super().__init_subclass__()
@@ -216,6 +266,21 @@ class TransactionHeader(AuditMixin, TransactionBase, models.Model):
                 "Transaction headers must specify the types which are payment types i.e. will update the cashbook.  If there are none define as an empty list."
             )
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not HeaderSearch.depends_on(self._meta.model, update_fields):
+            # e.g. matching only changes what is paid and due
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            HeaderSearch.index_headers(self._meta.model, [self])
+
+    def delete(self):
+        with transaction.atomic():
+            HeaderSearch.objects.filter(
+                module=self.module, header=self.pk).delete()
+            super().delete()
+
     def get_nominal_transaction_factor(self):
         """
 
@@ -350,6 +415,77 @@ class TransactionLine(AuditMixin, TransactionBase, models.Model):
             return False
 
 
+class MatchedHeadersAllocation(models.Model):
+    """
+    Subclass must add the header foreign key
+
+    The matching of a header summarised per period.  `value` is the amount which is added back to the due
+    of the header if the matches in that period are undone.  So for each match the matched_to header
+    gets +value and the matched_by header gets -value (see MatchedHeaders).
+
+    The due of a header as it was at period P is therefore -
+
+        header.due + the sum of the allocation values for the periods after P
+
+    The rows for a header are rebuilt from the matching table whenever a match for that header is created,
+    edited or deleted.  Do not create or update the rows directly.
+    """
+    period = models.ForeignKey(Period, on_delete=models.CASCADE)
+    value = models.DecimalField(
+        decimal_places=2,
+        max_digits=10,
+        default=0
+    )
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def rebuild_for_headers(cls, match_model, header_pks):
+        """
+        To be called by the subclass so cls is the subclass
+        """
+        header_pks = set(header_pks)
+        cls.objects.filter(header__in=header_pks).delete()
+        matches = match_model.objects.filter(period__isnull=False)
+        matched_to = (
+            matches
+            .filter(matched_to__in=header_pks)
+            .values('matched_to', 'period')
+            .annotate(total=Sum('value'))
+        )
+        matched_by = (
+            matches
+            .filter(matched_by__in=header_pks)
+            .values('matched_by', 'period')
+            .annotate(total=Sum('value'))
+        )
+        allocations = {}
+        for match in matched_to:
+            key = (match["matched_to"], match["period"])
+            allocations[key] = allocations.get(key, 0) + match["total"]
+        for match in matched_by:
+            key = (match["matched_by"], match["period"])
+            allocations[key] = allocations.get(key, 0) - match["total"]
+        cls.objects.bulk_create([
+            cls(header_id=header, period_id=period, value=value)
+            for (header, period), value in allocations.items()
+            if value != 0
+        ])
+
+    @classmethod
+    def rebuild(cls, match_model):
+        """
+        Rebuild the rows for every header which has been matched
+        """
+        headers = set()
+        for matched_by, matched_to in match_model.objects.values_list('matched_by', 'matched_to'):
+            headers.add(matched_by)
+            headers.add(matched_to)
+        cls.objects.all().delete()
+        cls.rebuild_for_headers(match_model, headers)
+
+
 class MatchedHeaders(AuditMixin, models.Model):
     """
     Subclass must add the transaction_1 and transaction_2 foreign keys
@@ -449,6 +585,32 @@ class MatchedHeaders(AuditMixin, models.Model):
 
     objects = AuditQuerySet.as_manager()
 
+    # subclass should set this to the MatchedHeadersAllocation subclass for the ledger
+    allocation_model = None
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.update_allocations([self])
+
+    def delete(self):
+        super().delete()
+        self.update_allocations([self])
+
+    @classmethod
+    def update_allocations(cls, matches):
+        """
+        Bulk creates, updates and deletes of matches do not call save or delete so
+        this must be called afterwards with the matches which were changed.
+        """
+        if cls.allocation_model is None:
+            return
+        header_pks = set()
+        for match in matches:
+            header_pks.add(match.matched_by_id)
+            header_pks.add(match.matched_to_id)
+        if header_pks:
+            cls.allocation_model.rebuild_for_headers(cls, header_pks)
+
     @staticmethod
     def show_match_in_UI(tran_being_being_edited_or_created=None, match=None):
         if not match:
@@ -481,30 +643,165 @@ class MatchedHeaders(AuditMixin, models.Model):
         """
         To be called by the subclass so cls is the subclass
         """
-        matches = (cls.objects
-                   .filter(period__gt=period)
-                   .filter(
-                       Q(matched_by__in=headers) | Q(matched_to__in=headers)
-                   ))
+        allocations = (
+            cls.allocation_model
+            .objects
+            .filter(period__fy_and_period__gt=period.fy_and_period)
+            .filter(header__in=headers)
+            .values('header')
+            .annotate(total=Sum('value'))
+        )
+        later_allocations = {
+            allocation["header"]: allocation["total"]
+            for allocation in allocations
+        }
+        for header in headers:
+            header.due += later_allocations.get(header.pk, 0)
+        return [header for header in headers if header.due != 0]
 
-        matches_for_header = {}
-        for match in matches:
-            if match.matched_by_id not in matches_for_header:
-                matches_for_header[match.matched_by_id] = []
-            matches_for_header[match.matched_by_id].append(match)
-            if match.matched_to_id not in matches_for_header:
-                matches_for_header[match.matched_to_id] = []
-            matches_for_header[match.matched_to_id].append(match)
+    @classmethod
+    def annotate_due_at_period(cls, headers, period):
+        """
+        The database equivalent of get_not_fully_matched_at_period.
 
-        for header in headers:
-            if header.pk in matches_for_header:
-                for match in matches_for_header[header.pk]:
-                    if match.matched_to == header:
-                        header.due += match.value
-                    else:
-                        header.due -= match.value
+        `headers` is a queryset of the header model.  Each header is annotated with
+        `due_at_period` which is the due as it was at `period`.  That is to say the matches
+        made in a later period are added back to the due in the same way as above, except
+        they are read from the allocation table rather than replayed.
+        Headers not outstanding at `period` are excluded.
+        """
+        later_allocations = (
+            cls.allocation_model
+            .objects
+            .filter(period__fy_and_period__gt=period.fy_and_period)
+            .filter(header=OuterRef('pk'))
+            .values('header')
+            .annotate(total=Sum('value'))
+            .values('total')
+        )
+        return (
+            headers
+            .annotate(
+                due_at_period=ExpressionWrapper(
+                    F('due')
+                    + Coalesce(Subquery(later_allocations), Value(0)),
+                    output_field=models.DecimalField(
+                        decimal_places=2, max_digits=10)
+                )
+            )
+            .exclude(due_at_period=0)
+        )
 
-        return [header for header in headers if header.due != 0]
+
+class MultiLedgerTransactionQuerySet(NonAuditQuerySet):
+    """
+    The bulk writes also rebuild the summary rows, see TransactionSummary, for the headers
+    of the transactions written.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self.model.update_summaries(
+                {(obj.module, obj.header) for obj in objs}
+            )
+        return objs
+
+    def bulk_update(self, objs, batch_size=None):
+        with transaction.atomic():
+            updated = super().bulk_update(objs, batch_size=batch_size)
+            self.model.update_summaries(
+                {(obj.module, obj.header) for obj in objs}
+            )
+        return updated
+
+    def delete(self):
+        with transaction.atomic():
+            headers = set(self.order_by().values_list("module", "header").distinct())
+            deleted = super().delete()
+            self.model.update_summaries(headers)
+        return deleted
+
+
+class TransactionSummary(models.Model):
+    """
+    Subclass must add the fields in `grain` and `sums`
+
+    The transactions of a ledger - nominal, vat or cash book - summed at the grain the
+    enquiry for the ledger shows i.e. one row per header and whatever else the enquiry
+    groups by.  The enquiry is then a plain scan of this table rather than a GROUP BY over
+    every transaction.
+
+    The rows for a header are rebuilt from the transactions whenever the transactions for
+    the header are created, edited or deleted.  Do not create or update the rows directly.
+    """
+    module = models.CharField(max_length=3)
+    header = models.PositiveIntegerField()
+    ref = models.CharField(max_length=100)
+    period = models.ForeignKey(Period, on_delete=models.SET_NULL, null=True)
+    date = models.DateField()
+
+    # the fields of the transaction, besides those above, the rows are grouped by
+    grain = []
+    # summary field: transaction field summed
+    sums = {}
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def summarise(cls, transactions):
+        """
+        To be called by the subclass so cls is the subclass
+        """
+        group_by = ["module", "header", "ref", "period", "date"] + cls.grain
+        rows = (
+            transactions
+            .values(*group_by)
+            .annotate(**{
+                # the summary field may have the same name as the transaction field
+                "sum_" + field: Sum(transaction_field)
+                for field, transaction_field in cls.sums.items()
+            })
+            .order_by()
+        )
+        for row in rows.iterator():
+            summary = cls(**{
+                cls._meta.get_field(field).attname: row[field]
+                for field in group_by
+            })
+            for field in cls.sums:
+                setattr(summary, field, row["sum_" + field])
+            yield summary
+
+    @classmethod
+    def rebuild_for_headers(cls, transaction_model, headers):
+        """
+        `headers` are (module, header) pairs
+        """
+        headers_by_module = {}
+        for module, header in headers:
+            headers_by_module.setdefault(module, set()).add(header)
+        if not headers_by_module:
+            return
+        q = Q()
+        for module, module_headers in headers_by_module.items():
+            q |= Q(module=module, header__in=module_headers)
+        cls.objects.filter(q).delete()
+        cls.objects.bulk_create(
+            list(cls.summarise(transaction_model.objects.filter(q))))
+
+    @classmethod
+    def rebuild(cls, transaction_model, batch_size=2000):
+        """
+        Rebuild the rows for every header
+        """
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                cls.summarise(transaction_model.objects.all()),
+                batch_size=batch_size
+            )
 
 
 class MultiLedgerTransactions(models.Model):
@@ -542,9 +839,193 @@ class MultiLedgerTransactions(models.Model):
                 fields=['module', 'header', 'line', 'field'], name="unique_batch")
         ]
 
-    objects = NonAuditQuerySet.as_manager()
+    objects = MultiLedgerTransactionQuerySet.as_manager()
+
+    # subclass should set this to the TransactionSummary subclass for the ledger
+    summary_model = None
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.update_summaries([(self.module, self.header)])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            self.update_summaries([(self.module, self.header)])
+        return deleted
+
+    @classmethod
+    def update_summaries(cls, headers):
+        if cls.summary_model is None:
+            return
+        cls.summary_model.rebuild_for_headers(cls, headers)
 
     def update_details_from_header(self, header):
         self.ref = header.ref
         self.period = header.period
-        self.date = header.date
\ No newline at end of file
+        self.date = header.date
+
+
+class HeaderSearch(models.Model):
+    """
+    One row for every header, other than voids, of every ledger so a reference, contact or
+    amount can be found across the ledgers with one query.
+
+    The rows for headers are replaced whenever the headers are saved, bulk created or bulk
+    updated, and deleted when the headers are voided or deleted.  Do not create or update
+    the rows directly.
+    """
+    module = models.CharField(max_length=3)
+    header = models.PositiveIntegerField()
+    type = models.CharField(max_length=3)
+    ref = models.CharField(max_length=20)
+    contact = models.ForeignKey(
+        'contacts.Contact', on_delete=models.SET_NULL, null=True, related_name="+")
+    contact_code = models.CharField(max_length=10, blank=True)
+    contact_name = models.CharField(max_length=100, blank=True)
+    total = models.DecimalField(
+        decimal_places=2, max_digits=10, null=True)
+    date = models.DateField()
+    period = models.ForeignKey(Period, on_delete=models.SET_NULL, null=True)
+
+    # the fields of the header the row depends on
+    header_fields = ["type", "ref", "total", "date", "period", "status"]
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['module', 'header'], name="header_search_unique")
+        ]
+        indexes = [
+            GinIndex(fields=["ref"], opclasses=["gin_trgm_ops"],
+                     name="header_search_ref_trgm_idx"),
+            GinIndex(fields=["contact_code"], opclasses=["gin_trgm_ops"],
+                     name="header_search_code_trgm_idx"),
+            GinIndex(fields=["contact_name"], opclasses=["gin_trgm_ops"],
+                     name="header_search_name_trgm_idx"),
+            models.Index(fields=["total"], name="header_search_total_idx"),
+            models.Index(fields=["date"], name="header_search_date_idx"),
+        ]
+
+    @classmethod
+    def from_header(cls, header, contact=None):
+        return cls(
+            module=header.module,
+            header=header.pk,
+            type=header.type,
+            ref=header.ref,
+            contact=contact,
+            contact_code=contact.code if contact else "",
+            contact_name=contact.name if contact else "",
+            total=header.total,
+            date=header.date,
+            period_id=header.period_id
+        )
+
+    @classmethod
+    def depends_on(cls, header_model, fields):
+        """
+        Whether the rows for headers of `header_model` depend on any of `fields`, which
+        may be names or attnames
+        """
+        fields = {header_model._meta.get_field(field).name for field in fields}
+        return bool(
+            fields & set(cls.header_fields)
+            or header_model.contact_field in fields
+        )
+
+    @classmethod
+    def index_headers(cls, header_model, headers):
+        """
+        Replace the rows for `headers`, all instances of `header_model`
+        """
+        if header_model.module is None:
+            return
+        cls.objects.filter(
+            module=header_model.module,
+            header__in=[header.pk for header in headers]
+        ).delete()
+        headers = [header for header in headers if not header.is_void()]
+        contacts = {}
+        contact_attname = None
+        if header_model.contact_field:
+            contact_field = header_model._meta.get_field(
+                header_model.contact_field)
+            contact_attname = contact_field.attname
+            contacts = contact_field.related_model.objects.in_bulk(
+                {getattr(header, contact_attname) for header in headers}
+            )
+        cls.objects.bulk_create([
+            cls.from_header(
+                header,
+                contacts.get(getattr(header, contact_attname)) if contact_attname else None
+            )
+            for header in headers
+        ])
+
+    @classmethod
+    def rebuild(cls, header_model, batch_size=2000):
+        """
+        Rebuild the rows for every header of `header_model`
+        """
+        if header_model.module is None:
+            return
+        headers = header_model.objects.exclude(status="v")
+        if header_model.contact_field:
+            headers = headers.select_related(header_model.contact_field)
+        with transaction.atomic():
+            cls.objects.filter(module=header_model.module).delete()
+            cls.objects.bulk_create(
+                (
+                    cls.from_header(
+                        header,
+                        getattr(header, header_model.contact_field)
+                        if header_model.contact_field else None
+                    )
+                    for header in headers.iterator()
+                ),
+                batch_size=batch_size
+            )
+
+    @classmethod
+    def update_contact(cls, contact):
+        cls.objects.filter(contact=contact).update(
+            contact_code=contact.code, contact_name=contact.name)
+
+    @classmethod
+    def search(cls, q):
+        """
+        Rows where the reference or contact is like `q`, or the total is `q` if it is an amount,
+        ranked with the closest first.  The trigram candidates come from the trigram indexes.
+        """
+        match = (
+            Q(ref__trigram_similar=q) |
+            Q(contact_code__trigram_similar=q) |
+            Q(contact_name__trigram_similar=q)
+        )
+        rank = Greatest(
+            TrigramSimilarity("ref", q),
+            TrigramSimilarity("contact_code", q),
+            TrigramSimilarity("contact_name", q)
+        )
+        try:
+            amount = Decimal(q.replace(",", ""))
+        except InvalidOperation:
+            amount = None
+        # too big for the total field
+        if amount is not None and amount.is_finite() and abs(amount) < 10 ** 8:
+            # credit notes and payments are saved as negatives
+            amounts = [amount, -amount]
+            match |= Q(total__in=amounts)
+            rank = rank + Case(
+                When(total__in=amounts, then=Value(1.0)),
+                default=Value(0.0),
+                output_field=models.FloatField()
+            )
+        return (
+            cls.objects
+            .filter(match)
+            .annotate(rank=rank)
+            .order_by("-rank", "-date", "-pk")
+        )
@@ -0,0 +1,315 @@
+"""
+Posting transactions without forms.
+
+The create and edit views validate what is entered in the browser with the header form and the
+line and match formsets.  They then hand the header, lines and matches to the TransactionService
+for the ledger which posts them i.e. saves them along with the nominal, vat and cash book
+transactions.  A batch job or a worker can post the same way without building forms -
+
+    service = PurchaseService(user=user)
+    header = service.create({
+        "type": "pi",
+        "supplier": "ACME",
+        "ref": "INV1",
+        "date": "2020-01-01",
+        "total": 120,
+        "lines": [
+            {"description": "widgets", "goods": 100, "nominal": "Sales", "vat_code": "1", "vat": 20}
+        ]
+    })
+
+The data is validated with the same rules as the import for the ledger, see accountancy.imports,
+and a ValidationError keyed by field is raised if it is invalid.  Or, if the objects are already
+valid, post them directly with create_transaction and edit_transaction.
+"""
+from controls.models import QueuePosts
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from accountancy.helpers import bulk_delete_with_history, reserve_pks
+
+
+class PostLinesMixin:
+    """
+    Writes the lines of saved headers along with the nominal, vat and cash book transactions
+    for the headers.
+
+    The keys of the lines and the transactions are reserved from their sequences first.  So each
+    line is inserted once already pointing at its transactions.  Otherwise each line would be
+    inserted, then updated once its transactions exist, writing two audit history rows rather
+    than one.
+    """
+    batch_size = None
+
+    def get_nominal_transaction_kwargs(self):
+        kwargs = {
+            "line_cls": self.line_model,
+            "vat_nominal_name": settings.DEFAULT_VAT_NOMINAL,
+        }
+        if self.control_nominal_name:
+            kwargs["control_nominal_name"] = self.control_nominal_name
+        return kwargs
+
+    def post_lines(self, transactions, cash_book_entries=True):
+        """
+        `transactions` are (header, lines) pairs where the header is saved and the lines,
+        which may be none, are not.  Returns the lines.
+        """
+        lines = []
+        for header, header_lines in transactions:
+            for line in header_lines:
+                line.header = header
+                lines.append(line)
+        for line, pk in zip(lines, reserve_pks(self.line_model, len(lines))):
+            line.pk = pk
+        nom_trans = []
+        vat_trans = []
+        cash_book_trans = []
+        for header, header_lines in transactions:
+            transaction_type_object = header.get_type_transaction()
+            nom_trans += transaction_type_object.build_nominal_transactions(
+                self.nominal_model,
+                self.nominal_transaction_model,
+                lines=header_lines,
+                **self.get_nominal_transaction_kwargs()
+            )
+            vat_trans += transaction_type_object.build_vat_transactions(
+                self.vat_transaction_model,
+                lines=header_lines
+            )
+            if cash_book_entries and self.cash_book_transaction_model:
+                if cash_book_tran := transaction_type_object.build_cash_book_entry(
+                        self.cash_book_transaction_model):
+                    cash_book_trans.append(cash_book_tran)
+        for tran, pk in zip(nom_trans, reserve_pks(self.nominal_transaction_model, len(nom_trans))):
+            tran.pk = pk
+        for tran, pk in zip(vat_trans, reserve_pks(self.vat_transaction_model, len(vat_trans))):
+            tran.pk = pk
+        self.link_lines(lines, nom_trans, vat_trans)
+        self.nominal_transaction_model.objects.bulk_create(
+            nom_trans, batch_size=self.batch_size)
+        self.vat_transaction_model.objects.bulk_create(
+            vat_trans, batch_size=self.batch_size)
+        if cash_book_trans:
+            self.cash_book_transaction_model.objects.bulk_create(
+                cash_book_trans, batch_size=self.batch_size)
+        if lines:
+            self.line_model.objects.audited_bulk_create(
+                lines, batch_size=self.batch_size, user=self.user)
+        return lines
+
+    def link_lines(self, lines, nom_trans, vat_trans):
+        """
+        Point the lines at their nominal and vat transactions
+        """
+        nom_trans = {(tran.header, tran.line, tran.field): tran for tran in nom_trans}
+        vat_trans = {(tran.header, tran.line): tran for tran in vat_trans}
+        for line in lines:
+            line.add_nominal_transactions({
+                field: nom_trans[(line.header_id, line.pk, field)]
+                for field in ("g", "v", "t")
+                if (line.header_id, line.pk, field) in nom_trans
+            })
+            line.vat_transaction = vat_trans.get((line.header_id, line.pk))
+
+
+class TransactionService(PostLinesMixin):
+    """
+    Subclass per ledger.  The attributes are the same as those of the create and edit views
+    for the ledger.  match_model and cash_book_transaction_model are only needed for the
+    ledgers which match and post to the cash book respectively.
+    """
+    header_model = None
+    line_model = None
+    match_model = None
+    nominal_model = None
+    nominal_transaction_model = None
+    vat_transaction_model = None
+    cash_book_transaction_model = None
+    control_nominal_name = None
+    # validates the plain data passed to create
+    importer_class = None
+
+    def __init__(self, user=None):
+        self.user = user
+
+    @property
+    def module(self):
+        return self.header_model.module
+
+    def create(self, data):
+        """
+        Validate and post a transaction given as plain data, the header values with the
+        lines, if any, under "lines".  Returns the header.
+        """
+        header, lines = self.validate(data)
+        queue_module = QueuePosts.get_module(self.header_model._meta.app_label)
+        with transaction.atomic():
+            # queue behind the other posts to the ledger like QueuePostsMixin
+            list(QueuePosts.objects.select_for_update().filter(module=queue_module))
+            self.create_transaction(header, lines)
+            QueuePosts.bump_version(queue_module)
+        return header
+
+    def validate(self, data):
+        """
+        The header and lines for `data`, not yet saved.  Raises a ValidationError
+        if it is invalid.
+        """
+        importer = self.importer_class(user=self.user)
+        importer.setup()
+        header, lines, errors = importer.validate(data, importer.get_lookups([data]))
+        if errors:
+            raise ValidationError(errors)
+        return header, lines
+
+    def save_header(self, header):
+        if self.user is not None:
+            # simple_history records the change against this user
+            header._history_user = self.user
+        header.save()
+
+    def create_transaction(self, header, lines=None, matches=None, matched_headers=None):
+        """
+        Post a new transaction.  `header`, `lines` and `matches` are valid but not yet saved.
+        The lines are numbered in the order given.  `matched_headers` are the headers the
+        matches changed the due and paid for.
+        """
+        self.save_header(header)
+        lines = (lines or []) if header.requires_lines() else []
+        for line_no, line in enumerate(lines, 1):
+            line.type = header.type
+            line.line_no = line_no
+        self.post_lines([(header, lines)])
+        if matches:
+            self.create_matches(header, matches, matched_headers or [])
+        return header
+
+    def create_matches(self, header, matches, matched_headers):
+        matches = [match for match in matches if match.value != 0]
+        for match in matches:
+            match.matched_by_type = match.matched_by.type
+            match.matched_to_type = match.matched_to.type
+            match.period = header.period
+        if matches:
+            self.header_model.objects.audited_bulk_update(
+                matched_headers,
+                ['due', 'paid'],
+                user=self.user
+            )
+            self.match_model.objects.audited_bulk_create(matches, user=self.user)
+            self.match_model.update_allocations(matches)
+
+    def edit_transaction(
+            self,
+            header,
+            new_lines=None,
+            lines_to_update=None,
+            deleted_lines=None,
+            new_matches=None,
+            matches_to_update=None,
+            deleted_matches=None,
+            matched_headers=None):
+        """
+        Post the changes to an existing transaction.  The new lines and the lines to update
+        should already be numbered.
+        """
+        self.save_header(header)
+        transaction_type_object = header.get_type_transaction()
+        if header.requires_lines():
+            self.edit_lines(
+                header,
+                transaction_type_object,
+                new_lines or [],
+                lines_to_update or [],
+                deleted_lines or []
+            )
+        else:
+            self.edit_related_transactions(transaction_type_object)
+        if self.match_model:
+            self.edit_matches(
+                header,
+                new_matches or [],
+                matches_to_update or [],
+                deleted_matches or [],
+                matched_headers or []
+            )
+        return header
+
+    def edit_lines(self, header, transaction_type_object, new_lines, lines_to_update, deleted_lines):
+        # before the transactions for the new lines are created
+        existing_nom_trans = list(self.nominal_transaction_model.objects.filter(
+            module=self.module, header=header.pk))
+        existing_vat_trans = list(self.vat_transaction_model.objects.filter(
+            module=self.module, header=header.pk))
+        # the cash book entry is for the header so is edited below rather than created
+        self.post_lines([(header, new_lines)], cash_book_entries=False)
+        self.line_model.objects.audited_bulk_update(
+            lines_to_update, user=self.user)
+        bulk_delete_with_history(
+            deleted_lines,
+            self.line_model,
+            default_user=self.user
+        )
+        if header.requires_analysis():
+            # the new lines are already posted
+            self.edit_related_transactions(
+                transaction_type_object,
+                new_lines=[],
+                lines_to_update=lines_to_update,
+                deleted_lines=deleted_lines,
+                existing_nom_trans=existing_nom_trans,
+                existing_vat_trans=existing_vat_trans
+            )
+        else:
+            # a brought forward transaction in the cash book still posts to the cash book
+            # whereas one in the sales or purchase ledger posts nothing.  There are no
+            # brought forward transactions in the nominal ledger.
+            self.edit_related_transactions(transaction_type_object)
+
+    def edit_related_transactions(self, transaction_type_object, **kwargs):
+        transaction_type_object.edit_nominal_transactions(
+            self.nominal_model,
+            self.nominal_transaction_model,
+            **self.get_nominal_transaction_kwargs(),
+            **kwargs
+        )
+        transaction_type_object.edit_vat_transactions(
+            self.vat_transaction_model,
+            line_cls=self.line_model,
+            **kwargs
+        )
+        if self.cash_book_transaction_model:
+            transaction_type_object.edit_cash_book_entry(
+                self.cash_book_transaction_model,
+                **kwargs
+            )
+
+    def edit_matches(self, header, new_matches, matches_to_update, deleted_matches, matched_headers):
+        for match in new_matches + matches_to_update:
+            if match.matched_by_id == header.pk:
+                match.matched_by_type = header.type
+                match.matched_to_type = match.matched_to.type
+                match.period = header.period
+            else:
+                match.matched_by_type = match.matched_by.type
+                match.matched_to_type = header.type
+        self.match_model.objects.audited_bulk_create(new_matches, user=self.user)
+        self.match_model.objects.audited_bulk_update(
+            matches_to_update,
+            ['value', 'matched_by_type', 'matched_to_type', 'period'],
+            user=self.user
+        )
+        bulk_delete_with_history(
+            deleted_matches,
+            self.match_model,
+            default_user=self.user
+        )
+        self.match_model.update_allocations(
+            new_matches + matches_to_update + deleted_matches)
+        self.header_model.objects.audited_bulk_update(
+            matched_headers,
+            ['due', 'paid'],
+            user=self.user
+        )
@@ -1,3 +1,19 @@
-from django.dispatch import Signal
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import Signal, receiver
 
 audit_post_delete = Signal()
+
+
+@receiver(connection_created)
+def set_trigram_similarity_threshold(sender, connection, **kwargs):
+    """
+    The threshold of the pg_trgm `%` operator, which the trigram searches use to find
+    the candidates through the trigram indexes
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SET pg_trgm.similarity_threshold = %s",
+                [settings.TRIGRAM_SIMILARITY_THRESHOLD]
+            )
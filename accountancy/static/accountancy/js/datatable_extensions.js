@@ -18,6 +18,23 @@
         }
     };
 
+    // Export button - downloads every row matching the table's filters and ordering as CSV
+    $.fn.dataTable.ext.buttons.export_csv = {
+        text: 'Export CSV',
+        className: 'btn btn-outline-secondary bt-sm ml-2 f-s-100',
+        action: function (e, dt, node, config) {
+            var params = $.extend({}, dt.ajax.params(), { "export": "csv" });
+            // the server streams the whole set rather than a page
+            ["draw", "start", "length", "cursor", "format"].forEach(function(param){
+                delete params[param];
+            });
+            window.location.href = "?" + $.param(params);
+        },
+        init: function (api, node, config) {
+            $(node).removeClass("dt-button");
+        }
+    };
+
 
     // Batch Payment - click on this to pay / match the rows you have ticked
     //$.fn.dataTable.ext.buttons.batch_payment = {
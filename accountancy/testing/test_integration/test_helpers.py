@@ -1,6 +1,8 @@
 from datetime import date, datetime, timedelta
 
-from accountancy.helpers import AuditTransaction, get_all_historical_changes
+from accountancy.helpers import (AgedMatchingDaysReport, AgedMatchingReport,
+                                 AuditTransaction, estimate_count,
+                                 get_all_historical_changes)
 from cashbook.models import CashBook
 from contacts.models import Contact
 from controls.models import FinancialYear, Period
@@ -8,12 +10,27 @@ from django.test import TestCase
 from nominals.models import Nominal
 from purchases.models import (PurchaseHeader, PurchaseLine, PurchaseMatching,
                               Supplier)
+from sales.models import Customer, SaleHeader, SaleMatching
 from vat.models import Vat
 
 DATE_INPUT_FORMAT = '%d-%m-%Y'
 MODEL_DATE_INPUT_FORMAT = '%Y-%m-%d'
 
 
+class EstimateCountTest(TestCase):
+
+    def test_estimate_count(self):
+        Contact.objects.bulk_create([
+            Contact(code=str(i), name=str(i), email=str(i))
+            for i in range(10)
+        ])
+        estimate = estimate_count(
+            Contact.objects.filter(name__startswith="1").order_by("name"))
+        # the estimate is from the planner so is only a count of rows
+        self.assertIsInstance(estimate, int)
+        self.assertGreaterEqual(estimate, 0)
+
+
 class GetAllHistoricalChangesTest(TestCase):
 
     def test_create_only(self):
@@ -1173,3 +1190,350 @@ class AuditTransactionTest(TestCase):
             update["meta"]["transaction_aspect"],
             "match"
         )
+
+
+class AgedMatchingReportTest(TestCase):
+    """
+    Test with SL header and matching
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(code="1", name="1")
+        cls.other_customer = Customer.objects.create(code="2", name="2")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.period_2 = Period.objects.create(
+            fy=fy, period="02", fy_and_period="202002", month_start=date(2020, 2, 29))
+        cls.period_3 = Period.objects.create(
+            fy=fy, period="03", fy_and_period="202003", month_start=date(2020, 3, 31))
+        cls.report = AgedMatchingReport(SaleHeader, SaleMatching, "customer")
+
+    def create_invoice_and_receipt(self):
+        invoice = SaleHeader.objects.create(
+            type="si",
+            customer=self.customer,
+            ref="1",
+            period=self.period_1,
+            date=date(2020, 1, 1),
+            due_date=date(2020, 2, 1),
+            total=100,
+            paid=100,
+            due=0
+        )
+        receipt = SaleHeader.objects.create(
+            type="sp",
+            customer=self.customer,
+            ref="2",
+            period=self.period_3,
+            date=date(2020, 3, 1),
+            total=-100,
+            paid=-100,
+            due=0
+        )
+        SaleMatching.objects.create(
+            matched_by=receipt,
+            matched_to=invoice,
+            value=100,
+            period=self.period_3
+        )
+        return invoice, receipt
+
+    def test_matching_after_period_is_reversed(self):
+        self.create_invoice_and_receipt()
+        transactions = self.report.transactions(self.period_2)
+        self.assertEqual(
+            len(transactions),
+            1
+        )
+        tran = transactions[0]
+        self.assertEqual(
+            tran["meta"]["contact_pk"],
+            self.customer.pk
+        )
+        self.assertEqual(
+            tran["customer"],
+            self.customer.name
+        )
+        self.assertEqual(
+            tran["total"],
+            100
+        )
+        self.assertEqual(
+            tran["unallocated"],
+            0
+        )
+        self.assertEqual(
+            tran["current"],
+            0
+        )
+        self.assertEqual(
+            tran["1 month"],
+            100
+        )
+        self.assertEqual(
+            tran["2 month"],
+            0
+        )
+        self.assertEqual(
+            tran["3 month"],
+            0
+        )
+        self.assertEqual(
+            tran["4 month"],
+            0
+        )
+
+    def test_fully_matched_at_period_is_excluded(self):
+        self.create_invoice_and_receipt()
+        self.assertEqual(
+            self.report.transactions(self.period_3),
+            []
+        )
+        self.assertEqual(
+            self.report.contact_totals(self.period_3),
+            []
+        )
+
+    def test_contact_totals(self):
+        self.create_invoice_and_receipt()
+        SaleHeader.objects.create(
+            type="si",
+            customer=self.customer,
+            ref="3",
+            period=self.period_2,
+            date=date(2020, 2, 1),
+            total=50,
+            paid=0,
+            due=50
+        )
+        SaleHeader.objects.create(
+            type="sp",
+            customer=self.other_customer,
+            ref="4",
+            period=self.period_2,
+            date=date(2020, 2, 1),
+            total=-20,
+            paid=0,
+            due=-20
+        )
+        contact_totals = self.report.contact_totals(self.period_2)
+        self.assertEqual(
+            len(contact_totals),
+            2
+        )
+        customer_total, other_customer_total = contact_totals
+        self.assertEqual(
+            customer_total["meta"]["contact_pk"],
+            self.customer.pk
+        )
+        self.assertEqual(
+            customer_total["total"],
+            150
+        )
+        self.assertEqual(
+            customer_total["current"],
+            50
+        )
+        self.assertEqual(
+            customer_total["1 month"],
+            100
+        )
+        self.assertEqual(
+            customer_total["unallocated"],
+            0
+        )
+        self.assertEqual(
+            other_customer_total["meta"]["contact_pk"],
+            self.other_customer.pk
+        )
+        self.assertEqual(
+            other_customer_total["total"],
+            -20
+        )
+        self.assertEqual(
+            other_customer_total["unallocated"],
+            -20
+        )
+        self.assertEqual(
+            other_customer_total["current"],
+            0
+        )
+
+    def test_void_is_excluded(self):
+        SaleHeader.objects.create(
+            type="si",
+            customer=self.customer,
+            ref="1",
+            period=self.period_1,
+            date=date(2020, 1, 1),
+            total=100,
+            paid=0,
+            due=100,
+            status="v"
+        )
+        self.assertEqual(
+            self.report.transactions(self.period_1),
+            []
+        )
+
+    def test_trend(self):
+        self.create_invoice_and_receipt()
+        SaleHeader.objects.create(
+            type="si",
+            customer=self.customer,
+            ref="3",
+            period=self.period_2,
+            date=date(2020, 2, 1),
+            total=50,
+            paid=0,
+            due=50
+        )
+        SaleHeader.objects.create(
+            type="sp",
+            customer=self.other_customer,
+            ref="4",
+            period=self.period_2,
+            date=date(2020, 2, 1),
+            total=-20,
+            paid=0,
+            due=-20
+        )
+        trend = self.report.trend(self.period_3, 3)
+        self.assertEqual(
+            [t["period"] for t in trend],
+            [self.period_1, self.period_2, self.period_3]
+        )
+        for t in trend:
+            contact_totals = self.report.contact_totals(t["period"])
+            for key in ["total"] + [key for key, _ in self.report.buckets]:
+                self.assertEqual(
+                    t[key],
+                    sum(c[key] for c in contact_totals)
+                )
+        self.assertEqual(
+            trend[0]["current"],
+            100
+        )
+        self.assertEqual(
+            trend[1]["1 month"],
+            100
+        )
+        self.assertEqual(
+            trend[2]["total"],
+            30
+        )
+
+    def test_trend_window(self):
+        self.create_invoice_and_receipt()
+        trend = self.report.trend(self.period_2, 1)
+        self.assertEqual(
+            len(trend),
+            1
+        )
+        self.assertEqual(
+            trend[0]["period"],
+            self.period_2
+        )
+        self.assertEqual(
+            trend[0]["1 month"],
+            100
+        )
+
+
+class AgedMatchingDaysReportTest(TestCase):
+    """
+    Test with SL header
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(code="1", name="1")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.as_at = date(2020, 6, 30)
+        cls.report = AgedMatchingDaysReport(
+            SaleHeader, SaleMatching, "customer", cls.as_at, [30, 60, 90])
+
+    def create_invoice(self, ref, due_date, date=date(2020, 1, 1)):
+        return SaleHeader.objects.create(
+            type="si",
+            customer=self.customer,
+            ref=ref,
+            period=self.period,
+            date=date,
+            due_date=due_date,
+            total=100,
+            paid=0,
+            due=100
+        )
+
+    def test_buckets(self):
+        self.assertEqual(
+            [key for key, _ in self.report.buckets],
+            ["unallocated", "0 - 30", "31 - 60", "61 - 90", "90+"]
+        )
+
+    def test_bucket_boundaries(self):
+        self.create_invoice("not due", self.as_at + timedelta(days=10))
+        self.create_invoice("30", self.as_at - timedelta(days=30))
+        self.create_invoice("31", self.as_at - timedelta(days=31))
+        self.create_invoice("60", self.as_at - timedelta(days=60))
+        self.create_invoice("61", self.as_at - timedelta(days=61))
+        self.create_invoice("90", self.as_at - timedelta(days=90))
+        self.create_invoice("91", self.as_at - timedelta(days=91))
+        transactions = {
+            tran["ref"]: tran
+            for tran in self.report.transactions(self.period)
+        }
+        expected = {
+            "not due": "0 - 30",
+            "30": "0 - 30",
+            "31": "31 - 60",
+            "60": "31 - 60",
+            "61": "61 - 90",
+            "90": "61 - 90",
+            "91": "90+",
+        }
+        for ref, bucket in expected.items():
+            tran = transactions[ref]
+            for key, _ in self.report.buckets:
+                self.assertEqual(
+                    tran[key],
+                    100 if key == bucket else 0
+                )
+
+    def test_aged_from_date_without_due_date(self):
+        self.create_invoice("1", None, date=self.as_at - timedelta(days=45))
+        tran = self.report.transactions(self.period)[0]
+        self.assertEqual(
+            tran["31 - 60"],
+            100
+        )
+
+    def test_receipt_is_unallocated(self):
+        SaleHeader.objects.create(
+            type="sp",
+            customer=self.customer,
+            ref="1",
+            period=self.period,
+            date=date(2020, 1, 1),
+            total=-100,
+            paid=0,
+            due=-100
+        )
+        contact_totals = self.report.contact_totals(self.period)
+        self.assertEqual(
+            len(contact_totals),
+            1
+        )
+        self.assertEqual(
+            contact_totals[0]["unallocated"],
+            -100
+        )
+        self.assertEqual(
+            contact_totals[0]["90+"],
+            0
+        )
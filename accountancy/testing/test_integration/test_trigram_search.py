@@ -0,0 +1,92 @@
+from datetime import date
+
+from accountancy.views import (get_trig_vectors_for_different_inputs,
+                               trigram_search)
+from contacts.models import Contact
+from controls.models import FinancialYear, Period
+from django.contrib.postgres.search import TrigramSimilarity
+from django.shortcuts import reverse
+from django.test import RequestFactory, TestCase
+from nominals.models import Nominal
+from nominals.views import LoadNominal
+from purchases.helpers import create_invoices
+from purchases.models import PurchaseHeader, Supplier
+from purchases.views import TransactionEnquiry
+
+"""
+The searches find their candidates with the pg_trgm % operator, whose threshold is set on each
+connection, before the similarity is calculated.  They should find the same rows as the
+similarity alone.
+"""
+
+NAMES = [
+    "acme", "acme ltd", "acme limited", "acne", "widgets", "widget co", "the widget company",
+    "bank", "bank account", "banking", "banks", "x", "xylophones", "zebra"
+]
+
+SEARCHES = ["acme", "acme ltd", "acm", "widget", "widgets co", "bank", "ban", "x", "zzz"]
+
+
+def similarity_only(queryset, model_attrs_and_inputs, similarity):
+    # the filter before the candidates were found through the trigram indexes
+    return (
+        queryset
+        .annotate(similarity=get_trig_vectors_for_different_inputs(model_attrs_and_inputs))
+        .filter(similarity__gt=similarity)
+    )
+
+
+class TrigramSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        supplier = Supplier.objects.create(code="1", name="test_supplier")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        for name in NAMES:
+            create_invoices(supplier, name, 1, period)
+        Contact.objects.bulk_create([
+            Contact(code=name[:3] + str(i), name=name,
+                    email=name.replace(" ", "") + "@example.com")
+            for i, name in enumerate(NAMES)
+        ])
+        for name in NAMES:
+            Nominal.objects.create(name=name)
+
+    def test_enquiry(self):
+        view = TransactionEnquiry()
+        for q in SEARCHES:
+            with self.subTest(q=q):
+                queryset = PurchaseHeader.objects.all()
+                self.assertEqual(
+                    set(view.apply_advanced_search(
+                        queryset, {"reference": q, "include_voided": True})),
+                    set(similarity_only(queryset, [("ref", q)], view.search_similarity))
+                )
+
+    def test_search_summed_over_fields(self):
+        # the contact list searches the code, name and email together
+        for q in SEARCHES:
+            with self.subTest(q=q):
+                queryset = Contact.objects.all()
+                model_attrs_and_inputs = [(field, q) for field in ("code", "name", "email")]
+                self.assertEqual(
+                    set(trigram_search(queryset, model_attrs_and_inputs, 0.5)),
+                    set(similarity_only(queryset, model_attrs_and_inputs, 0.5))
+                )
+
+    def test_autocomplete(self):
+        factory = RequestFactory()
+        for q in SEARCHES:
+            with self.subTest(q=q):
+                view = LoadNominal()
+                view.request = factory.get(reverse("nominals:load_nominals"), {"q": q})
+                self.assertEqual(
+                    set(view.get_queryset()),
+                    set(
+                        Nominal.objects
+                        .annotate(similarity=TrigramSimilarity("name", q))
+                        .filter(similarity__gt=0.3)
+                    )
+                )
@@ -1,9 +1,9 @@
 from datetime import date, datetime, timedelta
 
 import mock
-from accountancy.models import (AccountsDecimalField, NonAuditQuerySet,
-                                Transaction, TransactionHeader,
-                                TransactionLine)
+from accountancy.models import (AccountsDecimalField, HeaderSearch,
+                                NonAuditQuerySet, Transaction,
+                                TransactionHeader, TransactionLine)
 from cashbook.models import CashBook, CashBookHeader
 from controls.models import FinancialYear, Period
 from django.test import TestCase
@@ -893,3 +893,99 @@ class MatchedHeadersTests(TestCase):
             PurchaseMatching.ui_match_value(self.mt, self.match.value),
             100
         )
+
+
+class HeaderSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(code="acme", name="Acme Supplies")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+
+    def create_header(self, ref, total):
+        return PurchaseHeader.objects.create(
+            type="pi",
+            supplier=self.supplier,
+            ref=ref,
+            period=self.period,
+            date=date(2020, 1, 1),
+            total=total,
+            paid=0,
+            due=total
+        )
+
+    def test_header_is_indexed_when_saved(self):
+        header = self.create_header("inv-1001", 120)
+        row = HeaderSearch.objects.get(module="PL", header=header.pk)
+        self.assertEqual(row.ref, "inv-1001")
+        self.assertEqual(row.contact_code, "acme")
+        self.assertEqual(row.contact_name, "Acme Supplies")
+        self.assertEqual(row.total, 120)
+        header.ref = "inv-1002"
+        header.save()
+        row = HeaderSearch.objects.get(module="PL", header=header.pk)
+        self.assertEqual(row.ref, "inv-1002")
+
+    def test_save_with_update_fields(self):
+        header = self.create_header("inv-1001", 120)
+        header.paid = 120
+        header.due = 0
+        with mock.patch.object(HeaderSearch, "index_headers") as index_headers:
+            header.save(update_fields=["paid", "due"])
+        index_headers.assert_not_called()
+        other = Supplier.objects.create(code="other", name="Other Supplies")
+        header.supplier = other
+        header.save(update_fields=["supplier_id"])
+        self.assertEqual(
+            HeaderSearch.objects.get(module="PL", header=header.pk).contact_code,
+            "other"
+        )
+
+    def test_bulk_create(self):
+        headers = PurchaseHeader.objects.bulk_create([
+            PurchaseHeader(
+                type="pi",
+                supplier=self.supplier,
+                ref=str(i),
+                period=self.period,
+                date=date(2020, 1, 1),
+                total=100,
+                paid=0,
+                due=100
+            )
+            for i in range(3)
+        ])
+        self.assertEqual(
+            HeaderSearch.objects.filter(module="PL").count(),
+            3
+        )
+
+    def test_void_removes_row(self):
+        header = self.create_header("inv-1001", 120)
+        header.status = "v"
+        PurchaseHeader.objects.audited_bulk_update([header], ["paid", "due", "status"])
+        self.assertFalse(
+            HeaderSearch.objects.filter(module="PL", header=header.pk).exists()
+        )
+
+    def test_search(self):
+        invoice = self.create_header("inv-1001", 120)
+        other = self.create_header("zzz", 55.50)
+        hits = list(HeaderSearch.search("inv-1001"))
+        self.assertEqual(hits[0].header, invoice.pk)
+        hits = list(HeaderSearch.search("55.50"))
+        self.assertEqual(
+            [hit.header for hit in hits],
+            [other.pk]
+        )
+
+    def test_update_contact(self):
+        header = self.create_header("inv-1001", 120)
+        self.supplier.name = "Acme Ltd"
+        HeaderSearch.update_contact(self.supplier)
+        self.assertEqual(
+            HeaderSearch.objects.get(module="PL", header=header.pk).contact_name,
+            "Acme Ltd"
+        )
@@ -4,9 +4,11 @@ import mock
 from accountancy.views import (BaseTransactionsList,
                                CustomFilterJQueryDataTableMixin,
                                JQueryDataTableMixin, RESTBaseTransactionMixin,
-                               get_value)
+                               get_value, keyset_filter)
+from controls.models import QueuePosts
 from deepdiff import DeepDiff
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from nominals.models import Nominal
 
 
@@ -451,7 +453,7 @@ class JQueryDataTableMixinTests(TestCase):
         new_queryset = j.apply_filter(q)
         self.assertEqual(
             new_queryset._extract_mock_name(),
-            "mock.annotate().filter()"
+            "mock.filter().annotate().filter()"
         )
 
     """
@@ -743,6 +745,91 @@ class CustomFilterJQueryDataTableMixinTests(TestCase):
         )
 
 
+class JQueryDataTableMixinCompactTests(TestCase):
+
+    def test_compact(self):
+        rows = [
+            {"ref": "1", "total": 10, "DT_RowData": {"pk": 1, "href": "/1"}},
+            {"ref": "2", "total": 20, "DT_RowData": {"pk": 2, "href": "/2"}},
+        ]
+        columns, data = JQueryDataTableMixin.compact(mock.Mock(), rows)
+        self.assertEqual(
+            columns,
+            ["ref", "total"]
+        )
+        self.assertEqual(
+            data,
+            [
+                ["1", 10, 1, "/1"],
+                ["2", 20, 2, "/2"]
+            ]
+        )
+
+    def test_compact_no_rows(self):
+        columns, data = JQueryDataTableMixin.compact(mock.Mock(), [])
+        self.assertEqual(
+            columns,
+            []
+        )
+        self.assertEqual(
+            data,
+            []
+        )
+
+
+class KeysetFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = Nominal.objects.create(name="a", type="b")
+        cls.b = Nominal.objects.create(name="b", type="b")
+        cls.c = Nominal.objects.create(name="c", type="b")
+
+    def test_asc(self):
+        nominals = (
+            Nominal.objects
+            .filter(keyset_filter(["name", "id"], ["a", self.a.pk]))
+            .order_by("name", "id")
+        )
+        self.assertEqual(
+            list(nominals),
+            [self.b, self.c]
+        )
+
+    def test_desc(self):
+        nominals = (
+            Nominal.objects
+            .filter(keyset_filter(["-name", "id"], ["c", self.c.pk]))
+            .order_by("-name", "id")
+        )
+        self.assertEqual(
+            list(nominals),
+            [self.b, self.a]
+        )
+
+    def test_tie(self):
+        nominals = (
+            Nominal.objects
+            .filter(keyset_filter(["type", "id"], ["b", self.a.pk]))
+            .order_by("type", "id")
+        )
+        self.assertEqual(
+            list(nominals),
+            [self.b, self.c]
+        )
+
+    def test_null(self):
+        nominals = (
+            Nominal.objects
+            .filter(keyset_filter(["parent_id", "id"], [None, self.b.pk]))
+            .order_by("parent_id", "id")
+        )
+        self.assertEqual(
+            list(nominals),
+            [self.c]
+        )
+
+
 class BaseTransactionsListTests(TestCase):
 
     """
@@ -830,6 +917,32 @@ class BaseTransactionsListTests(TestCase):
             }
         )
 
+    def test_get_rows_transforms_each_distinct_value_once(self):
+        b = BaseTransactionsList()
+        transformer = mock.Mock(side_effect=lambda v: v.upper())
+        b.column_transformers = {
+            "model_attr": transformer
+        }
+        b.get_row_href = lambda obj: None
+        objs = [
+            {"id": 1, "model_attr": "a"},
+            {"id": 2, "model_attr": "a"},
+            {"id": 3, "model_attr": "b"},
+        ]
+        rows = b.get_rows(objs)
+        self.assertEqual(
+            [row["model_attr"] for row in rows],
+            ["A", "A", "B"]
+        )
+        self.assertEqual(
+            transformer.call_count,
+            2
+        )
+        self.assertEqual(
+            rows[0]["DT_RowData"],
+            {"pk": 1, "href": None}
+        )
+
     """
     test form_form_valid method
     """
@@ -877,6 +990,49 @@ class BaseTransactionsListTests(TestCase):
             "derek"
         )
 
+    """
+    test the count methods
+    """
+
+    def test_cached_count_until_posted(self):
+        cache.clear()
+        Nominal.objects.create(name="a", type="b")
+        b = BaseTransactionsList()
+        b.model = Nominal
+        self.assertEqual(
+            b.queryset_count(Nominal.objects.all()),
+            1
+        )
+        Nominal.objects.create(name="b", type="b")
+        b = BaseTransactionsList()
+        b.model = Nominal
+        self.assertEqual(
+            b.queryset_count(Nominal.objects.all()),
+            1
+        )
+        self.assertEqual(
+            b.queryset_count(Nominal.objects.filter(name="b")),
+            1
+        )
+        QueuePosts.bump_version("n")
+        b = BaseTransactionsList()
+        b.model = Nominal
+        self.assertEqual(
+            b.queryset_count(Nominal.objects.all()),
+            2
+        )
+
+    @override_settings(ESTIMATE_ENQUIRY_TOTALS=1)
+    def test_estimated_count(self):
+        b = BaseTransactionsList()
+        b.model = Nominal
+        with mock.patch("accountancy.views.estimate_count", return_value=1000) as estimate:
+            self.assertEqual(
+                b.queryset_count(Nominal.objects.all()),
+                1000
+            )
+        estimate.assert_called_once()
+
 
 class RESTBaseTransactionMixinTests(TestCase):
 
@@ -1,31 +1,45 @@
+import csv
 import functools
+import hashlib
+import io
+import json
 from copy import deepcopy
 from datetime import date
-from itertools import chain, groupby
+from itertools import chain, islice
 
-from controls.exceptions import MissingPeriodError
-from controls.models import ModuleSettings, Period
+from controls.models import ModuleSettings, Period, QueuePosts
 from crispy_forms.helper import FormHelper
 from crispy_forms.utils import render_crispy_form
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.postgres.search import TrigramSimilarity
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
-from django.db.models import Q, Subquery, Sum
+from django.db.models import Count, Q, Subquery, Sum
 from django.http import (Http404, HttpResponse, HttpResponseForbidden,
-                         HttpResponseRedirect, JsonResponse)
+                         HttpResponseNotModified, HttpResponseRedirect,
+                         JsonResponse, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, render, reverse
 from django.template.context_processors import csrf
 from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag, urlencode
 from django.views.generic import DetailView, ListView, View
 from django.views.generic.base import ContextMixin, TemplateResponseMixin
 from mptt.utils import get_cached_trees
 from nominals.models import Nominal
 from querystring_parser import parser
 
-from accountancy.helpers import (AuditTransaction, JSONBlankDate,
-                                 bulk_delete_with_history, sort_multiple)
+from accountancy.helpers import (AgedMatchingDaysReport, AgedMatchingReport,
+                                 AuditTransaction, Echo,
+                                 JSONBlankDate, bulk_delete_with_history,
+                                 estimate_count, sort_multiple)
+from accountancy.imports import read_lines, read_transactions
 
 
 def get_trig_vectors_for_different_inputs(model_attrs_and_inputs):
@@ -40,6 +54,50 @@ def get_trig_vectors_for_different_inputs(model_attrs_and_inputs):
     return functools.reduce(lambda a, b: a + b, trig_vectors)
 
 
+def get_trig_filter_for_different_inputs(model_attrs_and_inputs):
+    """
+    The pg_trgm `%` operator for each model attribute.  Unlike the similarity it can use a
+    trigram index so only the candidates need the similarity calculating.
+    """
+    return functools.reduce(
+        lambda a, b: a | b,
+        [
+            Q(**{model_attr + "__trigram_similar": search_input})
+            for model_attr, search_input in model_attrs_and_inputs
+        ]
+    )
+
+
+def trigram_search(queryset, model_attrs_and_inputs, similarity):
+    """
+    The rows where the summed similarity of the model attributes to the inputs exceeds `similarity`.
+
+    A row can only exceed it if one of the attributes is more similar than `similarity` divided
+    by the number of inputs.  Where that is at least the threshold of the `%` operator, see
+    TRIGRAM_SIMILARITY_THRESHOLD, the candidates are found through the trigram indexes first
+    without missing any row.  Otherwise every row is compared.
+    """
+    # a blank input is similar to nothing
+    model_attrs_and_inputs = [
+        (model_attr, search_input)
+        for model_attr, search_input in model_attrs_and_inputs
+        if search_input
+    ]
+    if not model_attrs_and_inputs:
+        return queryset.none()
+    if similarity / len(model_attrs_and_inputs) >= settings.TRIGRAM_SIMILARITY_THRESHOLD:
+        queryset = queryset.filter(
+            get_trig_filter_for_different_inputs(model_attrs_and_inputs))
+    return (
+        queryset
+        .annotate(
+            similarity=get_trig_vectors_for_different_inputs(
+                model_attrs_and_inputs)
+        )
+        .filter(similarity__gt=similarity)
+    )
+
+
 def get_value(obj, field):
     try:
         return getattr(obj, field)
@@ -61,9 +119,50 @@ The Scroller class below uses the same interface as the paginator class and the
 the page object class.  The second is necessary to take the slice we need and the first is necessary to return this object.
 
 This way we can swap these classes for the paginator classes without changing the code.
+
+KeysetScroller and KeysetScrollerInView use the same interface again but, given the values of the last row of
+the previous page, seek to the start of the slice with a WHERE clause rather than an OFFSET.  So a page deep into
+the set costs the same as the first.
 """
 
 
+def keyset_filter(ordering, values):
+    """
+    The rows which come after `values` in `ordering` e.g. ["-date", "id"].  The last field of
+    the ordering must be unique.  Postgres puts nulls last in ascending order and first in
+    descending order.
+    """
+    q = Q()
+    equal = Q()
+    for order, value in zip(ordering, values):
+        desc = order.startswith("-")
+        field = order.lstrip("-")
+        if value is None:
+            after = Q(**{field + "__isnull": False}) if desc else Q(pk__in=[])
+            same = Q(**{field + "__isnull": True})
+        else:
+            if desc:
+                after = Q(**{field + "__lt": value})
+            else:
+                after = Q(**{field + "__gt": value}) | Q(**{field + "__isnull": True})
+            same = Q(**{field: value})
+        q |= equal & after
+        equal &= same
+    return q
+
+
+class KeysetCursorSerializer:
+    """
+    Like the signing module's JSONSerializer but the values of the cursor can be dates and decimals
+    """
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), cls=DjangoJSONEncoder).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
 class ScrollerInView:
     def __init__(self, queryset_or_object_list, start, length):
         self.queryset_or_object_list = queryset_or_object_list
@@ -77,8 +176,20 @@ class ScrollerInView:
         return self.queryset_or_object_list[int(start): int(start) + int(length)]
 
 
+class KeysetScrollerInView:
+    def __init__(self, queryset, ordering, values, length):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.values = values
+        self.length = length
+
+    @property
+    def object_list(self):
+        return self.queryset.filter(keyset_filter(self.ordering, self.values))[:int(self.length)]
+
+
 class Scroller:
-    def __init__(self, queryset_or_object_list, start, length):
+    def __init__(self, queryset_or_object_list, start, length, count=None):
         if isinstance(queryset_or_object_list, (list,)):
             self.is_queryset = False
         else:
@@ -86,6 +197,7 @@ class Scroller:
         self._q = queryset_or_object_list
         self.start = start
         self.length = length
+        self._count = count
 
     @property
     def queryset(self):
@@ -102,6 +214,8 @@ class Scroller:
 
     @property
     def count(self):
+        if self._count is not None:
+            return self._count
         if self.is_queryset:
             return self.queryset.count()
         else:
@@ -112,6 +226,24 @@ class Scroller:
         return ScrollerInView(self.queryset_or_object_list, self.start, self.length)
 
 
+class KeysetScroller(Scroller):
+    """
+    `seek` is the ordering and the values of the row before `start`, or None in which case
+    the slice is taken with an OFFSET like Scroller.
+    """
+
+    def __init__(self, queryset, start, length, seek=None, count=None):
+        super().__init__(queryset, start, length, count=count)
+        self.seek = seek
+
+    @property
+    def visible(self):
+        if self.seek is None:
+            return super().visible
+        ordering, values = self.seek
+        return KeysetScrollerInView(self.queryset, ordering, values, self.length)
+
+
 class JQueryDataTableMixin:
     """
     A mixin to help with implementing jQueryDataTables where the data is gotten via Ajax.
@@ -119,25 +251,98 @@ class JQueryDataTableMixin:
     paginate_by = 25
     searchable_fields = None
     row_identifier = None
+    search_similarity = 0.5
+    keyset_pagination = False
+    # must be unique and a key of the rows
+    keyset_identifier = "id"
+    keyset_salt = "accountancy.keyset"
+    table_data_cache_timeout = 60 * 60
+    # not part of the cache key.  draw changes with every request and "_" is the jQuery cache buster.
+    uncached_params = ["draw", "_"]
 
     def get(self, request, *args, **kwargs):
         if request.is_ajax():
+            if self.get_ledger_modules() is not None:
+                return self.get_cached_table_response()
             table_data = self.get_table_data()
             return JsonResponse(data=table_data, safe=False)
         return self.render_to_response(self.load_page())
 
+    def get_ledger_modules(self):
+        """
+        The ledgers, as QueuePosts module codes, a post to which could change the table.
+        None means the table data is never cached.
+        """
+        return None
+
+    def get_ledger_versions(self):
+        if not hasattr(self, "ledger_versions"):
+            self.ledger_versions = QueuePosts.get_versions(
+                self.get_ledger_modules())
+        return self.ledger_versions
+
+    def get_table_data_cache_key(self):
+        """
+        The form returned with the table data includes a CSRF token so the response is cached
+        per user and CSRF cookie.
+        """
+        query = urlencode(
+            sorted(
+                (param, values)
+                for param, values in self.request.GET.lists()
+                if param not in self.uncached_params
+            ),
+            doseq=True
+        )
+        key = ":".join(
+            str(k) for k in [
+                self.__class__.__module__,
+                self.__class__.__name__,
+                self.request.user.pk,
+                self.request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+                *self.get_ledger_versions(),
+                query
+            ]
+        )
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def get_cached_table_response(self):
+        """
+        The table data is cached as JSON, without the draw, until the ledger is next posted to.
+        The cache key is also the ETag so a conditional GET for unchanged data is answered
+        without touching the table data at all.
+        """
+        key = self.get_table_data_cache_key()
+        etag = quote_etag(key)
+        if etag in parse_etags(self.request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+        content = cache.get("table_data:" + key)
+        if content is None:
+            table_data = self.get_table_data()
+            table_data.pop("draw", None)
+            content = json.dumps(table_data, cls=DjangoJSONEncoder)
+            cache.set("table_data:" + key, content, self.table_data_cache_timeout)
+        draw = int(self.request.GET.get("draw", 0))
+        response = HttpResponse(
+            '{"draw": %d, %s' % (draw, content[1:]),
+            content_type="application/json"
+        )
+        response["ETag"] = etag
+        # the browser must check the data is current each time
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
     def apply_filter(self, queryset, **kwargs):
         parsed_request = parser.parse(self.request.GET.urlencode())
         if search_value := parsed_request["search"]["value"]:
             if self.searchable_fields:
-                queryset = queryset.annotate(
-                    similarity=(
-                        get_trig_vectors_for_different_inputs([
-                            (field, search_value, )
-                            for field in self.searchable_fields
-                        ])
-                    )
-                ).filter(similarity__gt=0.5)
+                queryset = trigram_search(
+                    queryset,
+                    [(field, search_value) for field in self.searchable_fields],
+                    self.search_similarity
+                )
         return queryset
 
     def get_row(self, obj):
@@ -158,13 +363,63 @@ class JQueryDataTableMixin:
         return row.pk
 
     def order(self, queryset):
+        if self.keyset_pagination:
+            return queryset.order_by(*self.get_keyset_ordering())
         return queryset.order_by(*self.order_by())
 
+    def get_keyset_ordering(self):
+        """
+        The ordering asked for with a unique field last so each row has a unique position
+        """
+        return [*self.order_by(), self.keyset_identifier]
+
+    def get_keyset_signature(self, queryset):
+        """
+        A cursor is only good for the same filters and ordering it was made with
+        """
+        sql, params = queryset.query.sql_with_params()
+        key = ":".join(str(k) for k in [sql, *params])
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def dump_keyset_cursor(self, queryset, start, obj):
+        values = [
+            get_value(obj, field.lstrip("-"))
+            for field in self.get_keyset_ordering()
+        ]
+        return signing.dumps(
+            [self.get_keyset_signature(queryset), start, values],
+            salt=self.keyset_salt,
+            serializer=KeysetCursorSerializer
+        )
+
+    def load_keyset_cursor(self, queryset, start):
+        """
+        The values of the row before `start` or None if there is no good cursor for it
+        """
+        cursor = self.request.GET.get("cursor")
+        if not cursor:
+            return None
+        try:
+            signature, cursor_start, values = signing.loads(
+                cursor, salt=self.keyset_salt, serializer=KeysetCursorSerializer)
+        except signing.BadSignature:
+            return None
+        if signature != self.get_keyset_signature(queryset) or cursor_start != int(start):
+            return None
+        return values
+
     def queryset_count(self, queryset):
         q = queryset.all()  # creates a new queryset object
         # otherwise queryset argument is evaluated
         return q.count()
 
+    def filtered_count(self, queryset):
+        """
+        Return the size of the filtered set if it is already known.  Otherwise None
+        and the paginator counts it.
+        """
+        return None
+
     def set_dt_row_data(self, obj, row):
         row["DT_RowData"] = {
             "pk": self.get_row_identifier(obj),
@@ -178,35 +433,83 @@ class JQueryDataTableMixin:
         queryset_count = self.queryset_count(queryset)
         queryset = self.apply_filter(queryset, **kwargs)
         queryset = self.order(queryset)
-        paginator_object, page_object = self.paginate_objects(queryset)
-        rows = []
-        for obj in page_object.object_list:
-            row = self.get_row(obj)
-            row = self.set_dt_row_data(obj, row)
-            rows.append(row)
+        paginator_object, page_object = self.paginate_objects(
+            queryset, count=self.filtered_count(queryset))
+        objects = list(page_object.object_list)
+        if self.keyset_pagination:
+            # before the rows are transformed for the UI
+            cursor = self.get_next_cursor(queryset, objects)
+        rows = self.get_rows(objects)
         draw = int(self.request.GET.get("draw", 0))
         recordsTotal = queryset_count
         recordsFiltered = paginator_object.count  # counts the filtered set
         data = rows
-        return {
+        table_data = {
             "draw": draw,
             "recordsTotal": recordsTotal,
             "recordsFiltered": recordsFiltered,
             "data": data
         }
+        if self.request.GET.get("format") == "compact":
+            table_data["columns"], table_data["data"] = self.compact(rows)
+        if self.keyset_pagination:
+            table_data["cursor"] = cursor
+        return table_data
+
+    def get_rows(self, objects):
+        rows = []
+        for obj in objects:
+            row = self.get_row(obj)
+            row = self.set_dt_row_data(obj, row)
+            rows.append(row)
+        return rows
+
+    def compact(self, rows):
+        """
+        The column names once and a list of values for each row, rather than a dict for each row
+        which repeats the names.  The pk and href of the DT_RowData are the last two values of
+        each row.  The client decodes this back into dicts.
+        """
+        if not rows:
+            return [], []
+        columns = [column for column in rows[0] if column != "DT_RowData"]
+        return columns, [
+            [row[column] for column in columns] +
+            [row["DT_RowData"]["pk"], row["DT_RowData"]["href"]]
+            for row in rows
+        ]
+
+    def get_next_cursor(self, queryset, objects):
+        """
+        The client sends this back with the request for the following page.  None on the last page.
+        """
+        start = int(self.request.GET.get("start", 0))
+        length = int(self.request.GET.get("length", self.paginate_by))
+        if objects and len(objects) == length:
+            return {
+                "start": start + length,
+                "value": self.dump_keyset_cursor(queryset, start + length, objects[-1])
+            }
 
     def load_page(self, **kwargs):
         return {}
 
-    def paginate_objects(self, objects):
+    def paginate_objects(self, objects, count=None):
         """
         Only use this if you are using pagination.  It isn't suitable for jQuery scroller because the
         scroller will request slices which don't necessarily conform to the whole pages.  For this see the
         mixin class JQueryDataTableScrollMixin below.
+
+        `count` is the size of objects if it is already known.
         """
+        if self.keyset_pagination:
+            return self.paginate_objects_by_keyset(objects, count=count)
         start = self.request.GET.get("start", 0)
         paginate_by = self.request.GET.get("length", self.paginate_by)
         paginator_obj = Paginator(objects, paginate_by)
+        if count is not None:
+            # count is a cached property on the paginator
+            paginator_obj.count = count
         page_number = int(int(start) / int(paginate_by)) + 1
         try:
             page_obj = paginator_obj.page(page_number)
@@ -216,6 +519,18 @@ class JQueryDataTableMixin:
             page_obj = paginator_obj.page(paginator_obj.num_pages)
         return paginator_obj, page_obj
 
+    def paginate_objects_by_keyset(self, queryset, count=None):
+        """
+        Seeks to the page using the cursor sent by the client, if there is one, for the page requested.
+        Otherwise the page is taken with an OFFSET e.g. when the user jumps straight to the last page.
+        """
+        start = self.request.GET.get("start", 0)
+        length = self.request.GET.get("length", self.paginate_by)
+        values = self.load_keyset_cursor(queryset, start)
+        seek = (self.get_keyset_ordering(), values) if values is not None else None
+        s = KeysetScroller(queryset, start, length, seek=seek, count=count)
+        return s, s.visible
+
     def order_objects(self, objs):
         """
         Sometimes it is not possible in Django to use the ORM, or it would be tricky,
@@ -330,10 +645,10 @@ class JQueryDataTableScrollerMixin:
     Supports the scroller feature of jQueryDataTables.
     """
 
-    def paginate_objects(self, queryset_or_object_list):
+    def paginate_objects(self, queryset_or_object_list, count=None):
         start = self.request.GET.get("start", 0)
         length = self.request.GET.get("length", 25)
-        s = Scroller(queryset_or_object_list, start, length)
+        s = Scroller(queryset_or_object_list, start, length, count=count)
         return s, s.visible
 
 
@@ -348,15 +663,10 @@ class SalesAndPurchaseSearchMixin:
         end_date = cleaned_data.get("end_date")
         include_voided = cleaned_data.get("include_voided")
         if reference:
-            queryset = (
-                queryset.annotate(
-                    similarity=(
-                        get_trig_vectors_for_different_inputs(
-                            self.get_list_of_search_values_for_model_attrs(
-                                cleaned_data)
-                        )
-                    )
-                ).filter(similarity__gt=0.5)
+            queryset = trigram_search(
+                queryset,
+                self.get_list_of_search_values_for_model_attrs(cleaned_data),
+                self.search_similarity
             )
         if total:
             queryset = queryset.filter(total=total)
@@ -389,15 +699,10 @@ class VatSearchMixin:
         start_date = cleaned_data.get("start_date")
         end_date = cleaned_data.get("end_date")
         if reference:
-            queryset = (
-                queryset.annotate(
-                    similarity=(
-                        get_trig_vectors_for_different_inputs(
-                            self.get_list_of_search_values_for_model_attrs(
-                                cleaned_data)
-                        )
-                    )
-                ).filter(similarity__gt=0.5)
+            queryset = trigram_search(
+                queryset,
+                self.get_list_of_search_values_for_model_attrs(cleaned_data),
+                self.search_similarity
             )
         if total:
             queryset = queryset.filter(total=total)
@@ -427,6 +732,86 @@ class BaseTransactionsList(CustomFilterJQueryDataTableMixin,
     # keys are those fields you want to show form,
     form_field_to_searchable_model_attr = {}
     # values are those model attrs the form field maps to
+    count_cache_timeout = 60 * 60
+    keyset_pagination = True
+    export_chunk_size = 2000
+    export_filename = "transactions"
+
+    def get(self, request, *args, **kwargs):
+        if request.GET.get("export") == "csv":
+            return self.export()
+        return super().get(request, *args, **kwargs)
+
+    def get_ledger_modules(self):
+        """
+        Posting to any ledger can create nominal, vat or cash book transactions
+        """
+        return [code for code, fullname in QueuePosts.POST_MODULES]
+
+    def get_export_queryset(self):
+        """
+        The same filter and ordering as the table
+        """
+        kwargs = {}
+        if self.request.GET.get("use_adv_search"):
+            kwargs["form"] = self.get_filter_form(bind_form=True)
+        queryset = self.get_queryset(**kwargs)
+        queryset = self.apply_filter(queryset, **kwargs)
+        return self.order(queryset)
+
+    def get_export_rows(self, queryset):
+        """
+        The rows are read from a server side cursor and transformed a chunk at a time
+        so memory stays flat no matter how many transactions match.
+        """
+        yield [label for field, label in self.fields]
+        objects = queryset.iterator(chunk_size=self.export_chunk_size)
+        while chunk := list(islice(objects, self.export_chunk_size)):
+            for obj in self.transform_rows(chunk):
+                yield [obj[field] for field, label in self.fields]
+
+    def get_export_filename(self):
+        return self.export_filename + ".csv"
+
+    def export(self):
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (
+                writer.writerow(row)
+                for row in self.get_export_rows(self.get_export_queryset())
+            ),
+            content_type="text/csv"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{self.get_export_filename()}"'
+        return response
+
+    def get_count_cache_key(self, queryset):
+        """
+        The SQL and params identify the filters applied.  The ledger versions mean the
+        cached count is stale as soon as the ledger is posted to.
+        """
+        sql, params = queryset.order_by().query.sql_with_params()
+        key = ":".join(
+            str(k) for k in [self.model._meta.label, *self.get_ledger_versions(), sql, *params]
+        )
+        return "enquiry_count:" + hashlib.md5(key.encode()).hexdigest()
+
+    def cached_count(self, queryset):
+        key = self.get_count_cache_key(queryset)
+        count = cache.get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    def queryset_count(self, queryset):
+        if settings.ESTIMATE_ENQUIRY_TOTALS:
+            # planner statistics rather than a scan of the whole table
+            return estimate_count(queryset)
+        return self.cached_count(queryset)
+
+    def filtered_count(self, queryset):
+        return self.cached_count(queryset)
 
     def get_list_of_search_values_for_model_attrs(self, form_cleaned_data):
         """
@@ -448,6 +833,23 @@ class BaseTransactionsList(CustomFilterJQueryDataTableMixin,
             obj[column] = transformer(obj[column])
         return obj
 
+    def transform_rows(self, objects):
+        """
+        The column transformers are applied a column at a time and only once for each distinct
+        value in `objects`.  A page of transactions has few distinct dates and periods.
+        """
+        for column, transformer in self.column_transformers.items():
+            transformed = {}
+            for obj in objects:
+                value = obj[column]
+                if value not in transformed:
+                    transformed[value] = transformer(value)
+                obj[column] = transformed[value]
+        return objects
+
+    def get_rows(self, objects):
+        return [self.set_dt_row_data(obj, obj) for obj in self.transform_rows(objects)]
+
     def filter_form_valid(self, queryset, form):
         return self.apply_advanced_search(queryset, form.cleaned_data)
 
@@ -468,14 +870,62 @@ class NominalTransList(NominalSearchMixin, VatSearchMixin, BaseTransactionsList)
 
 
 class SalesAndPurchasesTransList(SalesAndPurchaseSearchMixin, BaseTransactionsList):
-    pass
+
+    def get_group_filters(self):
+        """
+        The filter for each tab of the enquiry keyed by the group in the query string
+        """
+        outstanding = ~Q(due=0)
+        return {
+            "a": Q(),
+            "ap": outstanding,
+            "o": outstanding & Q(due_date__lt=timezone.now()),
+            "p": Q(due=0)
+        }
+
+    def get_querysets(self):
+        group = self.request.GET.get("group", 'a')
+        return self.model.objects.filter(self.get_group_filters().get(group, Q()))
+
+    def get_group_totals(self):
+        """
+        The count and outstanding total of every tab from a single conditional aggregate.
+        Void transactions are left out like they are from the enquiry by default.
+        """
+        filters = self.get_group_filters()
+        aggregates = {}
+        for group, q in filters.items():
+            aggregates[group + "_count"] = Count("pk", filter=q)
+            aggregates[group + "_due"] = Sum("due", filter=q)
+        totals = self.model.objects.exclude(status="v").aggregate(**aggregates)
+        return {
+            group: {
+                "count": totals[group + "_count"],
+                "due": totals[group + "_due"] or 0
+            }
+            for group in filters
+        }
+
+    def load_page(self, **kwargs):
+        context_data = super().load_page(**kwargs)
+        context_data["group_totals"] = self.get_group_totals()
+        return context_data
+
+    def get_ledger_modules(self):
+        return [QueuePosts.get_module(self.model._meta.app_label)]
 
 
 class RESTBaseTransactionMixin:
+    """
+    The forms validate what is entered.  The service_class, see accountancy.services, posts it.
+    """
+    service_class = None
+
+    def get_service(self):
+        return self.service_class(user=self.request.user)
 
-    def create_or_update_related_transactions(self, **kwargs):
-        self.create_or_update_nominal_transactions(**kwargs)
-        self.create_or_update_vat_transactions(**kwargs)
+    def get_transaction_kwargs(self):
+        return {}
 
     def get_transaction_type_object(self):
         if hasattr(self, "transaction_type_object"):
@@ -607,8 +1057,7 @@ class RESTBaseTransactionMixin:
             self.line_formset = self.get_line_formset(self.header_obj)
             self.line_formset.header_form_valid = True
             if self.line_formset.is_valid():
-                self.header_obj.save()
-                self.lines_are_valid()
+                self.forms_are_valid()
             else:
                 return self.invalid_forms()
         else:
@@ -673,44 +1122,29 @@ class RESTBaseCreateTransactionMixin:
             return self.default_type
         return t
 
-    def create_or_update_nominal_transactions(self, **kwargs):
-        kwargs.update({
-            "line_cls": self.get_line_model(),
-            "vat_nominal_name": settings.DEFAULT_VAT_NOMINAL,
-        })
-        transaction_type_object = self.get_transaction_type_object()
-        self.nom_trans = transaction_type_object.create_nominal_transactions(
-            self.nominal_model,
-            self.nominal_transaction_model,
-            **kwargs
-        )
-
-    def create_or_update_vat_transactions(self, **kwargs):
-        kwargs.update({
-            "line_cls": self.get_line_model(),
-        })
-        transaction_type_object = self.get_transaction_type_object()
-        self.vat_trans = transaction_type_object.create_vat_transactions(
-            self.vat_transaction_model,
-            **kwargs
-        )
-
-    def lines_are_valid(self):
-        line_no = 1
-        lines = []
+    def get_lines(self):
+        """
+        The lines entered, not yet saved, in the order entered
+        """
         line_forms = self.line_formset.ordered_forms if self.lines_should_be_ordered(
         ) else self.line_formset
-        for form in line_forms:
-            if form.empty_permitted and form.has_changed():
-                line = form.save(commit=False)
-                line.header = self.header_obj
-                line.type = self.header_obj.type
-                line.line_no = line_no
-                lines.append(line)
-                line_no = line_no + 1
-        if lines:
-            self.lines = self.get_line_model().objects.audited_bulk_create(lines)
-            self.create_or_update_related_transactions(lines=lines)
+        return [
+            form.save(commit=False)
+            for form in line_forms
+            if form.empty_permitted and form.has_changed()
+        ]
+
+    def get_transaction_kwargs(self):
+        kwargs = super().get_transaction_kwargs()
+        if self.requires_lines(self.header_form):
+            kwargs["lines"] = self.get_lines()
+        return kwargs
+
+    def forms_are_valid(self):
+        self.get_service().create_transaction(
+            self.header_obj,
+            **self.get_transaction_kwargs()
+        )
 
     def get_header_form_kwargs(self):
         kwargs = super().get_header_form_kwargs()
@@ -735,23 +1169,7 @@ class BaseCreateTransaction(
         return context
 
 
-class CreateCashBookEntriesMixin:
-
-    def get_cash_book_transaction_model(self):
-        return self.cash_book_transaction_model
-
-    def create_or_update_cash_book_transactions(self, **kwargs):
-        self.transaction_type_object.create_cash_book_entry(
-            self.get_cash_book_transaction_model(),
-            **kwargs
-        )
-
-    def create_or_update_related_transactions(self, **kwargs):
-        super().create_or_update_related_transactions(**kwargs)
-        self.create_or_update_cash_book_transactions(**kwargs)
-
-
-class CreateCashBookTransaction(CreateCashBookEntriesMixin, BaseCreateTransaction):
+class CreateCashBookTransaction(BaseCreateTransaction):
     pass
 
 
@@ -797,6 +1215,13 @@ class BaseMatchingMixin:
                 f.helper.template = self.matching_formset_template
                 return f
 
+    def get_match_kwargs(self):
+        return {}
+
+    def get_transaction_kwargs(self):
+        kwargs = super().get_transaction_kwargs()
+        kwargs.update(self.get_match_kwargs())
+        return kwargs
 
     def flag_invalid_forms(self):
         super().flag_invalid_forms()
@@ -827,9 +1252,7 @@ class BaseMatchingMixin:
             self.match_formset = self.get_match_formset(self.header_obj)
             if not self.requires_lines(self.header_form):
                 if self.match_formset.is_valid():
-                    self.header_obj.save()
-                    self.create_or_update_related_transactions()
-                    self.matching_is_valid()
+                    self.forms_are_valid()
                     messages.success(
                         request,
                         self.get_success_message()
@@ -840,9 +1263,7 @@ class BaseMatchingMixin:
                 # TODO - remove this seemingly needless check
                 if self.line_formset and self.match_formset:
                     if self.line_formset.is_valid() and self.match_formset.is_valid():
-                        self.header_obj.save()
-                        self.lines_are_valid()
-                        self.matching_is_valid()
+                        self.forms_are_valid()
                         messages.success(
                             request,
                             self.get_success_message()
@@ -856,42 +1277,22 @@ class BaseMatchingMixin:
 
 class CreateMatchingMixin(BaseMatchingMixin):
 
-    def matching_is_valid(self):
-        matches = []
-        for form in self.match_formset:
-            if form.empty_permitted and form.has_changed():
-                match = form.save(commit=False)
-                match.matched_by_type = match.matched_by.type
-                match.matched_to_type = match.matched_to.type
-                match.period = self.header_obj.period
-                if match.value != 0:
-                    matches.append(match)
-        if matches:
-            self.get_header_model().objects.audited_bulk_update(
-                self.match_formset.headers,
-                ['due', 'paid']
-            )
-            self.get_match_model().objects.audited_bulk_create(matches)
+    def get_match_kwargs(self):
+        return {
+            "matches": [
+                form.save(commit=False)
+                for form in self.match_formset
+                if form.empty_permitted and form.has_changed()
+            ],
+            # the headers the matching changed the due and paid for
+            "matched_headers": getattr(self.match_formset, "headers", [])
+        }
 
 
 class CreatePurchaseOrSalesTransaction(
         CreateMatchingMixin,
-        CreateCashBookEntriesMixin,
         BaseCreateTransaction):
-
-    def create_or_update_nominal_transactions(self, **kwargs):
-        kwargs.update({
-            "line_cls": self.get_line_model(),
-            "control_nominal_name": self.control_nominal_name,
-            "vat_nominal_name": settings.DEFAULT_VAT_NOMINAL,
-        })
-        # e.g. Invoice, CreditNote etc
-        transaction_type_object = self.get_transaction_type_object()
-        transaction_type_object.create_nominal_transactions(
-            self.nominal_model,
-            self.nominal_transaction_model,
-            **kwargs
-        )
+    pass
 
 
 class RESTIndividualTransactionForHeaderMixin:
@@ -936,43 +1337,25 @@ class IndividualTransactionMixin:
 class RESTBaseEditTransactionMixin:
     permission_action = 'edit'
 
-    def create_or_update_nominal_transactions(self, **kwargs):
-        kwargs.update({
-            "line_cls": self.get_line_model(),
-            "vat_nominal_name": settings.DEFAULT_VAT_NOMINAL,
-        })
-        transaction_type_object = self.get_transaction_type_object()
-        self.nom_trans = transaction_type_object.edit_nominal_transactions(
-            self.nominal_model,
-            self.nominal_transaction_model,
-            **kwargs
-        )
-
-    def create_or_update_vat_transactions(self, **kwargs):
-        kwargs.update({
-            "line_cls": self.get_line_model(),
-        })
-        transaction_type_object = self.get_transaction_type_object()
-        self.vat_trans = transaction_type_object.edit_vat_transactions(
-            self.vat_transaction_model,
-            **kwargs
-        )
-
     def dispatch(self, request, *args, **kwargs):
         if self.main_header.is_void():
             return HttpResponseForbidden("Void transactions cannot be edited")
         return super().dispatch(request, *args, **kwargs)
 
-    def lines_are_valid(self):
+    def get_line_changes(self):
+        """
+        The new lines, the lines to update and the lines to delete.  The new lines and
+        the lines to update are numbered in the order entered.
+        """
         self.line_formset.save(commit=False)
-        self.lines_to_delete = self.line_formset.deleted_objects
+        deleted_lines = self.line_formset.deleted_objects
         line_forms = self.line_formset.ordered_forms if self.lines_should_be_ordered(
         ) else self.line_formset
         lines_to_be_created_or_updated_only = []  # excluding those to delete
         for form in line_forms:
             if form.empty_permitted and form.has_changed():
                 lines_to_be_created_or_updated_only.append(form)
-            elif not form.empty_permitted and form.instance not in self.lines_to_delete:
+            elif not form.empty_permitted and form.instance not in deleted_lines:
                 lines_to_be_created_or_updated_only.append(form)
         line_no = 1
         lines_to_update = []
@@ -989,28 +1372,24 @@ class RESTBaseEditTransactionMixin:
                     line_no = line_no + 1
                     lines_to_update.append(form.instance)
                 else:
-                    self.line_formset.deleted_objects.append(form.instance)
-        self.lines_to_update = lines_to_update
-        self.new_lines = new_lines = self.get_line_model(
-        ).objects.audited_bulk_create(self.line_formset.new_objects)
-        self.get_line_model().objects.audited_bulk_update(lines_to_update)
-        bulk_delete_with_history(
-            self.line_formset.deleted_objects,
-            self.get_line_model()
+                    deleted_lines.append(form.instance)
+        return {
+            "new_lines": self.line_formset.new_objects,
+            "lines_to_update": lines_to_update,
+            "deleted_lines": deleted_lines
+        }
+
+    def get_transaction_kwargs(self):
+        kwargs = super().get_transaction_kwargs()
+        if self.requires_lines(self.header_form):
+            kwargs.update(self.get_line_changes())
+        return kwargs
+
+    def forms_are_valid(self):
+        self.get_service().edit_transaction(
+            self.header_obj,
+            **self.get_transaction_kwargs()
         )
-        if self.requires_analysis(self.header_form):
-            existing_nom_trans = self.nominal_transaction_model.objects.filter(
-                module=self.module,
-                header=self.header_obj.pk)
-            existing_vat_trans = self.vat_transaction_model.objects.filter(
-                module=self.module, header=self.header_obj.pk)
-            self.create_or_update_related_transactions(
-                new_lines=new_lines,
-                lines_to_update=lines_to_update,
-                deleted_lines=self.line_formset.deleted_objects,
-                existing_nom_trans=existing_nom_trans,
-                existing_vat_trans=existing_vat_trans
-            )
 
 
 class ViewTransactionAuditMixin:
@@ -1062,42 +1441,26 @@ class EditMatchingMixin(CreateMatchingMixin):
         header = self.main_header
         return super().get_match_formset(header)
 
-    def matching_is_valid(self):
+    def get_match_kwargs(self):
         self.match_formset.save(commit=False)
-        to_create = [
-            m.instance
-            for m in self.match_formset
-            if not m.instance.pk and m.instance.value
-        ]
-        to_update = [
-            m.instance
-            for m in self.match_formset
-            if m.instance.pk and m.instance.value
-        ]
-        to_delete = [
-            m.instance
-            for m in self.match_formset
-            if m.instance.pk and not m.instance.value
-        ]
-        for match in to_create + to_update:
-            if match.matched_by_id == self.header_obj.pk:
-                match.matched_by_type = self.header_obj.type
-                match.matched_to_type = match.matched_to.type
-                match.period = self.header_obj.period
-            else:
-                match.matched_by_type = match.matched_by.type
-                match.matched_to_type = self.header_obj.type
-        self.get_match_model().objects.audited_bulk_create(to_create)
-        self.get_match_model().objects.audited_bulk_update(
-            to_update, ['value', 'matched_by_type', 'matched_to_type', 'period'])
-        bulk_delete_with_history(
-            to_delete,
-            self.get_match_model()
-        )
-        self.get_header_model().objects.audited_bulk_update(
-            self.match_formset.headers,
-            ['due', 'paid']
-        )
+        return {
+            "new_matches": [
+                m.instance
+                for m in self.match_formset
+                if not m.instance.pk and m.instance.value
+            ],
+            "matches_to_update": [
+                m.instance
+                for m in self.match_formset
+                if m.instance.pk and m.instance.value
+            ],
+            "deleted_matches": [
+                m.instance
+                for m in self.match_formset
+                if m.instance.pk and not m.instance.value
+            ],
+            "matched_headers": getattr(self.match_formset, "headers", [])
+        }
 
 
 class NominalTransactionsMixin:
@@ -1117,26 +1480,7 @@ class NominalTransactionsMixin:
         return context
 
 
-class EditCashBookEntriesMixin(CreateCashBookEntriesMixin):
-
-    def lines_are_valid(self):
-        super().lines_are_valid()
-        if not self.requires_analysis(self.header_form):
-            # cash book is unlike other ledgers -
-            # bf on cash book should still post cash book transaction
-            # bf on SL and PL does not post relate trans (cb, nominal, vat)
-            # bf does not exist on nominal
-            self.create_or_update_related_transactions()
-
-    def create_or_update_cash_book_transactions(self, **kwargs):
-        self.transaction_type_object.edit_cash_book_entry(
-            self.get_cash_book_transaction_model(),
-            **kwargs
-        )
-
-
 class EditCashBookTransaction(
-        EditCashBookEntriesMixin,
         NominalTransactionsMixin,
         BaseEditTransaction):
     pass
@@ -1155,24 +1499,11 @@ class ViewSaleOrPurchaseTransactionAuditMixin:
 
 
 class EditPurchaseOrSalesTransaction(
-        EditCashBookEntriesMixin,
         NominalTransactionsMixin,
         EditMatchingMixin,
         ViewSaleOrPurchaseTransactionAuditMixin,
         BaseEditTransaction):
-
-    def create_or_update_nominal_transactions(self, **kwargs):
-        kwargs.update({
-            "line_cls": self.get_line_model(),
-            "control_nominal_name": self.control_nominal_name,
-            "vat_nominal_name": settings.DEFAULT_VAT_NOMINAL,
-        })
-        transaction_type_object = self.get_transaction_type_object()
-        transaction_type_object.edit_nominal_transactions(
-            self.nominal_model,
-            self.nominal_transaction_model,
-            **kwargs
-        )
+    pass
 
 
 class BaseViewTransaction(
@@ -1284,6 +1615,107 @@ class SaleAndPurchaseViewTransaction(
     pass
 
 
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class BaseImportTransactions(View):
+    """
+    Posts the transactions in the uploaded file - CSV or JSON lines, see accountancy.imports -
+    and reports the rows which could not be posted.  The permission to create each type of
+    transaction is checked per row.
+
+    The request is not atomic so that each batch is committed as it is posted.  Otherwise
+    the browser posts to the ledger wait on the lock of the import until the whole file is
+    done.
+    """
+    importer_class = None
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return JsonResponse(
+                data={"success": False, "errors": "Choose a file to import"},
+                status=400
+            )
+        format = request.POST.get("format") or upload.name.rsplit(".", 1)[-1].lower()
+        if format not in ("csv", "jsonl"):
+            return JsonResponse(
+                data={"success": False, "errors": "The file must be csv or jsonl"},
+                status=400
+            )
+        importer = self.importer_class(user=request.user)
+        try:
+            report = importer.run(
+                read_transactions(io.TextIOWrapper(upload, encoding="utf-8", newline=""), format)
+            )
+        except (ValueError, csv.Error):
+            # e.g. the file is not UTF-8.  The batches before the error are already posted.
+            return JsonResponse(
+                data={
+                    "success": False,
+                    "errors": f"The file could not be read as {format}",
+                    "created": importer.created
+                },
+                status=400
+            )
+        return JsonResponse(
+            data={
+                "success": not report["errors"],
+                **report
+            }
+        )
+
+
+class BaseCreateTransactionFromPayload(View):
+    """
+    Creates a single transaction with all of its lines posted as one payload - JSON or CSV,
+    see accountancy.imports.read_lines - under "lines", rather than through the line formset.
+    The other fields are the header fields as the import takes them.
+
+    A transaction with thousands of lines is then validated as a batch, with a query per
+    lookup whatever the number of lines, and posted with the bulk writes of the service.
+    """
+    http_method_names = ['post']
+    service_class = None
+
+    def post(self, request, *args, **kwargs):
+        payload = request.POST.get("lines")
+        upload = request.FILES.get("lines")
+        format = request.POST.get("format") or "json"
+        if not (payload or upload):
+            return JsonResponse(
+                data={"success": False, "errors": {"lines": ["This field is required."]}},
+                status=400
+            )
+        try:
+            if upload:
+                payload = upload.read().decode("utf-8")
+            lines = read_lines(payload, format)
+        except (ValueError, csv.Error):
+            return JsonResponse(
+                data={"success": False, "errors": {"lines": [f"The lines could not be read as {format}."]}},
+                status=400
+            )
+        data = {
+            field: value
+            for field, value in request.POST.items()
+            if field not in ("lines", "format")
+        }
+        data["lines"] = lines
+        try:
+            header = self.service_class(user=request.user).create(data)
+        except ValidationError as e:
+            return JsonResponse(
+                data={"success": False, "errors": e.message_dict},
+                status=400
+            )
+        return JsonResponse(
+            data={
+                "success": True,
+                "id": header.pk,
+                "href": reverse(f"{header._meta.app_label}:view", kwargs={"pk": header.pk})
+            }
+        )
+
+
 class BaseVoidTransaction(
         IndividualTransactionMixin,
         View):
@@ -1407,6 +1839,7 @@ class SaleAndPurchaseVoidTransaction(BaseVoidTransaction):
             matches,
             matching_model
         )
+        matching_model.update_allocations(matches)
         self.update_headers()
         self.delete_related()
 
@@ -1450,6 +1883,9 @@ class AgeMatchingReportMixin(
             'field': '4 month'
         }
     ]
+    export_chunk_size = 2000
+    report_cache_timeout = 60 * 60
+    cached_report = None
     column_transformers = {
         "date": lambda d: d.strftime('%d %b %Y') if d and not isinstance(d, JSONBlankDate) else "",
         # payment trans do not have due dates
@@ -1477,105 +1913,18 @@ class AgeMatchingReportMixin(
             return filtered_by_contact
         return transactions
 
-    def aggregate_is_zero(self, aggregate):
-        if (
-            aggregate["total"] or aggregate["unallocated"] or aggregate["current"]
-            or aggregate["1 month"] or aggregate["2 month"] or aggregate["3 month"]
-            or aggregate["4 month"]
-        ):
-            return False
-        else:
-            return True
-
-    def create_report_transaction(self, header, report_period):
-        # header e.g. PurchaseHeader or SaleHeader
-        contact_field_name = self.contact_field_name
-        report_tran = {
-            "meta": {
-                "contact_pk": getattr(header, contact_field_name).pk
-            },
-            contact_field_name: getattr(header, contact_field_name).name,
-            "date": header.date,
-            # JSONBlankDate just returns "" instead of the datetime when serialized.
-            # we need this because otherwise the order_objects cannot work
-            # i.e. str < date object will not work
-            "due_date": header.due_date or JSONBlankDate(1900, 1, 1),
-            "ref": header.ref,
-            "total": header.total,
-        }
-        if header.is_payment_type():
-            report_tran["unallocated"] = header.due
-            report_tran["current"] = 0
-            report_tran["1 month"] = 0
-            report_tran["2 month"] = 0
-            report_tran["3 month"] = 0
-            report_tran["4 month"] = 0
-        else:
-            report_tran["unallocated"] = 0
-
-            if header.period == report_period:
-                report_tran["current"] = header.due
-            else:
-                report_tran["current"] = 0
-
-            try:
-                if header.period == report_period - 1:
-                    report_tran["1 month"] = header.due
-                else:
-                    report_tran["1 month"] = 0
-            except MissingPeriodError:
-                report_tran["1 month"] = 0
-
-            try:
-                if header.period == report_period - 2:
-                    report_tran["2 month"] = header.due
-                else:
-                    report_tran["2 month"] = 0
-            except MissingPeriodError:
-                report_tran["2 month"] = 0
-
-            try:
-                if header.period == report_period - 3:
-                    report_tran["3 month"] = header.due
-                else:
-                    report_tran["3 month"] = 0
-            except MissingPeriodError:
-                report_tran["3 month"] = 0
+    def get_aged_report(self, form):
+        return AgedMatchingReport(
+            self.model,
+            self.match_model,
+            self.contact_field_name
+        )
 
-            try:
-                if header.period <= report_period - 4:
-                    report_tran["4 month"] = header.due
-                else:
-                    report_tran["4 month"] = 0
-            except MissingPeriodError:
-                report_tran["4 month"] = 0
-
-        return report_tran
-
-    def aggregate_transactions(self, transactions):
-        def _aggregate_transactions(x, y):
-            x["unallocated"] += y["unallocated"]
-            x["total"] += y["total"]
-            x["current"] += y["current"]
-            x["1 month"] += y["1 month"]
-            x["2 month"] += y["2 month"]
-            x["3 month"] += y["3 month"]
-            x["4 month"] += y["4 month"]
-            return x
-        aggregate = functools.reduce(_aggregate_transactions, transactions)
-        aggregate["ref"] = ''
-        aggregate["date"] = ''
-        aggregate["due_date"] = ''
-        return aggregate
+    def get_filter_form_initial(self, current_period):
+        return {"period": current_period, "show_transactions": True}
 
-    def load_page(self):
-        context = {}
-        mod_settings = ModuleSettings.objects.first()
-        current_period = getattr(mod_settings, self.module_setting_name)
-        form = self.get_filter_form(
-            initial={"period": current_period, "show_transactions": True})
-        context["form"] = form
-        context["columns"] = columns = []
+    def get_columns(self):
+        columns = []
         show_trans_columns = self.show_trans_columns.copy()
         show_trans_columns.insert(0, self.contact_field_name)
         for column in show_trans_columns:
@@ -1586,6 +1935,16 @@ class AgeMatchingReportMixin(
                 })
             elif isinstance(column, dict):
                 columns.append(column)
+        return columns
+
+    def load_page(self):
+        context = {}
+        mod_settings = ModuleSettings.objects.first()
+        current_period = getattr(mod_settings, self.module_setting_name)
+        form = self.get_filter_form(
+            initial=self.get_filter_form_initial(current_period))
+        context["form"] = form
+        context["columns"] = self.get_columns()
         from_contact_field, to_contact_field = self.get_contact_range_field_names()
         context["contact_field_name"] = self.contact_field_name
         context["from_contact_field"] = from_contact_field
@@ -1595,6 +1954,73 @@ class AgeMatchingReportMixin(
     def get_contact_range_field_names(self):
         return self.contact_range_field_names
 
+    def get(self, request, *args, **kwargs):
+        if request.GET.get("export") == "csv":
+            return self.export()
+        return super().get(request, *args, **kwargs)
+
+    def get_export_columns(self, show_transactions):
+        columns = self.get_columns()
+        if not show_transactions:
+            # the summary per contact has no date, due date or ref
+            columns = [
+                column
+                for column in columns
+                if column["field"] not in ("date", "due_date", "ref")
+            ]
+        return columns
+
+    def get_export_filename(self, period, show_transactions):
+        filename = f"{self.export_filename}_{period.fy_and_period}"
+        if not show_transactions:
+            filename += "_summary"
+        return filename + ".csv"
+
+    def get_export_rows(self, form):
+        """
+        The report is read from a server side cursor and written a row at a time
+        so memory stays flat no matter how large the ledger is.
+        """
+        from_contact_field, to_contact_field = self.get_contact_range_field_names()
+        from_contact = form.cleaned_data.get(from_contact_field)
+        to_contact = form.cleaned_data.get(to_contact_field)
+        period = form.cleaned_data.get("period")
+        show_transactions = form.cleaned_data.get("show_transactions")
+        aged_report = self.get_aged_report(form)
+        if show_transactions:
+            report_trans = aged_report.iter_transactions(
+                period, from_contact, to_contact, chunk_size=self.export_chunk_size)
+        else:
+            report_trans = aged_report.iter_contact_totals(
+                period, from_contact, to_contact, chunk_size=self.export_chunk_size)
+        columns = self.get_export_columns(show_transactions)
+        yield [column["label"] for column in columns]
+        for report_tran in report_trans:
+            row = self.get_row(report_tran)
+            yield [row[column["field"]] for column in columns]
+
+    def export(self):
+        form = self.get_filter_form(bind_form=True)
+        if not form.is_valid():
+            return JsonResponse(
+                data={
+                    "success": False,
+                    "errors": form.errors.get_json_data()
+                },
+                status=400
+            )
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in self.get_export_rows(form)),
+            content_type="text/csv"
+        )
+        filename = self.get_export_filename(
+            form.cleaned_data.get("period"),
+            form.cleaned_data.get("show_transactions")
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
     def get_row_identifier(self, obj):
         return
 
@@ -1604,64 +2030,170 @@ class AgeMatchingReportMixin(
         return obj
 
     def queryset_count(self, filtered_and_ordered_transactions):
+        if self.cached_report is not None:
+            return self.cached_report["total"]
         return len(filtered_and_ordered_transactions)
 
     def order(self, filtered_transactions):
+        if self.cached_report is not None:
+            # already ordered before it was cached
+            return filtered_transactions
         return self.order_objects(filtered_transactions)
 
     def filter_form_valid(self, transactions, form):
+        if self.cached_report is not None:
+            # already filtered before it was cached
+            return transactions
         from_contact_field, to_contact_field = self.get_contact_range_field_names()
         from_contact = form.cleaned_data.get(from_contact_field)
         to_contact = form.cleaned_data.get(to_contact_field)
-        period = form.cleaned_data.get("period")
         # only filter applied so far is `period` but for the purpose of recordsFiltered which jQueryDataTable needs,
         # this does not count because it is a necessary filter
         # now we filter by the contact below.  This does count and so it is the first real filter (i.e. optional)
-        if form.cleaned_data.get("show_transactions"):
-            report_trans = []
-            for tran in transactions:
-                report_trans.append(
-                    self.create_report_transaction(tran, period)
-                )
-        else:
-            report_trans = transactions
-        return self.filter_by_contact(report_trans, from_contact, to_contact)
+        return self.filter_by_contact(transactions, from_contact, to_contact)
 
     def filter_form_invalid(self, queryset, form):
         return []
 
-    def get_queryset(self, **kwargs):
-        q = super().get_queryset(**kwargs)
-        queryset = q.select_related(self.contact_field_name)
-        form = kwargs["form"]
-        if not form.is_valid():
-            return []
-        contact_field_name = self.contact_field_name
+    def get_report_cache_key_parts(self, form):
         from_contact_field, to_contact_field = self.get_contact_range_field_names()
         from_contact = form.cleaned_data.get(from_contact_field)
         to_contact = form.cleaned_data.get(to_contact_field)
+        module = QueuePosts.get_module(self.model._meta.app_label)
+        return [
+            self.__class__.__name__,
+            QueuePosts.get_version(module),
+            form.cleaned_data.get("period").pk,
+            from_contact.pk if from_contact else "",
+            to_contact.pk if to_contact else "",
+            bool(form.cleaned_data.get("show_transactions")),
+            *self.order_by()
+        ]
+
+    def get_report_cache_key(self, form):
+        """
+        The ledger version is part of the key so the cached report is stale as soon
+        as the ledger is posted to.
+        """
+        key = ":".join(str(k) for k in self.get_report_cache_key_parts(form))
+        return "aged_report:" + hashlib.md5(key.encode()).hexdigest()
+
+    def get_report(self, form):
         period = form.cleaned_data.get("period")
-        # queryset is simply the whole set of PL or SL transactions
-        queryset = queryset.exclude(status="v").filter(period__lte=period).order_by(
-            contact_field_name)  # must order in case
-        # we need to group by contact_field_name below
-        transactions = self.match_model.get_not_fully_matched_at_period(
-            list(queryset), period)
-        if not form.cleaned_data.get("show_transactions"):
-            contact_trans = groupby(
-                transactions, key=lambda t: getattr(t, self.contact_field_name))
-            aggregates = []
-            for contact, trans in contact_trans:
-                report_trans = [
-                    self.create_report_transaction(tran, period)
-                    for tran in trans
-                ]
-                aggregate = self.aggregate_transactions(report_trans)
-                if not self.aggregate_is_zero(aggregate):
-                    aggregates.append(aggregate)
-            aggregates = list(chain(aggregates))
-            return aggregates
-        return transactions
+        # the whole set of PL or SL transactions outstanding at the period, aged in the database
+        aged_report = self.get_aged_report(form)
+        if form.cleaned_data.get("show_transactions"):
+            return aged_report.transactions(period)
+        return aged_report.contact_totals(period)
+
+    def get_cached_report(self, form):
+        """
+        Each scroll asks for another slice of the same report so the report is cached
+        already filtered and ordered.  Only the slice then needs taking.
+        """
+        key = self.get_report_cache_key(form)
+        cached_report = cache.get(key)
+        if cached_report is None:
+            transactions = self.get_report(form)
+            total = len(transactions)
+            transactions = self.filter_form_valid(transactions, form)
+            transactions = self.order(transactions)
+            cached_report = {
+                "total": total,
+                "transactions": transactions
+            }
+            cache.set(key, cached_report, self.report_cache_timeout)
+        return cached_report
+
+    def get_queryset(self, **kwargs):
+        form = kwargs["form"]
+        if not form.is_valid():
+            return []
+        self.cached_report = self.get_cached_report(form)
+        return self.cached_report["transactions"]
+
+
+class AgeMatchingDaysReportMixin:
+    """
+    To be mixed with a subclass of AgeMatchingReportMixin, on the left, so the report
+    is aged by days overdue at a date rather than by period.
+
+    The filter form must include the `as_at` date field (see AgedByDaysFormMixin).
+    """
+
+    def get_day_buckets(self):
+        return settings.AGED_REPORT_DAY_BUCKETS
+
+    def get_aged_report(self, form):
+        return AgedMatchingDaysReport(
+            self.model,
+            self.match_model,
+            self.contact_field_name,
+            form.cleaned_data.get("as_at") if form else None,
+            self.get_day_buckets()
+        )
+
+    def get_filter_form_initial(self, current_period):
+        initial = super().get_filter_form_initial(current_period)
+        initial["as_at"] = date.today()
+        return initial
+
+    def get_columns(self):
+        columns = [
+            {"label": self.contact_field_name.title(), "field": self.contact_field_name},
+            {"label": "Date", "field": "date"},
+            {"label": "Due Date", "field": "due_date"},
+            {"label": "Ref", "field": "ref"},
+            {"label": "Total", "field": "total"},
+        ]
+        for key, _ in self.get_aged_report(None).buckets:
+            columns.append({"label": key.title(), "field": key})
+        return columns
+
+    def get_report_cache_key_parts(self, form):
+        parts = super().get_report_cache_key_parts(form)
+        parts.append(form.cleaned_data.get("as_at"))
+        parts.extend(self.get_day_buckets())
+        return parts
+
+
+class AgeMatchingTrendMixin(View):
+    """
+    The totals of the aged report buckets for each of the last few periods, as JSON, for a chart.
+
+    GET parameters -
+
+        period - pk of the latest period.  Defaults to the current period for the module.
+        periods - how many periods.
+    """
+    default_number_of_periods = 12
+    max_number_of_periods = 24
+
+    def get_period(self):
+        if period := self.request.GET.get("period"):
+            return get_object_or_404(Period, pk=period)
+        mod_settings = ModuleSettings.objects.first()
+        return getattr(mod_settings, self.module_setting_name)
+
+    def get_number_of_periods(self):
+        try:
+            number_of_periods = int(self.request.GET.get(
+                "periods", self.default_number_of_periods))
+        except ValueError:
+            number_of_periods = self.default_number_of_periods
+        return max(1, min(number_of_periods, self.max_number_of_periods))
+
+    def get(self, request, *args, **kwargs):
+        period = self.get_period()
+        aged_report = AgedMatchingReport(
+            self.model,
+            self.match_model,
+            self.contact_field_name
+        )
+        trend = aged_report.trend(period, self.get_number_of_periods())
+        for report_period in trend:
+            report_period["period"] = str(report_period["period"])
+        return JsonResponse(data={"trend": trend})
 
 
 class LoadMatchingTransactions(
@@ -151,18 +151,25 @@ class CashBookLineForm(BaseCashBookLineForm):
         }
 
 
+def check_cash_book_total(header):
+    """
+    Used by the line formset and the import
+    """
+    if header.total == 0:
+        raise forms.ValidationError(
+            _(
+                "Cash book transactions cannot be for a zero value."
+            ),
+            code="zero-cash-book-transaction"
+        )
+
+
 class CashBookLineFormset(SaleAndPurchaseLineFormset):
     def clean(self):
         super().clean()
         if(any(self.errors) or not hasattr(self, 'header')):
             return
-        if self.header.total == 0:
-            raise forms.ValidationError(
-                _(
-                    "Cash book transactions cannot be for a zero value."
-                ),
-                code="zero-cash-book-transaction"
-            )
+        check_cash_book_total(self.header)
 
 
 enter_lines = forms.modelformset_factory(
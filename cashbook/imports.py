@@ -0,0 +1,20 @@
+from accountancy.imports import TransactionImport
+from nominals.models import Nominal, NominalTransaction
+from vat.models import VatTransaction
+
+from cashbook.forms import CashBookHeaderForm, check_cash_book_total
+from cashbook.models import CashBookHeader, CashBookLine, CashBookTransaction
+
+
+class CashBookImport(TransactionImport):
+    header_model = CashBookHeader
+    line_model = CashBookLine
+    header_form = CashBookHeaderForm
+    nominal_model = Nominal
+    nominal_transaction_model = NominalTransaction
+    vat_transaction_model = VatTransaction
+    cash_book_transaction_model = CashBookTransaction
+
+    def clean_totals(self, header, lines):
+        super().clean_totals(header, lines)
+        check_cash_book_total(header)
@@ -0,0 +1,61 @@
+# Generated by Django 3.1.14 on 2026-10-17 07:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    CashBookTransaction = apps.get_model('cashbook', 'CashBookTransaction')
+    CashBookTransactionSummary = apps.get_model('cashbook', 'CashBookTransactionSummary')
+    rows = (
+        CashBookTransaction.objects
+        .values('module', 'header', 'ref', 'period', 'date', 'cash_book', 'type')
+        .annotate(total=models.Sum('value'))
+        .order_by()
+    )
+    CashBookTransactionSummary.objects.bulk_create(
+        [
+            CashBookTransactionSummary(
+                module=row["module"],
+                header=row["header"],
+                ref=row["ref"],
+                period_id=row["period"],
+                date=row["date"],
+                cash_book_id=row["cash_book"],
+                type=row["type"],
+                total=row["total"]
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controls', '0002_queueposts_version'),
+        ('cashbook', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashBookTransactionSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('module', models.CharField(max_length=3)),
+                ('header', models.PositiveIntegerField()),
+                ('ref', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('type', models.CharField(max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cash_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cashbook.cashbook')),
+                ('period', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='controls.period')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cashbooktransactionsummary',
+            index=models.Index(fields=['module', 'header'], name='cashbook_summary_header_idx'),
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-17 10:12
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashbook', '0002_cashbooktransactionsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cashbooktransactionsummary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ref'], name='cashbook_summary_ref_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -1,10 +1,12 @@
 from accountancy.mixins import (AuditMixin, CashBookEntryMixin,
                                 CashBookPaymentTransactionMixin,
                                 VatTransactionMixin)
-from accountancy.models import (MultiLedgerTransactions, NonAuditQuerySet,
-                                Transaction, TransactionHeader,
-                                TransactionLine)
+from accountancy.models import (MultiLedgerTransactionQuerySet,
+                                MultiLedgerTransactions, Transaction,
+                                TransactionHeader, TransactionLine,
+                                TransactionSummary)
 from controls.models import Period
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.db.models import Case, Exists, F, Subquery, Sum, Value, When
 from django.shortcuts import reverse
@@ -107,6 +109,8 @@ class CashBookHeader(ModuleTransactions, TransactionHeader):
     )
     # payee to add
 
+    module = "CB"
+
     class Meta:
         permissions = [
             # enquiry perms
@@ -199,7 +203,7 @@ all_module_types = (
 )
 
 
-class CashBookTransactionQuerySet(NonAuditQuerySet):
+class CashBookTransactionQuerySet(MultiLedgerTransactionQuerySet):
 
     def cash_book_in_and_out_report(self, current_cb_period):
         """
@@ -299,3 +303,30 @@ class CashBookTransaction(MultiLedgerTransactions):
         self.cash_book = header.cash_book
         self.type = header.type
         self.value = f * header.total
+
+
+class CashBookTransactionSummary(TransactionSummary):
+    """
+    The cash book transactions per header for the cash book transaction enquiry
+    """
+    cash_book = models.ForeignKey(CashBook, on_delete=models.CASCADE)
+    type = models.CharField(max_length=10)
+    total = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+        default=0
+    )
+
+    grain = ["cash_book", "type"]
+    sums = {"total": "value"}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['module', 'header'],
+                         name="cashbook_summary_header_idx"),
+            GinIndex(fields=["ref"], opclasses=["gin_trgm_ops"],
+                     name="cashbook_summary_ref_trgm_idx")
+        ]
+
+
+CashBookTransaction.summary_model = CashBookTransactionSummary
@@ -0,0 +1,16 @@
+from accountancy.services import TransactionService
+from nominals.models import Nominal, NominalTransaction
+from vat.models import VatTransaction
+
+from cashbook.imports import CashBookImport
+from cashbook.models import CashBookHeader, CashBookLine, CashBookTransaction
+
+
+class CashBookService(TransactionService):
+    header_model = CashBookHeader
+    line_model = CashBookLine
+    nominal_model = Nominal
+    nominal_transaction_model = NominalTransaction
+    vat_transaction_model = VatTransaction
+    cash_book_transaction_model = CashBookTransaction
+    importer_class = CashBookImport
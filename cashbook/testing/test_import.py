@@ -0,0 +1,114 @@
+import io
+import json
+from datetime import date
+
+from accountancy.imports import read_transactions
+from cashbook.imports import CashBookImport
+from cashbook.models import CashBook, CashBookHeader, CashBookTransaction
+from controls.models import FinancialYear, ModuleSettings, Period
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from nominals.models import Nominal, NominalTransaction
+from vat.models import Vat, VatTransaction
+
+
+class ImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        ModuleSettings.objects.create(
+            cash_book_period=cls.period,
+            nominals_period=cls.period,
+            purchases_period=cls.period,
+            sales_period=cls.period
+        )
+        assets = Nominal.objects.create(name="Assets")
+        current_assets = Nominal.objects.create(
+            parent=assets, name="Current Assets")
+        cls.bank_nominal = Nominal.objects.create(
+            parent=current_assets, name="Bank Account")
+        cls.vat_nominal = Nominal.objects.create(
+            parent=current_assets, name="Vat")
+        expenses = Nominal.objects.create(name="Expenses")
+        cls.nominal = Nominal.objects.create(
+            parent=expenses, name="Stationery")
+        cls.vat_code = Vat.objects.create(
+            code="1", name="standard rate", rate=20)
+        cls.cash_book = CashBook.objects.create(
+            name="Current", nominal=cls.bank_nominal)
+
+    def payment(self, **kwargs):
+        record = {
+            "type": "cp",
+            "cash_book": "Current",
+            "ref": "PAY1",
+            "date": "2020-01-15",
+            "total": 120,
+            "vat_type": "i",
+            "lines": [
+                {"description": "paper", "goods": 100,
+                    "nominal": "Stationery", "vat_code": "1", "vat": 20},
+            ]
+        }
+        record.update(kwargs)
+        return json.dumps(record)
+
+    def run_import(self, *records):
+        f = io.StringIO("".join(record + "\n" for record in records))
+        return CashBookImport(user=self.user).run(read_transactions(f, "jsonl"))
+
+    def test_payment(self):
+        report = self.run_import(self.payment())
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(report["errors"], [])
+        header = CashBookHeader.objects.get()
+        self.assertEqual(header.cash_book, self.cash_book)
+        self.assertEqual(header.total, -120)
+        nom_trans = NominalTransaction.objects.all()
+        # goods, vat and bank
+        self.assertEqual(len(nom_trans), 3)
+        self.assertEqual(sum(tran.value for tran in nom_trans), 0)
+        self.assertEqual(
+            {tran.field: tran.nominal for tran in nom_trans},
+            {
+                "g": self.nominal,
+                "v": self.vat_nominal,
+                "t": self.bank_nominal
+            }
+        )
+        cash_book_tran = CashBookTransaction.objects.get()
+        self.assertEqual(cash_book_tran.cash_book, self.cash_book)
+        self.assertEqual(cash_book_tran.value, -120)
+        self.assertEqual(VatTransaction.objects.get().vat_type, "i")
+
+    def test_unknown_cash_book(self):
+        report = self.run_import(self.payment(cash_book="Savings"))
+        self.assertEqual(report["created"], 0)
+        self.assertIn("cash_book", report["errors"][0]["errors"])
+        self.assertEqual(CashBookHeader.objects.count(), 0)
+
+    def test_rules_of_the_forms(self):
+        report = self.run_import(
+            # the lines net to zero
+            self.payment(total=0, lines=[
+                {"description": "paper", "goods": 100, "nominal": "Stationery"},
+                {"description": "refund", "goods": -100, "nominal": "Stationery"},
+            ]),
+            self.payment(ref="PAY2", total=0, lines=[
+                {"description": "paper", "goods": 0, "nominal": "Stationery", "vat": 0},
+            ]),
+            self.payment(ref="PAY3", vat_type=""),
+            self.payment(ref="P" * 21)
+        )
+        self.assertEqual(report["created"], 0)
+        errors = [error["errors"] for error in report["errors"]]
+        self.assertEqual(errors[0]["__all__"], ["Cash book transactions cannot be for a zero value."])
+        self.assertEqual(errors[1]["line-0-__all__"], ["Goods and Vat cannot both be zero."])
+        self.assertIn("line-0-vat_code", errors[2])
+        self.assertEqual(
+            errors[3]["ref"], ["Ensure this value has at most 20 characters (it has 21)."])
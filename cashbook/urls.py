@@ -1,12 +1,13 @@
 from django.urls import path
 
 from .views import (CashBookCreate, CashBookDetail, CashBookEdit, CashBookList,
-                    CreateTransaction, EditTransaction, TransactionEnquiry,
-                    ViewTransaction, VoidTransaction)
+                    CreateTransaction, EditTransaction, ImportTransactions,
+                    TransactionEnquiry, ViewTransaction, VoidTransaction)
 
 app_name = "cashbook"
 urlpatterns = [
     path("create", CreateTransaction.as_view(), name="create"),
+    path("import", ImportTransactions.as_view(), name="import"),
     path("edit/<int:pk>", EditTransaction.as_view(), name="edit"),
     path("view/<int:pk>", ViewTransaction.as_view(), name="view"),
     path("void/<int:pk>", VoidTransaction.as_view(), name="void"),
@@ -1,30 +1,33 @@
 from accountancy.contrib.mixins import TransactionPermissionMixin
 from accountancy.forms import BaseVoidTransactionForm
 from accountancy.mixins import SingleObjectAuditDetailViewMixin
-from accountancy.views import (BaseViewTransaction, BaseVoidTransaction,
-                               CashBookTransList, CreateCashBookTransaction,
+from accountancy.views import (BaseImportTransactions, BaseViewTransaction,
+                               BaseVoidTransaction, CashBookTransList, CreateCashBookTransaction,
                                DeleteCashBookTransMixin,
                                EditCashBookTransaction,
                                NominalTransactionsMixin)
 from controls.mixins import QueuePostsMixin
+from controls.models import QueuePosts
 from django.conf import settings
 from django.contrib.auth.mixins import (LoginRequiredMixin,
                                         PermissionRequiredMixin)
-from django.db.models import Sum
 from django.http import JsonResponse
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, DetailView, ListView, UpdateView
 from nominals.forms import NominalForm
-from nominals.models import Nominal, NominalTransaction
+from nominals.models import NominalTransaction
 from users.mixins import LockDuringEditMixin, LockTransactionDuringEditMixin
 from vat.forms import VatForm
 from vat.models import VatTransaction
 
 from cashbook.forms import CashBookForm, CashBookTransactionSearchForm
+from cashbook.imports import CashBookImport
 from cashbook.models import CashBook
+from cashbook.services import CashBookService
 
 from .forms import CashBookHeaderForm, CashBookLineForm, enter_lines
-from .models import CashBookHeader, CashBookLine, CashBookTransaction
+from .models import (CashBookHeader, CashBookLine, CashBookTransaction,
+                     CashBookTransactionSummary)
 
 
 class CreateTransaction(
@@ -49,14 +52,15 @@ class CreateTransaction(
     }
     template_name = "cashbook/create.html"
     success_url = reverse_lazy("cashbook:transaction_enquiry")
-    nominal_model = Nominal
-    nominal_transaction_model = NominalTransaction
-    cash_book_transaction_model = CashBookTransaction
-    vat_transaction_model = VatTransaction
+    service_class = CashBookService
     module = "CB"
     default_type = "cp"
 
 
+class ImportTransactions(LoginRequiredMixin, BaseImportTransactions):
+    importer_class = CashBookImport
+
+
 class EditTransaction(
         LoginRequiredMixin,
         TransactionPermissionMixin,
@@ -80,10 +84,8 @@ class EditTransaction(
     }
     template_name = "cashbook/edit.html"
     success_url = reverse_lazy("cashbook:transaction_enquiry")
-    nominal_model = Nominal
+    service_class = CashBookService
     nominal_transaction_model = NominalTransaction
-    cash_book_transaction_model = CashBookTransaction
-    vat_transaction_model = VatTransaction
     module = "CB"
 
 
@@ -145,6 +147,7 @@ class TransactionEnquiry(
         "period__fy_and_period": lambda p: (p[4:] + " " + p[:4]) if p else ""
     }
     permission_required = 'cashbook.view_transactions_enquiry'
+    export_filename = "cash_book_transactions"
 
     def load_page(self):
         context_data = super().load_page()
@@ -170,14 +173,11 @@ class TransactionEnquiry(
 
     def get_queryset(self, **kwargs):
         return (
-            CashBookTransaction.objects
-            .select_related('cash_book__name')
-            .select_related('period__fy_and_period')
-            .all()
+            CashBookTransactionSummary.objects
             .values(
-                *[field[0] for field in self.fields[:-1]]
+                'id',
+                *[field[0] for field in self.fields]
             )
-            .annotate(total=Sum("value"))
             .order_by(*self.order_by())
         )
 
@@ -259,3 +259,10 @@ class CashBookEdit(
     success_url = reverse_lazy("cashbook:cashbook_list")
     prefix = "cashbook"
     permission_required = 'cashbook.change_cashbook'
+
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # the cash book transaction enquiry shows the cash book name and is cached
+        # against the ledger version
+        QueuePosts.bump_version('c')
+        return response
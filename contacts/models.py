@@ -4,6 +4,7 @@ from accountancy.helpers import \
     disconnect_simple_history_receiver_for_post_delete_signal
 from accountancy.mixins import AuditMixin
 from accountancy.signals import audit_post_delete
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.shortcuts import reverse
 from simple_history import register
@@ -16,6 +17,17 @@ class Contact(AuditMixin, models.Model):
     customer = models.BooleanField(default=False)
     supplier = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # the contact autocomplete and contact list search
+            GinIndex(fields=["code"], opclasses=["gin_trgm_ops"],
+                     name="contact_code_trgm_idx"),
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"],
+                     name="contact_name_trgm_idx"),
+            GinIndex(fields=["email"], opclasses=["gin_trgm_ops"],
+                     name="contact_email_trgm_idx"),
+        ]
+
     def __str__(self):
         return self.code
 
@@ -2,8 +2,10 @@ from itertools import chain
 
 from accountancy.helpers import get_all_historical_changes
 from accountancy.mixins import SingleObjectAuditDetailViewMixin
+from accountancy.models import HeaderSearch
 from accountancy.views import (JQueryDataTableMixin,
                                get_trig_vectors_for_different_inputs)
+from controls.models import QueuePosts
 from crispy_forms.utils import render_crispy_form
 from django.contrib.auth.mixins import (LoginRequiredMixin,
                                         PermissionRequiredMixin)
@@ -33,9 +35,11 @@ class LoadContacts(ListView):
     def get_queryset(self):
         if q := self.request.GET.get('q'):
             return (
-                self.model.objects.annotate(
-                    similarity=TrigramSimilarity('code', q),
-                ).filter(similarity__gt=0.3).order_by('-similarity')
+                self.model.objects
+                # the % operator finds the candidates through the trigram index
+                .filter(code__trigram_similar=q)
+                .annotate(similarity=TrigramSimilarity('code', q))
+                .order_by('-similarity')
             )
         return self.model.objects.none()
 
@@ -163,4 +167,13 @@ class ContactUpdate(
     context_object_name = "contact"
     success_url = reverse_lazy("contacts:list")
     title = "Edit Contact"
-    permission_required = "contacts.change_contacts"
\ No newline at end of file
+    permission_required = "contacts.change_contacts"
+
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # the aged creditors and debtors reports show the contact name and are cached
+        # against the ledger version
+        QueuePosts.bump_version('p')
+        QueuePosts.bump_version('s')
+        HeaderSearch.update_contact(self.object)
+        return response
\ No newline at end of file
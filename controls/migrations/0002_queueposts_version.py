@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controls', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queueposts',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
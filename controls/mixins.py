@@ -3,9 +3,29 @@ from controls.models import QueuePosts
 d = { fullname : code for code, fullname in  QueuePosts.POST_MODULES}
 
 class QueuePostsMixin:
+    """
+    The version of the ledger is bumped only once something has been posted so a form
+    which is rejected does not invalidate what is cached against the version
+    """
+    posted = False
+
     def dispatch(self, request, *args, **kwargs):
         if request.method == "POST":
             module = request.resolver_match.app_name
             code = d[module]
             lock = QueuePosts.objects.select_for_update().filter(module=code)
-        return super().dispatch(request, *args, **kwargs)
\ No newline at end of file
+            response = super().dispatch(request, *args, **kwargs)
+            if self.posted:
+                QueuePosts.bump_version(code)
+            return response
+        return super().dispatch(request, *args, **kwargs)
+
+    def forms_are_valid(self):
+        # create and edit
+        super().forms_are_valid()
+        self.posted = True
+
+    def form_is_valid(self):
+        # void
+        super().form_is_valid()
+        self.posted = self.success
@@ -169,6 +169,9 @@ class QueuePosts(models.Model):
 
     Each view - create, edit and void - should SELECT_FOR_UPDATE the row which is the module / django app
     the view belongs to before any work is done.  This way the POST requests per module are queued.
+
+    `version` is bumped after every POST for the module.  Anything cached from the ledger should
+    include the version in the cache key so it is stale as soon as the ledger is posted to.
     """
     POST_MODULES = [
         ('c', 'cashbook'),
@@ -177,3 +180,36 @@ class QueuePosts(models.Model):
         ('s', 'sales'),
     ]
     module = models.CharField(max_length=1, choices=POST_MODULES)
+    version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def get_module(cls, app_label):
+        """
+        E.g. 'p' for 'purchases'
+        """
+        return {fullname: code for code, fullname in cls.POST_MODULES}[app_label]
+
+    @classmethod
+    def get_version(cls, module):
+        """
+        `module` is the code e.g. 'p' for purchases
+        """
+        queue = cls.objects.filter(module=module).values("version").first()
+        return queue["version"] if queue else 0
+
+    @classmethod
+    def get_versions(cls, modules):
+        """
+        The versions of each of `modules`, in the same order, from a single query
+        """
+        versions = dict(
+            cls.objects.filter(module__in=modules).values_list("module", "version")
+        )
+        return [versions.get(module, 0) for module in modules]
+
+    @classmethod
+    def bump_version(cls, module):
+        updated = cls.objects.filter(module=module).update(
+            version=models.F("version") + 1)
+        if not updated:
+            cls.objects.create(module=module, version=1)
@@ -0,0 +1,42 @@
+from controls.models import QueuePosts
+from django.test import TestCase
+
+
+class QueuePostsVersionTests(TestCase):
+
+    def test_version_is_0_without_row(self):
+        self.assertEqual(
+            QueuePosts.get_version('p'),
+            0
+        )
+
+    def test_bump_version_creates_row(self):
+        QueuePosts.bump_version('p')
+        self.assertEqual(
+            QueuePosts.get_version('p'),
+            1
+        )
+        self.assertEqual(
+            len(QueuePosts.objects.all()),
+            1
+        )
+
+    def test_bump_version_only_bumps_module(self):
+        QueuePosts.objects.create(module='p')
+        QueuePosts.objects.create(module='s')
+        QueuePosts.bump_version('p')
+        QueuePosts.bump_version('p')
+        self.assertEqual(
+            QueuePosts.get_version('p'),
+            2
+        )
+        self.assertEqual(
+            QueuePosts.get_version('s'),
+            0
+        )
+
+    def test_get_module(self):
+        self.assertEqual(
+            QueuePosts.get_module('purchases'),
+            'p'
+        )
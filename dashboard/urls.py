@@ -1,8 +1,9 @@
 from django.urls import path
 
-from .views import DashBoard
+from .views import DashBoard, Search
 
 app_name = "dashboard"
 urlpatterns = [
     path("", DashBoard.as_view(), name="dashboard"),
+    path("search", Search.as_view(), name="search"),
 ]
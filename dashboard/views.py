@@ -1,9 +1,13 @@
+from accountancy.models import HeaderSearch
 from cashbook.models import CashBookTransaction
 from controls.models import ModuleSettings, Period
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import F, OuterRef, Subquery, Sum
 from django.db.models.functions import Coalesce
-from django.views.generic import TemplateView
+from django.http import JsonResponse
+from django.shortcuts import reverse
+from django.views.generic import TemplateView, View
 from purchases.models import PurchaseHeader, PurchaseMatching
 from sales.models import SaleHeader, SaleMatching
 
@@ -13,35 +17,27 @@ class TotalOwedReport:
         self.header_model = header_model
         self.match_model = match_model
 
-    def _report(self, matched_by, matched_to, types, period_subquery):
+    def _report(self, later_allocations, types, period_subquery):
         return (
             self.header_model
             .objects
             .filter(type__in=types)
             .filter(period__fy_and_period__in=Subquery(period_subquery))
             .annotate(
-                mbt=Coalesce(
+                later_allocations_total=Coalesce(
                     Subquery(
-                        matched_by.values('matched_by_total')
+                        later_allocations.values('total')
                     ),
                     0
                 )
             )
             .annotate(
-                mtt=Coalesce(
-                    Subquery(
-                        matched_to.values('matched_to_total')
-                    ),
-                    0
-                )
-            )
-            .annotate(
-                actual_due=F('due') + F('mbt') + F('mtt')
+                actual_due=F('due') + F('later_allocations_total')
             )
 
         )
 
-    def _report_per_period_for_last_5_periods(self, matched_by, matched_to, types, period):
+    def _report_per_period_for_last_5_periods(self, later_allocations, types, period):
         period_subquery = (
             Period
             .objects
@@ -52,7 +48,7 @@ class TotalOwedReport:
         )
         q = (
             self
-            ._report(matched_by, matched_to, types, period_subquery)
+            ._report(later_allocations, types, period_subquery)
             .values('period__fy_and_period')
             .annotate(
                 total_due=Coalesce(Sum('actual_due'), 0)
@@ -66,7 +62,7 @@ class TotalOwedReport:
         return report
 
 
-    def _report_for_all_periods_prior(self, matched_by, matched_to, types, period):
+    def _report_for_all_periods_prior(self, later_allocations, types, period):
         """
         Get the total owed for all periods prior to @period i.e. the total for 'Older'
         """
@@ -80,7 +76,7 @@ class TotalOwedReport:
         )
         return (
             self
-            ._report(matched_by, matched_to, types, period_subquery)
+            ._report(later_allocations, types, period_subquery)
             .aggregate(
                 total_due=Coalesce(Sum('actual_due'), 0)
             )
@@ -90,21 +86,14 @@ class TotalOwedReport:
         """
         This is used by the dashboard and not the aged creditors report
         """
-        matched_by = (
+        later_allocations = (
             self.match_model
+            .allocation_model
             .objects
             .filter(period__fy_and_period__gt=current_period.fy_and_period)
-            .filter(matched_by=OuterRef('pk'))
-            .values('matched_by')
-            .annotate(matched_by_total=Sum('value') * -1)
-        )
-        matched_to = (
-            self.match_model
-            .objects
-            .filter(period__fy_and_period__gt=current_period.fy_and_period)
-            .filter(matched_to=OuterRef('pk'))
-            .values('matched_to')
-            .annotate(matched_to_total=Sum('value'))
+            .filter(header=OuterRef('pk'))
+            .values('header')
+            .annotate(total=Sum('value'))
         )
         non_payment_types = [
             t[0]
@@ -112,9 +101,9 @@ class TotalOwedReport:
             if t[0] not in self.header_model.payment_types
         ]
         report_from_current_to_4_periods_ago = self._report_per_period_for_last_5_periods(
-            matched_by, matched_to, non_payment_types, current_period)
+            later_allocations, non_payment_types, current_period)
         older = self._report_for_all_periods_prior(
-            matched_by, matched_to, non_payment_types, current_period)
+            later_allocations, non_payment_types, current_period)
         report = []
         labels = ["Current", "1 period ago", "2 periods ago", "3 periods ago", "4 periods ago"]
         for i, (period, value) in enumerate(report_from_current_to_4_periods_ago.items()):
@@ -159,3 +148,41 @@ class DashBoard(LoginRequiredMixin, TemplateView):
         context["owed_to_you"] = owed_to_you
         context["owed_by_you"] = owed_by_you
         return context
+
+
+class Search(LoginRequiredMixin, View):
+    """
+    Search every ledger at once for a reference, contact or amount.  Only the ledgers whose
+    transactions the user can view are searched.
+    """
+    max_hits = 50
+
+    def get_modules(self):
+        return [
+            module
+            for module, app_label in settings.ACCOUNTANCY_MODULES.items()
+            if self.request.user.has_perm(f"{app_label}.view_transactions_enquiry")
+        ]
+
+    def get(self, request, *args, **kwargs):
+        hits = []
+        if q := request.GET.get("q", "").strip():
+            rows = (
+                HeaderSearch.search(q)
+                .filter(module__in=self.get_modules())
+                .select_related("period")
+            )[:self.max_hits]
+            for row in rows:
+                app_label = settings.ACCOUNTANCY_MODULES[row.module]
+                hits.append({
+                    "module": row.module,
+                    "header": row.header,
+                    "type": row.type,
+                    "ref": row.ref,
+                    "contact": row.contact_name,
+                    "total": row.total,
+                    "date": row.date,
+                    "period": row.period.fy_and_period if row.period else "",
+                    "href": reverse(app_label + ":view", kwargs={"pk": row.header})
+                })
+        return JsonResponse({"data": hits})
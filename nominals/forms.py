@@ -167,59 +167,68 @@ class NominalLineForm(
         ).render()
 
 
+def balance_journal(header, lines):
+    """
+    The journal must balance and its total is the total of the debit side i.e. the
+    total of the positive values.  Sets the goods, vat and total of the header from
+    the lines.  Used by the line formset and the import.
+    """
+    goods = 0
+    vat = 0
+    debits = 0
+    credits = 0
+    for line in lines:
+        if line.goods > 0:
+            debits += line.goods
+            goods += line.goods
+            vat += line.vat
+        else:
+            credits += line.goods
+        if line.vat > 0:
+            debits += line.vat
+        else:
+            credits += line.vat
+    if not header.total:
+        raise forms.ValidationError(
+            _(
+                "No total entered.  This should be the total value of the debit side of the journal i.e. the total of the positive values"
+            ),
+            code="invalid-total"
+        )
+    if header.total != debits:
+        raise forms.ValidationError(
+            _(
+                "The total of the debits does not equal the total you entered."
+            ),
+            code="invalid-total"
+        )
+    if debits + credits != 0:
+        raise forms.ValidationError(
+            _(
+                f"Debits and credits must total zero.  Total debits entered i.e. positives values entered is {debits}, "
+                f"and total credits entered i.e. negative values entered, is {credits}.  This gives a non-zero total of { debits + credits }"
+            ),
+            code="invalid-total"
+        )
+    header.goods = goods
+    header.vat = vat
+    header.total = debits
+
+
 class NominalLineFormset(BaseLineFormset):
 
     def clean(self):
         super().clean()
         if(any(self.errors) or not hasattr(self, 'header')):
             return
-        goods = 0
-        vat = 0
-        total = 0
-        debits = 0
-        credits = 0
+        lines = []
         for form in self.forms:
             # empty_permitted = False is set on forms for existing data
             # empty_permitted = True is set new forms i.e. for non existent data
             if not form.empty_permitted or (form.empty_permitted and form.has_changed()):
                 if not form.cleaned_data.get("DELETE"):
-                    this_goods = form.instance.goods
-                    this_vat = form.instance.vat
-                    if this_goods > 0:
-                        debits += this_goods
-                        goods += this_goods
-                        vat += this_vat
-                    else:
-                        credits += this_goods
-                    if this_vat > 0:
-                        debits += this_vat
-                    else:
-                        credits += this_vat
-        if not self.header.total:
-            raise forms.ValidationError(
-                _(
-                    "No total entered.  This should be the total value of the debit side of the journal i.e. the total of the positive values"
-                ),
-                code="invalid-total"
-            )
-        if self.header.total != debits:
-            raise forms.ValidationError(
-                _(
-                    "The total of the debits does not equal the total you entered."
-                ),
-                code="invalid-total"
-            )
-        if debits + credits != 0:
-            raise forms.ValidationError(
-                _(
-                    f"Debits and credits must total zero.  Total debits entered i.e. positives values entered is {debits}, "
-                    f"and total credits entered i.e. negative values entered, is {credits}.  This gives a non-zero total of { debits + credits }"
-                ),
-                code="invalid-total"
-            )
-        self.header.goods = goods
-        self.header.vat = vat
-        self.header.total = debits
+                    lines.append(form.instance)
+        balance_journal(self.header, lines)
 
 
 enter_lines = forms.modelformset_factory(
@@ -292,6 +301,131 @@ class TrialBalanceForm(forms.Form):
         return cleaned_data
 
 
+class NominalActivityForm(TrialBalanceForm):
+    """
+    The nominal range is by primary key, like the contact ranges of the aged reports
+    """
+    from_nominal = forms.ModelChoiceField(
+        queryset=Nominal.objects.filter(children__isnull=True),
+        required=False
+    )
+    to_nominal = forms.ModelChoiceField(
+        queryset=Nominal.objects.filter(children__isnull=True),
+        required=False
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper.layout = Layout(
+            Div(
+                *[
+                    Div(
+                        LabelAndFieldAndErrors(
+                            field, css_class="form-control form-control-sm"),
+                        css_class="col-2"
+                    )
+                    for field in ("from_nominal", "to_nominal", "from_period", "to_period")
+                ],
+                css_class="row"
+            ),
+            Div(
+                HTML("<button class='btn btn-primary'>Report</button>"),
+                css_class="text-right mt-3"
+            )
+        )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        from_nominal = cleaned_data.get("from_nominal")
+        to_nominal = cleaned_data.get("to_nominal")
+        if from_nominal and to_nominal and from_nominal.pk > to_nominal.pk:
+            raise forms.ValidationError(
+                _(
+                    "Invalid nominal range.  Nominal From cannot be after Nominal To"
+                ),
+                code="invalid nominal range"
+            )
+        return cleaned_data
+
+
+class NominalPivotForm(forms.Form):
+    """
+    The dimensions for the rows, and optionally the columns, of the pivot
+    along with the period range of the transactions
+    """
+    row_1 = forms.ChoiceField(label="Rows")
+    row_2 = forms.ChoiceField(label="Then by", required=False)
+    row_3 = forms.ChoiceField(label="Then by", required=False)
+    column = forms.ChoiceField(label="Columns", required=False)
+    from_period = forms.ModelChoiceField(
+        queryset=Period.objects.all(),
+        required=False
+    )
+    to_period = forms.ModelChoiceField(
+        queryset=Period.objects.all(),
+        required=False
+    )
+
+    def __init__(self, *args, **kwargs):
+        dimensions = kwargs.pop("dimensions")
+        super().__init__(*args, **kwargs)
+        choices = [
+            (dimension, label)
+            for dimension, (label, _) in dimensions.items()
+        ]
+        self.fields["row_1"].choices = choices
+        for field in ("row_2", "row_3", "column"):
+            self.fields[field].choices = [("", "---------")] + choices
+        self.helper = FormHelper()
+        self.helper.form_method = "GET"
+        self.helper.layout = Layout(
+            Div(
+                *[
+                    Div(
+                        LabelAndFieldAndErrors(
+                            field, css_class="form-control form-control-sm"),
+                        css_class="col-2"
+                    )
+                    for field in ("row_1", "row_2", "row_3", "column", "from_period", "to_period")
+                ],
+                css_class="row"
+            ),
+            Div(
+                HTML("<button class='btn btn-primary'>Report</button>"),
+                css_class="text-right mt-3"
+            )
+        )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        rows = [
+            cleaned_data.get(field)
+            for field in ("row_1", "row_2", "row_3")
+            if cleaned_data.get(field)
+        ]
+        column = cleaned_data.get("column")
+        dimensions = rows + ([column] if column else [])
+        if len(set(dimensions)) != len(dimensions):
+            raise forms.ValidationError(
+                _(
+                    "A dimension can only be used once"
+                ),
+                code="duplicate dimension"
+            )
+        from_period = cleaned_data.get("from_period")
+        to_period = cleaned_data.get("to_period")
+        if from_period and to_period and from_period.fy_and_period > to_period.fy_and_period:
+            raise forms.ValidationError(
+                _(
+                    "Invalid period range.  Period From cannot be after Period To"
+                ),
+                code="invalid period range"
+            )
+        cleaned_data["rows"] = rows
+        cleaned_data["columns"] = [column] if column else []
+        return cleaned_data
+
+
 class NominalTransactionSearchForm(BaseAjaxFormMixin, NominalTransactionSearchForm):
     """
     This is not a model form.  The Meta attribute is only for the Ajax
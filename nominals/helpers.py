@@ -1,9 +1,16 @@
+from decimal import Decimal
+from itertools import groupby
+
 from accountancy.helpers import sort_multiple
+from django.core import signing
+from django.db import connection
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 from vat.models import VatTransaction
 
-from nominals.models import (Nominal, NominalHeader, NominalLine,
-                             NominalTransaction)
+from nominals.models import (Nominal, NominalBalance, NominalHeader,
+                             NominalLine, NominalTransaction)
 
 
 def create_nominal_journal_without_nom_trans(journal):
@@ -91,3 +98,433 @@ def create_vat_transactions(header, lines):
     for i, line in enumerate(lines):
         line.vat_transaction = vat_trans[i]
     NominalLine.objects.bulk_update(lines, ["vat_transaction"])
+
+
+def roll_up_trial_balance(rows, ancestors):
+    """
+    `rows` are the totals per nominal from NominalTransactionQuerySet.trial_balance and
+    `ancestors` the nominals with children, both ordered by tree_id and lft.
+
+    The ancestors of a nominal are the nodes in the same tree whose lft - rght range contains
+    it, so a single sweep over both lists, keeping a stack of the open ranges, finds the
+    ancestors of every row without walking the tree per nominal.
+
+    Returns the report rows, with the names of the ancestors root first, and the subtotals
+    for each ancestor in tree order.
+    """
+    report = []
+    subtotals = []
+    stack = []
+    ancestors = iter(ancestors)
+    ancestor = next(ancestors, None)
+    for row in rows:
+        tree_id, lft = row["nominal__tree_id"], row["nominal__lft"]
+        while ancestor and (ancestor["tree_id"], ancestor["lft"]) < (tree_id, lft):
+            subtotal = {
+                "nominal": ancestor["name"],
+                "level": ancestor["level"],
+                "tree_id": ancestor["tree_id"],
+                "rght": ancestor["rght"],
+                "total": 0,
+                "ytd": 0
+            }
+            stack = [
+                s for s in stack
+                if s["tree_id"] == subtotal["tree_id"] and s["rght"] > ancestor["lft"]
+            ]
+            stack.append(subtotal)
+            subtotals.append(subtotal)
+            ancestor = next(ancestors, None)
+        stack = [s for s in stack if s["tree_id"] == tree_id and s["rght"] > lft]
+        for subtotal in stack:
+            subtotal["total"] += row["total"]
+            subtotal["ytd"] += row["ytd"]
+        report.append({
+            "nominal": row["nominal__name"],
+            "total": row["total"],
+            "parents": [s["nominal"] for s in stack],
+            "ytd": row["ytd"]
+        })
+    for subtotal in subtotals:
+        del subtotal["tree_id"]
+        del subtotal["rght"]
+    return report, subtotals
+
+
+class NominalPivotReport:
+    """
+    Totals the value of the nominal transactions by the dimensions the user picks for the
+    rows and the columns of a pivot table.
+
+    The cells, the subtotals for each level of the row dimensions, the row totals and the
+    column totals all come from one GROUPING SETS query.  The transactions are first
+    filtered and the dimensions selected with the ORM and that query is then wrapped -
+
+        SELECT row dims, column dims, GROUPING(dim) for each dim, SUM(value)
+        FROM (filtered transactions) pivot
+        GROUP BY GROUPING SETS (...)
+
+    The sets are every prefix of the row dimensions (i.e. ROLLUP) each with and without
+    the column dimensions.  The rows come back ordered so that each row of the pivot is
+    contiguous and can be streamed.
+    """
+    dimensions = {
+        # key: (label, expression)
+        "nominal": ("Nominal", F("nominal__name")),
+        "parent": ("Parent", F("nominal__parent__name")),
+        "grand_parent": ("Grand Parent", F("nominal__parent__parent__name")),
+        "period": ("Period", F("period__fy_and_period")),
+        "module": ("Module", F("module")),
+        "type": ("Type", F("type")),
+        "month": ("Month", TruncMonth("date")),
+    }
+
+    def __init__(self, queryset, rows, columns=None):
+        columns = columns or []
+        for dimension in rows + columns:
+            if dimension not in self.dimensions:
+                raise ValueError(f"{dimension} is not a pivot dimension")
+        if not rows:
+            raise ValueError("At least one row dimension is required")
+        self.queryset = queryset
+        self.rows = rows
+        self.columns = columns
+
+    def get_grouping_sets(self):
+        grouping_sets = []
+        for i in range(len(self.rows), -1, -1):
+            grouping_sets.append(self.rows[:i] + self.columns)
+            if self.columns:
+                grouping_sets.append(self.rows[:i])
+        return grouping_sets
+
+    def get_sql(self):
+        qn = connection.ops.quote_name
+        dimensions = self.rows + self.columns
+        inner = (
+            self.queryset
+            .annotate(**{
+                "dim_" + dimension: self.dimensions[dimension][1]
+                for dimension in dimensions
+            })
+            .values(*["dim_" + dimension for dimension in dimensions], "value")
+            .order_by()
+        )
+        inner_sql, params = inner.query.sql_with_params()
+        columns = [qn("dim_" + dimension) for dimension in dimensions]
+        groupings = [f"GROUPING({column})" for column in columns]
+        grouping_sets = ", ".join(
+            "(" + ", ".join(qn("dim_" + dimension) for dimension in grouping_set) + ")"
+            for grouping_set in self.get_grouping_sets()
+        )
+        all_rows = ", ".join(columns[:len(self.rows)])
+        order_by = [
+            # the grand totals come first so the columns are known before any other row
+            f"GROUPING({all_rows}) = {2 ** len(self.rows) - 1} DESC"
+        ]
+        for column, grouping in zip(columns, groupings):
+            order_by += [grouping, column]
+        sql = (
+            f"SELECT {', '.join(columns + groupings)}, SUM({qn('value')}) "
+            f"FROM ({inner_sql}) pivot "
+            f"GROUP BY GROUPING SETS ({grouping_sets}) "
+            f"ORDER BY {', '.join(order_by)}"
+        )
+        return sql, params
+
+    def iter_results(self, chunk_size=2000):
+        sql, params = self.get_sql()
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(sql, params)
+            while results := cursor.fetchmany(chunk_size):
+                yield from results
+
+    def iter_rows(self, chunk_size=2000):
+        """
+        Each row of the pivot -
+
+            {
+                "keys": values of the row dimensions, None for those totalled,
+                "level": how many of the row dimensions are totalled,
+                "cells": {values of the column dimensions: total},
+                "total": the total of the row
+            }
+
+        The grand total row is first.
+        """
+        n_rows = len(self.rows)
+        n_dims = n_rows + len(self.columns)
+
+        def row_key(result):
+            return (result[:n_rows], result[n_dims:n_dims + n_rows])
+
+        for (keys, row_groupings), results in groupby(self.iter_results(chunk_size), row_key):
+            row = {
+                "keys": keys,
+                "level": sum(row_groupings),
+                "cells": {},
+                "total": 0
+            }
+            for result in results:
+                column_groupings = result[n_dims + n_rows:n_dims * 2]
+                if any(column_groupings) or not self.columns:
+                    row["total"] = result[-1]
+                else:
+                    row["cells"][result[n_rows:n_dims]] = result[-1]
+            yield row
+
+    def pivot(self, chunk_size=2000):
+        """
+        Returns the values of the column dimensions, in order, and the rows with the
+        grand total moved to the end
+        """
+        rows = self.iter_rows(chunk_size)
+        grand_total = next(rows, None)
+        if grand_total is None:
+            return [], iter([])
+        columns = list(grand_total["cells"])
+
+        def all_rows():
+            yield from rows
+            yield grand_total
+
+        return columns, all_rows()
+
+    def labels(self):
+        return [self.dimensions[dimension][0] for dimension in self.rows + self.columns]
+
+
+class NominalActivityReport:
+    """
+    The opening balance, each transaction with the running balance, and the closing balance,
+    for each nominal in a range, over a period range within a FY.
+
+    The balances are read from NominalBalance.  The periods of the FY before `from_period`
+    give the opening balance and the periods in the range tell us which nominal and period
+    have transactions, and so the closing balance, without touching the transactions.
+
+    The running balance is a window sum over the transactions of the nominal and period on
+    top of the balance brought down from the previous row.  A page is read a nominal and
+    period at a time, seeking past the last row shown using (date, pk), so each page is an
+    index range scan however many transactions the nominal has.
+    """
+    transaction_fields = [
+        "pk",
+        "module",
+        "header",
+        "ref",
+        "type",
+        "date",
+        "value",
+    ]
+    cursor_salt = "nominals.activity"
+
+    def __init__(self, from_period, to_period, from_nominal=None, to_nominal=None):
+        self.from_period = from_period
+        self.to_period = to_period
+        self.from_nominal = from_nominal
+        self.to_nominal = to_nominal
+
+    def get_balances(self):
+        balances = (
+            NominalBalance.objects
+            .filter(period__fy=self.to_period.fy_id)
+            .filter(period__fy_and_period__lte=self.to_period.fy_and_period)
+        )
+        if self.from_nominal:
+            balances = balances.filter(nominal__pk__gte=self.from_nominal.pk)
+        if self.to_nominal:
+            balances = balances.filter(nominal__pk__lte=self.to_nominal.pk)
+        return balances
+
+    def get_opening_balances(self):
+        return {
+            balance["nominal"]: balance["total"]
+            for balance in (
+                self.get_balances()
+                .filter(period__fy_and_period__lt=self.from_period.fy_and_period)
+                .values("nominal")
+                .annotate(total=Sum("value"))
+                .order_by()
+            )
+        }
+
+    def get_cells(self):
+        """
+        (nominal, nominal name, period, period fy_and_period, value) for each nominal and
+        period in the range with transactions, in report order
+        """
+        return list(
+            self.get_balances()
+            .filter(period__fy_and_period__gte=self.from_period.fy_and_period)
+            .order_by("nominal", "period__fy_and_period")
+            .values_list("nominal", "nominal__name", "period", "period__fy_and_period", "value")
+        )
+
+    def get_transactions(self):
+        return (
+            NominalTransaction.objects
+            .filter(period__fy_and_period__gte=self.from_period.fy_and_period)
+            .filter(period__fy_and_period__lte=self.to_period.fy_and_period)
+        )
+
+    def opening_row(self, nominal, nominal_name, balance):
+        return {
+            "row_type": "opening",
+            "nominal": nominal,
+            "nominal_name": nominal_name,
+            "balance": balance
+        }
+
+    def closing_row(self, nominal, nominal_name, balance):
+        return {
+            "row_type": "closing",
+            "nominal": nominal,
+            "nominal_name": nominal_name,
+            "balance": balance
+        }
+
+    def transaction_row(self, tran, nominal, nominal_name, fy_and_period, balance):
+        row = {
+            "row_type": "transaction",
+            "nominal": nominal,
+            "nominal_name": nominal_name,
+            "period": fy_and_period,
+            "balance": balance,
+        }
+        for field in self.transaction_fields:
+            row[field] = tran[field]
+        return row
+
+    def dump_cursor(self, nominal, period, date, pk, balance):
+        return signing.dumps(
+            [nominal, period, date.isoformat(), pk, str(balance)],
+            salt=self.cursor_salt
+        )
+
+    def load_cursor(self, cursor):
+        """
+        Raises signing.BadSignature if the cursor has been tampered with
+        """
+        nominal, period, date, pk, balance = signing.loads(
+            cursor, salt=self.cursor_salt)
+        return nominal, period, date, pk, Decimal(balance)
+
+    def page(self, length, after=None):
+        """
+        Returns up to `length` transaction rows, with the opening and closing rows of the
+        nominals they belong to, and the cursor for the next page - None on the last page.
+        `after` is the cursor returned with the previous page.
+        """
+        opening_balances = self.get_opening_balances()
+        cells = self.get_cells()
+        rows = []
+        remaining = length
+        seek = None
+        if after:
+            seek = self.load_cursor(after)
+            nominal, period = seek[0], seek[1]
+            # skip the cells already shown
+            for i, cell in enumerate(cells):
+                if (cell[0], cell[2]) == (nominal, period):
+                    cells = cells[i:]
+                    break
+            else:
+                cells = []
+        previous_nominal = None
+        for i, (nominal, nominal_name, period, fy_and_period, value) in enumerate(cells):
+            if nominal != previous_nominal:
+                if seek and seek[0] == nominal:
+                    balance = seek[4]
+                else:
+                    balance = opening_balances.get(nominal, 0)
+                    rows.append(self.opening_row(nominal, nominal_name, balance))
+                previous_nominal = nominal
+            transactions = (
+                self.get_transactions()
+                .filter(nominal=nominal)
+                .filter(period=period)
+            )
+            if seek and (seek[0], seek[1]) == (nominal, period):
+                _, _, date, pk, _ = seek
+                transactions = transactions.filter(
+                    Q(date__gt=date) | Q(date=date, pk__gt=pk))
+            transactions = (
+                transactions
+                .annotate(
+                    running_total=Window(
+                        expression=Sum("value"),
+                        order_by=[F("date").asc(), F("pk").asc()]
+                    )
+                )
+                .order_by("date", "pk")
+                .values(*self.transaction_fields, "running_total")
+            )[:remaining + 1]
+            transactions = list(transactions)
+            more_in_cell = len(transactions) > remaining
+            opening = balance
+            for tran in transactions[:remaining]:
+                balance = opening + tran["running_total"]
+                rows.append(
+                    self.transaction_row(tran, nominal, nominal_name, fy_and_period, balance))
+                remaining -= 1
+            if more_in_cell or (remaining == 0 and i + 1 < len(cells)):
+                last = rows[-1]
+                return rows, self.dump_cursor(
+                    nominal, period, last["date"], last["pk"], balance)
+            seek = None
+            is_last_cell_for_nominal = i + 1 == len(cells) or cells[i + 1][0] != nominal
+            if is_last_cell_for_nominal:
+                rows.append(self.closing_row(nominal, nominal_name, balance))
+        return rows, None
+
+    def iter_rows(self, chunk_size=2000):
+        """
+        Every row of the report from a single windowed query read from a server side cursor
+        """
+        opening_balances = self.get_opening_balances()
+        transactions = self.get_transactions()
+        if self.from_nominal:
+            transactions = transactions.filter(
+                nominal__pk__gte=self.from_nominal.pk)
+        if self.to_nominal:
+            transactions = transactions.filter(
+                nominal__pk__lte=self.to_nominal.pk)
+        transactions = (
+            transactions
+            .annotate(
+                running_total=Window(
+                    expression=Sum("value"),
+                    partition_by=[F("nominal")],
+                    order_by=[
+                        F("period__fy_and_period").asc(),
+                        F("date").asc(),
+                        F("pk").asc()
+                    ]
+                )
+            )
+            .order_by("nominal", "period__fy_and_period", "date", "pk")
+            .values(
+                *self.transaction_fields,
+                "nominal",
+                "nominal__name",
+                "period__fy_and_period",
+                "running_total"
+            )
+        )
+        previous = None
+        balance = 0
+        for tran in transactions.iterator(chunk_size=chunk_size):
+            nominal = tran["nominal"]
+            if previous is None or previous["nominal"] != nominal:
+                if previous:
+                    yield self.closing_row(previous["nominal"], previous["nominal__name"], balance)
+                yield self.opening_row(
+                    nominal, tran["nominal__name"], opening_balances.get(nominal, 0))
+            balance = opening_balances.get(nominal, 0) + tran["running_total"]
+            yield self.transaction_row(
+                tran, nominal, tran["nominal__name"], tran["period__fy_and_period"], balance)
+            previous = tran
+        if previous:
+            yield self.closing_row(previous["nominal"], previous["nominal__name"], balance)
+
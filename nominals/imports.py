@@ -0,0 +1,23 @@
+from accountancy.imports import TransactionImport
+from cashbook.models import CashBookTransaction
+from vat.models import VatTransaction
+
+from nominals.forms import NominalHeaderForm, balance_journal
+from nominals.models import (Nominal, NominalHeader, NominalLine,
+                             NominalTransaction)
+
+
+class NominalImport(TransactionImport):
+    """
+    The total of a journal is the total of the debit side i.e. the total of the positive values
+    """
+    header_model = NominalHeader
+    line_model = NominalLine
+    header_form = NominalHeaderForm
+    nominal_model = Nominal
+    nominal_transaction_model = NominalTransaction
+    vat_transaction_model = VatTransaction
+    cash_book_transaction_model = CashBookTransaction
+
+    def clean_totals(self, header, lines):
+        balance_journal(header, lines)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from nominals.models import NominalBalance
+
+
+class Command(BaseCommand):
+    help = "Rebuild the nominal balances from the nominal transactions, or just verify them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only check the balances agree with the transactions.  Nothing is changed."
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            NominalBalance.rebuild()
+            self.stdout.write("Rebuilt the nominal balances")
+        differences = NominalBalance.verify()
+        for nominal, period, expected, actual in differences:
+            self.stderr.write(
+                f"nominal {nominal} period {period} expected {expected} found {actual}"
+            )
+        if differences:
+            raise CommandError(
+                f"{len(differences)} nominal balances do not agree with the transactions")
+        self.stdout.write("The nominal balances agree with the transactions")
@@ -0,0 +1,54 @@
+# Generated by Django 3.1.14 on 2026-10-17 06:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_balances(apps, schema_editor):
+    NominalTransaction = apps.get_model('nominals', 'NominalTransaction')
+    NominalBalance = apps.get_model('nominals', 'NominalBalance')
+    balances = (
+        NominalTransaction.objects
+        .filter(period__isnull=False)
+        .values('nominal', 'period')
+        .annotate(total=models.Sum('value'), count=models.Count('pk'))
+        .order_by()
+    )
+    NominalBalance.objects.bulk_create(
+        [
+            NominalBalance(
+                nominal_id=balance["nominal"],
+                period_id=balance["period"],
+                value=balance["total"],
+                transactions=balance["count"]
+            )
+            for balance in balances
+        ],
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controls', '0002_queueposts_version'),
+        ('nominals', '0002_auto_20210103_1226'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NominalBalance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('nominal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='nominals.nominal')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controls.period')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='nominalbalance',
+            constraint=models.UniqueConstraint(fields=('nominal', 'period'), name='nominal_balance_unique'),
+        ),
+        migrations.RunPython(build_balances, migrations.RunPython.noop),
+    ]
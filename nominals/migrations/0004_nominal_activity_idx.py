@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-17 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nominals', '0003_nominalbalance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='nominaltransaction',
+            index=models.Index(fields=['nominal', 'period', 'date', 'id'], name='nominal_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.1.14 on 2026-10-17 07:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    NominalTransaction = apps.get_model('nominals', 'NominalTransaction')
+    NominalTransactionSummary = apps.get_model('nominals', 'NominalTransactionSummary')
+    rows = (
+        NominalTransaction.objects
+        .values('module', 'header', 'ref', 'period', 'date', 'nominal', 'type')
+        .annotate(total=models.Sum('value'))
+        .order_by()
+    )
+    NominalTransactionSummary.objects.bulk_create(
+        [
+            NominalTransactionSummary(
+                module=row["module"],
+                header=row["header"],
+                ref=row["ref"],
+                period_id=row["period"],
+                date=row["date"],
+                nominal_id=row["nominal"],
+                type=row["type"],
+                total=row["total"]
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controls', '0002_queueposts_version'),
+        ('nominals', '0004_nominal_activity_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NominalTransactionSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('module', models.CharField(max_length=3)),
+                ('header', models.PositiveIntegerField()),
+                ('ref', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('type', models.CharField(max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('nominal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='nominals.nominal')),
+                ('period', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='controls.period')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='nominaltransactionsummary',
+            index=models.Index(fields=['module', 'header'], name='nominal_summary_header_idx'),
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
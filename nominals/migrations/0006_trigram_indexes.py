@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-17 10:12
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nominals', '0005_nominaltransactionsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='nominal',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='nominal_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='nominaltransactionsummary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ref'], name='nominal_summary_ref_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
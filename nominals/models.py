@@ -1,4 +1,5 @@
 import calendar
+import time
 from datetime import date
 from itertools import groupby
 
@@ -6,14 +7,19 @@ from accountancy.helpers import bulk_delete_with_history
 from accountancy.mixins import (AuditMixin, BaseNominalTransactionMixin,
                                 BaseNominalTransactionPerLineMixin,
                                 VatTransactionMixin)
-from accountancy.models import (MultiLedgerTransactions, NonAuditQuerySet,
-                                Transaction, TransactionHeader,
-                                TransactionLine, UIDecimalField)
+from accountancy.models import (MultiLedgerTransactionQuerySet,
+                                MultiLedgerTransactions, Transaction,
+                                TransactionHeader, TransactionLine,
+                                TransactionSummary, UIDecimalField)
 from cashbook.models import CashBookHeader
+from controls.models import Period
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
-from django.db import models
-from django.db.models import Sum
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.shortcuts import reverse
 from mptt.models import MPTTModel, TreeForeignKey
 from purchases.models import PurchaseHeader
@@ -45,6 +51,11 @@ class Nominal(AuditMixin, MPTTModel):
             models.UniqueConstraint(
                 fields=['name', 'parent'], name="nominal_unique")
         ]
+        indexes = [
+            # the nominal autocomplete
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"],
+                     name="nominal_name_trgm_idx")
+        ]
 
     def __str__(self):
         return self.name
@@ -52,6 +63,54 @@ class Nominal(AuditMixin, MPTTModel):
     def get_absolute_url(self):
         return reverse("nominals:nominal_detail", kwargs={"pk": self.pk})
 
+    @classmethod
+    def get_system_nominal(cls, name):
+        """
+        E.g. the vat nominal.  See SystemNominals.
+        """
+        return system_nominals.get(name)
+
+
+class SystemNominals:
+    """
+    The nominals the system posts to, rather than the user choosing them, e.g. the vat and control
+    nominals.  Each is looked up by name once per process and then held until any nominal is saved
+    or deleted in the process, or the lookup is older than settings.SYSTEM_NOMINALS_CACHE_TIMEOUT.
+    """
+
+    def __init__(self):
+        self.nominals = {}
+
+    def get(self, name):
+        """
+        Raises Nominal.DoesNotExist if no nominal is called `name`
+        """
+        now = time.monotonic()
+        looked_up = self.nominals.get(name)
+        if looked_up is None or now - looked_up[0] > settings.SYSTEM_NOMINALS_CACHE_TIMEOUT:
+            try:
+                nominal = Nominal.objects.get(name=name)
+            except Nominal.DoesNotExist:
+                # remember it does not exist too so the fallback to the suspense
+                # account does not look for it every time
+                nominal = None
+            looked_up = self.nominals[name] = (now, nominal)
+        if looked_up[1] is None:
+            raise Nominal.DoesNotExist(f"There is no nominal called {name}")
+        return looked_up[1]
+
+    def clear(self):
+        self.nominals = {}
+
+
+system_nominals = SystemNominals()
+
+
+@receiver([post_save, post_delete], sender=Nominal)
+def clear_system_nominals(sender, **kwargs):
+    # a nominal may have been renamed to or from one of the names
+    system_nominals.clear()
+
 
 class NominalTransaction(Transaction):
     module = "NL"
@@ -96,6 +155,8 @@ class NominalHeader(ModuleTransactions, TransactionHeader):
         blank=True
     )
 
+    module = "NL"
+
     class Meta:
         permissions = [
             # enquiry perms
@@ -147,7 +208,38 @@ class NominalLine(ModuleTransactions, TransactionLine):
         ]
 
 
-class NominalTransactionQuerySet(NonAuditQuerySet):
+class NominalTransactionQuerySet(MultiLedgerTransactionQuerySet):
+    """
+    The bulk writes also update the NominalBalance table, in the same transaction,
+    so every caller keeps the balances right without having to remember to.
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            objs = super().bulk_create(objs, *args, **kwargs)
+            NominalBalance.apply(
+                added=self.model.balance_entries(objs)
+            )
+        return objs
+
+    def bulk_update(self, objs, batch_size=None):
+        with transaction.atomic():
+            removed = self.model.balance_entries(
+                self.model.objects.filter(pk__in=[obj.pk for obj in objs])
+            )
+            updated = super().bulk_update(objs, batch_size=batch_size)
+            NominalBalance.apply(
+                removed=removed,
+                added=self.model.balance_entries(objs)
+            )
+        return updated
+
+    def delete(self):
+        with transaction.atomic():
+            removed = self.model.balance_entries(self)
+            deleted = super().delete()
+            NominalBalance.apply(removed=removed)
+        return deleted
 
     def rollback_fy(self, financial_year):
         """
@@ -173,12 +265,16 @@ class NominalTransactionQuerySet(NonAuditQuerySet):
         as brought forwards into `period`
         """
         # REMEMBER TO LOCK POSTS IN CALLING CODE I.E. THE VIEW
-        retained_earnings, system_suspense = Nominal.objects.filter(
-            name__in=["Retained Earnings", "System Suspense Account"]).order_by("name")
-        pl = self.filter(period__fy=fy).filter(
+        retained_earnings = Nominal.get_system_nominal(
+            settings.DEFAULT_RETAINED_EARNINGS)
+        system_suspense = Nominal.get_system_nominal(
+            settings.DEFAULT_SYSTEM_SUSPENSE)
+        # a few rows per nominal rather than every transaction for the year
+        balances = NominalBalance.objects.filter(period__fy=fy)
+        pl = balances.filter(
             nominal__type="pl").aggregate(profit=Sum("value"))
-        balance_sheet = self.filter(period__fy=fy).filter(
-            nominal__type="b").values("nominal").annotate(total=Sum("value"))
+        balance_sheet = balances.filter(
+            nominal__type="b").values("nominal").annotate(total=Sum("value")).order_by("nominal")
         """
         We only really care about posting nominal transactions but nominaltransaction.header is
         unique per MODULE.  Since we want module=NL we create a blank header to satisfy this requirement.
@@ -265,6 +361,11 @@ class NominalTransaction(MultiLedgerTransactions):
             models.UniqueConstraint(
                 fields=['module', 'header', 'line', 'field'], name="nominal_unique_batch")
         ]
+        indexes = [
+            # the nominal activity report seeks through a nominal and period by date
+            models.Index(
+                fields=['nominal', 'period', 'date', 'id'], name="nominal_activity_idx")
+        ]
 
     objects = NominalTransactionQuerySet.as_manager()
 
@@ -279,6 +380,35 @@ class NominalTransaction(MultiLedgerTransactions):
             "type"
         ]
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            removed = []
+            if self.pk:
+                removed = self.balance_entries(
+                    type(self).objects.filter(pk=self.pk))
+            super().save(*args, **kwargs)
+            NominalBalance.apply(
+                removed=removed,
+                added=self.balance_entries([self])
+            )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            removed = self.balance_entries(
+                type(self).objects.filter(pk=self.pk))
+            deleted = super().delete(*args, **kwargs)
+            NominalBalance.apply(removed=removed)
+        return deleted
+
+    @staticmethod
+    def balance_entries(trans):
+        """
+        (nominal, period, value) for each of `trans` - a queryset or the objects themselves
+        """
+        if isinstance(trans, models.QuerySet):
+            return list(trans.values_list("nominal", "period", "value"))
+        return [(tran.nominal_id, tran.period_id, tran.value) for tran in trans]
+
     @classmethod
     def brought_forward(cls, header, line, fy, period, value, nominal_pk):
         return cls(
@@ -295,6 +425,211 @@ class NominalTransaction(MultiLedgerTransactions):
         )
 
 
+class NominalBalanceQuerySet(models.QuerySet):
+
+    def trial_balance(self, from_period, to_period):
+        """
+        The movement for the period range, and the YTD movement, per nominal from a single
+        grouped query over the balances.  The YTD starts at the first period of the FY of
+        `to_period`.
+
+        Only nominals with transactions in the period range are returned.
+        The MPTT fields of the nominal are included so the caller can roll up the totals.
+        """
+        in_range = Q(
+            period__fy_and_period__gte=from_period.fy_and_period,
+            period__fy_and_period__lte=to_period.fy_and_period
+        )
+        return (
+            self
+            .filter(period__fy=to_period.fy_id)
+            .filter(period__fy_and_period__lte=to_period.fy_and_period)
+            .values(
+                "nominal",
+                "nominal__name",
+                "nominal__tree_id",
+                "nominal__lft",
+                "nominal__rght"
+            )
+            .annotate(
+                total=Sum("value", filter=in_range),
+                ytd=Sum("value")
+            )
+            .filter(total__isnull=False)
+            .order_by("nominal__tree_id", "nominal__lft")
+        )
+
+
+class NominalBalance(models.Model):
+    """
+    The net movement of a nominal for a period i.e. the sum of the values of the nominal
+    transactions, along with how many transactions there are.  A row exists only while there
+    are transactions for the nominal and period so the reports see the same nominals they
+    would summing the transactions.
+
+    The rows are kept up to date by NominalTransaction and its queryset.  Do not create or
+    update the rows directly.  Use the rebuild_nominal_balances command to rebuild or verify
+    them from the transactions.
+    """
+    nominal = models.ForeignKey(
+        Nominal, on_delete=models.CASCADE, related_name="balances")
+    period = models.ForeignKey(Period, on_delete=models.CASCADE)
+    value = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+        default=0
+    )
+    transactions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['nominal', 'period'], name="nominal_balance_unique")
+        ]
+
+    objects = NominalBalanceQuerySet.as_manager()
+
+    @classmethod
+    def apply(cls, removed=(), added=()):
+        """
+        `removed` and `added` are (nominal, period, value) for the nominal transactions which
+        were deleted and created.  An update is the old values removed and the new added.
+        Transactions without a period are not counted.
+        """
+        changes = {}
+        for entries, sign in ((removed, -1), (added, 1)):
+            for nominal, period, value in entries:
+                if period is None:
+                    continue
+                change_value, change_count = changes.get(
+                    (nominal, period), (0, 0))
+                changes[(nominal, period)] = (
+                    change_value + sign * value,
+                    change_count + sign
+                )
+        changes = {
+            key: change
+            for key, change in changes.items()
+            if change != (0, 0)
+        }
+        if not changes:
+            return
+        keys = sorted(changes)
+        with transaction.atomic():
+            # a lock cannot be taken on a row which does not exist yet so first insert any row
+            # missing.  A post from another ledger for the same nominal and period waits here
+            # on the insert rather than failing on the unique constraint.
+            cls.objects.bulk_create(
+                [
+                    cls(nominal_id=nominal, period_id=period)
+                    for nominal, period in keys
+                ],
+                ignore_conflicts=True
+            )
+            # locked in the same order by every post so posts cannot deadlock
+            balances = (
+                cls.objects
+                .select_for_update()
+                .filter(nominal__in={nominal for nominal, _ in keys})
+                .filter(period__in={period for _, period in keys})
+                .order_by("nominal", "period")
+            )
+            balances = {
+                (balance.nominal_id, balance.period_id): balance
+                for balance in balances
+            }
+            to_update = []
+            to_delete = []
+            for key in keys:
+                value, count = changes[key]
+                balance = balances[key]
+                balance.value += value
+                balance.transactions += count
+                if balance.transactions > 0:
+                    to_update.append(balance)
+                else:
+                    to_delete.append(balance.pk)
+            cls.objects.bulk_update(to_update, ["value", "transactions"])
+            cls.objects.filter(pk__in=to_delete).delete()
+
+    @classmethod
+    def from_transactions(cls):
+        """
+        The balances as they should be, summed from the nominal transactions
+        """
+        return {
+            (row["nominal"], row["period"]): (row["total"], row["count"])
+            for row in (
+                NominalTransaction.objects
+                .filter(period__isnull=False)
+                .values("nominal", "period")
+                .annotate(total=Sum("value"), count=Count("pk"))
+                .order_by()
+            )
+        }
+
+    @classmethod
+    def rebuild(cls):
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        nominal_id=nominal,
+                        period_id=period,
+                        value=value,
+                        transactions=count
+                    )
+                    for (nominal, period), (value, count) in cls.from_transactions().items()
+                ],
+                batch_size=2000
+            )
+
+    @classmethod
+    def verify(cls):
+        """
+        Returns the (nominal, period, expected, actual) for each balance which does not agree
+        with the transactions.  expected and actual are (value, transactions) or None.
+        """
+        expected = cls.from_transactions()
+        actual = {
+            (balance["nominal"], balance["period"]): (balance["value"], balance["transactions"])
+            for balance in cls.objects.values("nominal", "period", "value", "transactions")
+        }
+        return [
+            (nominal, period, expected.get((nominal, period)), actual.get((nominal, period)))
+            for nominal, period in sorted(set(expected) | set(actual))
+            if expected.get((nominal, period)) != actual.get((nominal, period))
+        ]
+
+
+
+class NominalTransactionSummary(TransactionSummary):
+    """
+    The nominal transactions per header and nominal for the nominal transaction enquiry
+    """
+    nominal = models.ForeignKey(Nominal, on_delete=models.CASCADE)
+    type = models.CharField(max_length=10)
+    total = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+        default=0
+    )
+
+    grain = ["nominal", "type"]
+    sums = {"total": "value"}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['module', 'header'],
+                         name="nominal_summary_header_idx"),
+            GinIndex(fields=["ref"], opclasses=["gin_trgm_ops"],
+                     name="nominal_summary_ref_trgm_idx")
+        ]
+
+
+NominalTransaction.summary_model = NominalTransactionSummary
+
 def update_details_from_header(self, header):
     super().update_details_from_header(header)
     self.type = header.type
\ No newline at end of file
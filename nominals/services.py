@@ -0,0 +1,15 @@
+from accountancy.services import TransactionService
+from vat.models import VatTransaction
+
+from nominals.imports import NominalImport
+from nominals.models import (Nominal, NominalHeader, NominalLine,
+                             NominalTransaction)
+
+
+class NominalService(TransactionService):
+    header_model = NominalHeader
+    line_model = NominalLine
+    nominal_model = Nominal
+    nominal_transaction_model = NominalTransaction
+    vat_transaction_model = VatTransaction
+    importer_class = NominalImport
@@ -0,0 +1,175 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+from controls.models import FinancialYear, ModuleSettings, Period
+from django.contrib.auth import get_user_model
+from django.shortcuts import reverse
+from django.test import TestCase
+from nominals.helpers import NominalActivityReport
+from nominals.models import Nominal, NominalTransaction
+
+
+class NominalActivityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse("nominals:activity")
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        assets = Nominal.objects.create(name="Assets")
+        current_assets = Nominal.objects.create(
+            name="Current Assets", parent=assets)
+        cls.bank = Nominal.objects.create(name="Bank", parent=current_assets)
+        cls.debtors = Nominal.objects.create(
+            name="Debtors", parent=current_assets)
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.period_2 = Period.objects.create(
+            fy=fy, period="02", fy_and_period="202002", month_start=date(2020, 2, 29))
+        ModuleSettings.objects.create(nominals_period=cls.period_2)
+        trans = [
+            (1, cls.bank, cls.period_1, date(2020, 1, 1), 100),
+            (2, cls.bank, cls.period_2, date(2020, 2, 1), 10),
+            (3, cls.bank, cls.period_2, date(2020, 2, 2), 20),
+            (4, cls.bank, cls.period_2, date(2020, 2, 3), 30),
+            (5, cls.debtors, cls.period_2, date(2020, 2, 1), -5),
+        ]
+        NominalTransaction.objects.bulk_create([
+            NominalTransaction(
+                module="NL",
+                header=header,
+                line=1,
+                field="g",
+                ref=str(header),
+                type="nj",
+                date=tran_date,
+                nominal=nominal,
+                period=period,
+                value=value
+            )
+            for header, nominal, period, tran_date, value in trans
+        ])
+
+    def summary(self, rows):
+        return [
+            (row["row_type"], row["nominal_name"], row["balance"])
+            for row in rows
+        ]
+
+    def test_page(self):
+        report = NominalActivityReport(self.period_2, self.period_2)
+        rows, after = report.page(10)
+        self.assertIsNone(after)
+        self.assertEqual(
+            self.summary(rows),
+            [
+                ("opening", "Bank", Decimal("100.00")),
+                ("transaction", "Bank", Decimal("110.00")),
+                ("transaction", "Bank", Decimal("130.00")),
+                ("transaction", "Bank", Decimal("160.00")),
+                ("closing", "Bank", Decimal("160.00")),
+                ("opening", "Debtors", 0),
+                ("transaction", "Debtors", Decimal("-5.00")),
+                ("closing", "Debtors", Decimal("-5.00")),
+            ]
+        )
+
+    def test_pages_carry_the_balance(self):
+        report = NominalActivityReport(self.period_2, self.period_2)
+        rows, after = report.page(2)
+        self.assertEqual(
+            self.summary(rows),
+            [
+                ("opening", "Bank", Decimal("100.00")),
+                ("transaction", "Bank", Decimal("110.00")),
+                ("transaction", "Bank", Decimal("130.00")),
+            ]
+        )
+        rows, after = report.page(1, after)
+        self.assertEqual(
+            self.summary(rows),
+            [
+                ("transaction", "Bank", Decimal("160.00")),
+            ]
+        )
+        rows, after = report.page(2, after)
+        self.assertIsNone(after)
+        self.assertEqual(
+            self.summary(rows),
+            [
+                ("closing", "Bank", Decimal("160.00")),
+                ("opening", "Debtors", 0),
+                ("transaction", "Debtors", Decimal("-5.00")),
+                ("closing", "Debtors", Decimal("-5.00")),
+            ]
+        )
+
+    def test_iter_rows_agrees_with_pages(self):
+        report = NominalActivityReport(self.period_1, self.period_2)
+        rows, _ = report.page(100)
+        self.assertEqual(
+            self.summary(report.iter_rows()),
+            self.summary(rows)
+        )
+
+    def test_ajax(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            self.url,
+            data={
+                "from_period": self.period_2.pk,
+                "to_period": self.period_2.pk,
+                "from_nominal": self.debtors.pk,
+                "length": 5
+            },
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        content = json.loads(response.content.decode("utf"))
+        self.assertEqual(
+            [row["row_type"] for row in content["rows"]],
+            ["opening", "transaction", "closing"]
+        )
+        self.assertIsNone(content["after"])
+
+    def test_bad_cursor(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            self.url,
+            data={
+                "from_period": self.period_2.pk,
+                "to_period": self.period_2.pk,
+                "after": "tampered"
+            }
+        )
+        self.assertEqual(
+            response.status_code,
+            400
+        )
+
+    def test_export(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            self.url,
+            data={
+                "from_period": self.period_2.pk,
+                "to_period": self.period_2.pk,
+                "to_nominal": self.bank.pk,
+                "export": "csv"
+            }
+        )
+        content = b"".join(response.streaming_content).decode("utf-8")
+        lines = content.splitlines()
+        self.assertEqual(
+            lines[0],
+            "Nominal,Period,Date,Module,Ref,Type,Value,Balance"
+        )
+        self.assertEqual(
+            lines[1],
+            "Bank,,,,Opening Balance,,,100.00"
+        )
+        self.assertEqual(
+            lines[-1],
+            "Bank,,,,Closing Balance,,,160.00"
+        )
@@ -0,0 +1,128 @@
+import io
+import json
+from datetime import date
+
+from accountancy.imports import read_lines
+from controls.models import FinancialYear, ModuleSettings, Period
+from django.contrib.auth import get_user_model
+from django.shortcuts import reverse
+from django.test import TestCase
+from nominals.models import (Nominal, NominalHeader, NominalLine,
+                             NominalTransaction)
+
+
+class BulkJournalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        ModuleSettings.objects.create(
+            cash_book_period=cls.period,
+            nominals_period=cls.period,
+            purchases_period=cls.period,
+            sales_period=cls.period
+        )
+        assets = Nominal.objects.create(name="Assets")
+        current_assets = Nominal.objects.create(
+            parent=assets, name="Current Assets")
+        cls.bank_nominal = Nominal.objects.create(
+            parent=current_assets, name="Bank Account")
+        cls.vat_nominal = Nominal.objects.create(
+            parent=current_assets, name="Vat")
+        expenses = Nominal.objects.create(name="Expenses")
+        cls.wages_nominal = Nominal.objects.create(
+            parent=expenses, name="Wages")
+
+    def post(self, lines, format="json", **kwargs):
+        data = {
+            "type": "nj",
+            "ref": "payroll",
+            "date": "2020-01-15",
+            "total": 1000,
+            "lines": lines,
+            "format": format
+        }
+        data.update(kwargs)
+        self.client.force_login(self.user)
+        return self.client.post(reverse("nominals:create_bulk"), data)
+
+    def test_read_lines(self):
+        self.assertEqual(
+            read_lines('[["wages", 10, "Wages", "", 0], {"description": "bank", "goods": -10}]', "json"),
+            [
+                {"description": "wages", "goods": 10, "nominal": "Wages", "vat_code": "", "vat": 0},
+                {"description": "bank", "goods": -10}
+            ]
+        )
+        self.assertEqual(
+            read_lines("description,goods,nominal\nwages,10,Wages\n", "csv"),
+            [{"description": "wages", "goods": "10", "nominal": "Wages", "vat_code": None, "vat": None}]
+        )
+        with self.assertRaises(ValueError):
+            read_lines('{"description": "wages"}', "json")
+
+    def test_json(self):
+        lines = []
+        for i in range(100):
+            lines += [
+                [f"employee {i}", 10, "Wages", "", 0],
+                [f"employee {i}", -10, "Bank Account", "", 0],
+            ]
+        response = self.post(json.dumps(lines))
+        self.assertEqual(response.status_code, 200)
+        header = NominalHeader.objects.get()
+        self.assertEqual(response.json()["id"], header.pk)
+        self.assertEqual(header.total, 1000)
+        self.assertEqual(header.period, self.period)
+        self.assertEqual(NominalLine.objects.count(), 200)
+        self.assertEqual(
+            list(NominalLine.objects.order_by("line_no").values_list("line_no", flat=True)),
+            list(range(1, 201))
+        )
+        nom_trans = NominalTransaction.objects.all()
+        self.assertEqual(len(nom_trans), 200)
+        self.assertEqual(sum(tran.value for tran in nom_trans), 0)
+
+    def test_csv(self):
+        response = self.post(
+            "description,goods,nominal\n"
+            "wages,1000,Wages\n"
+            "wages,-1000,Bank Account\n",
+            format="csv"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(NominalLine.objects.count(), 2)
+
+    def test_unbalanced(self):
+        response = self.post(json.dumps([
+            ["wages", 1000, "Wages", "", 0],
+            ["wages", -900, "Bank Account", "", 0],
+        ]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("__all__", response.json()["errors"])
+        self.assertEqual(NominalHeader.objects.count(), 0)
+
+    def test_unknown_nominal(self):
+        response = self.post(json.dumps([
+            ["wages", 1000, "Salaries", "", 0],
+            ["wages", -1000, "Bank Account", "", 0],
+        ]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("line-0-nominal", response.json()["errors"])
+        self.assertEqual(NominalHeader.objects.count(), 0)
+
+    def test_unreadable(self):
+        response = self.post("[[")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("lines", response.json()["errors"])
+
+    def test_upload_not_utf8(self):
+        f = io.BytesIO("description,goods,nominal\nsalaire,1000,Wages\n".encode("utf-16"))
+        f.name = "lines.csv"
+        response = self.post(f, format="csv")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("lines", response.json()["errors"])
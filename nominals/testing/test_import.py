@@ -0,0 +1,94 @@
+import io
+import json
+from datetime import date
+
+from accountancy.imports import read_transactions
+from controls.models import FinancialYear, ModuleSettings, Period
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from nominals.imports import NominalImport
+from nominals.models import Nominal, NominalHeader, NominalTransaction
+
+
+class ImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        ModuleSettings.objects.create(
+            cash_book_period=cls.period,
+            nominals_period=cls.period,
+            purchases_period=cls.period,
+            sales_period=cls.period
+        )
+        assets = Nominal.objects.create(name="Assets")
+        current_assets = Nominal.objects.create(
+            parent=assets, name="Current Assets")
+        cls.bank_nominal = Nominal.objects.create(
+            parent=current_assets, name="Bank Account")
+        cls.vat_nominal = Nominal.objects.create(
+            parent=current_assets, name="Vat")
+        expenses = Nominal.objects.create(name="Expenses")
+        cls.wages_nominal = Nominal.objects.create(
+            parent=expenses, name="Wages")
+
+    def journal(self, **kwargs):
+        record = {
+            "type": "nj",
+            "ref": "payroll",
+            "date": "2020-01-15",
+            "total": 1000,
+            "lines": [
+                {"description": "wages", "goods": 1000, "nominal": "Wages"},
+                {"description": "wages", "goods": -1000, "nominal": "Bank Account"},
+            ]
+        }
+        record.update(kwargs)
+        return json.dumps(record)
+
+    def run_import(self, *records):
+        f = io.StringIO("".join(record + "\n" for record in records))
+        return NominalImport(user=self.user).run(read_transactions(f, "jsonl"))
+
+    def test_journal(self):
+        report = self.run_import(self.journal())
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(report["errors"], [])
+        header = NominalHeader.objects.get()
+        self.assertEqual(header.total, 1000)
+        self.assertEqual(header.goods, 1000)
+        nom_trans = NominalTransaction.objects.all()
+        self.assertEqual(len(nom_trans), 2)
+        self.assertEqual(
+            {tran.nominal: tran.value for tran in nom_trans},
+            {self.wages_nominal: 1000, self.bank_nominal: -1000}
+        )
+
+    def test_journal_must_balance(self):
+        report = self.run_import(
+            self.journal(lines=[
+                {"description": "wages", "goods": 1000, "nominal": "Wages"},
+                {"description": "wages", "goods": -900, "nominal": "Bank Account"},
+            ])
+        )
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(
+            report["errors"][0]["errors"]["__all__"],
+            [
+                "Debits and credits must total zero.  Total debits entered i.e. positives values entered is 1000.00, "
+                "and total credits entered i.e. negative values entered, is -900.00.  This gives a non-zero total of 100.00"
+            ]
+        )
+        self.assertEqual(NominalHeader.objects.count(), 0)
+
+    def test_total_must_be_the_debits(self):
+        report = self.run_import(self.journal(total=500))
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(
+            report["errors"][0]["errors"]["__all__"],
+            ["The total of the debits does not equal the total you entered."]
+        )
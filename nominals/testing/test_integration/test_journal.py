@@ -4,7 +4,7 @@ from json import loads
 
 from accountancy.helpers import sort_multiple
 from accountancy.testing.helpers import create_formset_data, create_header
-from controls.models import FinancialYear, ModuleSettings, Period
+from controls.models import FinancialYear, ModuleSettings, Period, QueuePosts
 from django.contrib.auth import get_user_model
 from django.shortcuts import reverse
 from django.test import RequestFactory, TestCase
@@ -138,6 +138,8 @@ class CreateJournal(TestCase):
         data.update(line_data)
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, 302)
+        # what is cached against the ledger is invalidated
+        self.assertEqual(QueuePosts.get_version("n"), 1)
         header = NominalHeader.objects.all()
         self.assertEqual(
             len(header),
@@ -1036,6 +1038,8 @@ class CreateJournal(TestCase):
         data.update(line_data)
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, 200)
+        # nothing was posted so what is cached against the ledger is still valid
+        self.assertEqual(QueuePosts.get_version("n"), 0)
         header = NominalHeader.objects.all()
         lines = NominalLine.objects.all()
         self.assertEqual(
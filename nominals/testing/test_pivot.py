@@ -0,0 +1,199 @@
+from datetime import date
+from decimal import Decimal
+
+from controls.models import FinancialYear, Period
+from django.contrib.auth import get_user_model
+from django.shortcuts import reverse
+from django.test import TestCase, TransactionTestCase
+from nominals.helpers import NominalPivotReport
+from nominals.models import Nominal, NominalTransaction
+
+
+class NominalPivotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse("nominals:pivot")
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        revenues = Nominal.objects.create(name="Revenues")
+        revenue = Nominal.objects.create(name="Revenue", parent=revenues)
+        cls.sales = Nominal.objects.create(name="Sales", parent=revenue)
+        assets = Nominal.objects.create(name="Assets")
+        current_assets = Nominal.objects.create(
+            name="Current Assets", parent=assets)
+        cls.bank = Nominal.objects.create(name="Bank", parent=current_assets)
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.period_2 = Period.objects.create(
+            fy=fy, period="02", fy_and_period="202002", month_start=date(2020, 2, 29))
+        trans = [
+            (1, "SL", cls.sales, cls.period_1, -100),
+            (2, "SL", cls.bank, cls.period_1, 100),
+            (3, "NL", cls.sales, cls.period_2, -50),
+            (4, "NL", cls.bank, cls.period_2, 50),
+        ]
+        NominalTransaction.objects.bulk_create([
+            NominalTransaction(
+                module=module,
+                header=header,
+                line=1,
+                field="g",
+                ref="1",
+                type="nj",
+                date=date(2020, 1, 1),
+                nominal=nominal,
+                period=period,
+                value=value
+            )
+            for header, module, nominal, period, value in trans
+        ])
+
+    def test_nominal_by_period(self):
+        report = NominalPivotReport(
+            NominalTransaction.objects.all(),
+            ["nominal"],
+            ["period"]
+        )
+        columns, rows = report.pivot()
+        self.assertEqual(
+            columns,
+            [("202001",), ("202002",)]
+        )
+        self.assertEqual(
+            list(rows),
+            [
+                {
+                    "keys": ("Bank",),
+                    "level": 0,
+                    "cells": {("202001",): Decimal("100.00"), ("202002",): Decimal("50.00")},
+                    "total": Decimal("150.00")
+                },
+                {
+                    "keys": ("Sales",),
+                    "level": 0,
+                    "cells": {("202001",): Decimal("-100.00"), ("202002",): Decimal("-50.00")},
+                    "total": Decimal("-150.00")
+                },
+                {
+                    "keys": (None,),
+                    "level": 1,
+                    "cells": {("202001",): Decimal("0.00"), ("202002",): Decimal("0.00")},
+                    "total": Decimal("0.00")
+                },
+            ]
+        )
+
+    def test_subtotals_by_ancestor(self):
+        report = NominalPivotReport(
+            NominalTransaction.objects.filter(period=self.period_1),
+            ["grand_parent", "nominal"]
+        )
+        columns, rows = report.pivot()
+        self.assertEqual(
+            columns,
+            []
+        )
+        self.assertEqual(
+            [(row["keys"], row["total"]) for row in rows],
+            [
+                (("Assets", "Bank"), Decimal("100.00")),
+                (("Assets", None), Decimal("100.00")),
+                (("Revenues", "Sales"), Decimal("-100.00")),
+                (("Revenues", None), Decimal("-100.00")),
+                ((None, None), Decimal("0.00")),
+            ]
+        )
+
+    def test_unknown_dimension(self):
+        with self.assertRaises(ValueError):
+            NominalPivotReport(NominalTransaction.objects.all(), ["ref"])
+
+    def test_export(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            self.url,
+            data={
+                "row_1": "module",
+                "column": "period",
+                "from_period": self.period_2.pk,
+                "export": "csv"
+            }
+        )
+        self.assertEqual(
+            response.status_code,
+            200
+        )
+        content = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(
+            content.splitlines(),
+            [
+                "Module,202002,Total",
+                "NL,0.00,0.00",
+                "Total,0.00,0.00",
+            ]
+        )
+
+    def test_duplicate_dimension(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            self.url,
+            data={
+                "row_1": "module",
+                "column": "module"
+            }
+        )
+        self.assertContains(
+            response,
+            "A dimension can only be used once"
+        )
+
+
+class NominalPivotViewTests(TransactionTestCase):
+    """
+    Outside of a test transaction so the transaction for the request commits like it
+    does in production
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        revenues = Nominal.objects.create(name="Revenues")
+        revenue = Nominal.objects.create(name="Revenue", parent=revenues)
+        # a dimension value which is the same as the label for the totals
+        sales = Nominal.objects.create(name="Total", parent=revenue)
+        fy = FinancialYear.objects.create(financial_year=2020)
+        period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        NominalTransaction.objects.create(
+            module="NL",
+            header=1,
+            line=1,
+            field="g",
+            ref="1",
+            type="nj",
+            date=date(2020, 1, 1),
+            nominal=sales,
+            period=period,
+            value=-100
+        )
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("nominals:pivot"),
+            data={
+                "row_1": "nominal",
+                "column": "period"
+            }
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context["rows"],
+            [
+                {"level": 0, "cells": ["Total", Decimal("-100.00"), Decimal("-100.00")]},
+                {"level": 1, "cells": ["Total", Decimal("-100.00"), Decimal("-100.00")]},
+            ]
+        )
+        self.assertContains(response, 'class="subtotal"', count=1)
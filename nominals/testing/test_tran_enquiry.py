@@ -5,6 +5,7 @@ from decimal import Decimal
 from accountancy.testing.helpers import dict_to_url, encodeURI
 from controls.models import FinancialYear, Period
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.shortcuts import reverse
 from django.test import TestCase
 from nominals.models import Nominal, NominalTransaction
@@ -26,6 +27,10 @@ class TranEnquiryTests(TestCase):
         cls.period = Period.objects.create(
             fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
 
+    def setUp(self):
+        # enquiry counts are cached
+        cache.clear()
+
     def test_basic(self):
         t = NominalTransaction.objects.create(
             module="PL",
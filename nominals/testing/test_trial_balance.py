@@ -234,6 +234,85 @@ class TrialBalanceTests(TestCase):
             }
         )
 
+    def test_subtotals(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        subtotals = {
+            subtotal["nominal"]: subtotal
+            for subtotal in response.context_data["subtotals"]
+        }
+        self.assertEqual(
+            subtotals["Revenues"],
+            {
+                "nominal": "Revenues",
+                "level": 0,
+                "total": Decimal('-100.00'),
+                "ytd": Decimal('-100.00')
+            }
+        )
+        self.assertEqual(
+            subtotals["Current Liabilities"],
+            {
+                "nominal": "Current Liabilities",
+                "level": 1,
+                "total": Decimal('-120.00'),
+                "ytd": Decimal('-120.00')
+            }
+        )
+        self.assertEqual(
+            subtotals["Assets"]["total"],
+            Decimal('120.00')
+        )
+        # rendered for the group rows
+        self.assertContains(response, '<script id="subtotals" type="application/json">')
+        self.assertContains(response, '"nominal": "Current Liabilities"')
+
+    def test_ytd_includes_earlier_periods(self):
+        NominalTransaction.objects.create(
+            header=2,
+            line=1,
+            module="PL",
+            ref="2",
+            period=self.p_202001,
+            type="pi",
+            field="g",
+            nominal=self.sundry,
+            value=50,
+            date=date.today()
+        )
+        NominalTransaction.objects.create(
+            header=3,
+            line=1,
+            module="PL",
+            ref="3",
+            period=self.p_202002,
+            type="pi",
+            field="g",
+            nominal=self.sundry,
+            value=25,
+            date=date.today()
+        )
+        self.client.force_login(self.user)
+        response = self.client.get(
+            self.url,
+            data={
+                "from_period": self.p_202002.pk,
+                "to_period": self.p_202002.pk
+            }
+        )
+        report = response.context_data["report"]
+        self.assertEqual(
+            report,
+            [
+                {
+                    "nominal": "Sundry",
+                    "total": Decimal('25.00'),
+                    "parents": ["Expenses", "Expense"],
+                    "ytd": Decimal('175.00')
+                }
+            ]
+        )
+
     def test_different_fy(self):
         self.client.force_login(self.user)
         response = self.client.get(
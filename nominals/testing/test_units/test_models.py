@@ -1,9 +1,16 @@
+import time
 from datetime import date
+from decimal import Decimal
+from io import StringIO
 
 from controls.models import FinancialYear, Period
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from nominals.models import Nominal, NominalHeader, NominalTransaction
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from nominals.models import (Nominal, NominalBalance, NominalHeader,
+                             NominalTransaction, NominalTransactionSummary,
+                             system_nominals)
 
 
 class CarryForwardTests(TestCase):
@@ -1198,4 +1205,244 @@ class RollbackFYTests(TestCase):
         self.assertEqual(
             headers[0],
             header_1
-        )
\ No newline at end of file
+        )
+
+
+class NominalBalanceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.period_2 = Period.objects.create(
+            fy=fy, period="02", fy_and_period="202002", month_start=date(2020, 2, 29))
+        cls.sales = Nominal.objects.create(name="sales", type="pl")
+        cls.bank = Nominal.objects.create(name="bank", type="b")
+
+    def tran(self, line, nominal, period, value):
+        return NominalTransaction(
+            module="NL",
+            header=1,
+            line=line,
+            field="g",
+            ref="1",
+            type="nj",
+            date=date(2020, 1, 1),
+            nominal=nominal,
+            period=period,
+            value=value
+        )
+
+    def balances(self):
+        return {
+            (b.nominal_id, b.period_id): (b.value, b.transactions)
+            for b in NominalBalance.objects.all()
+        }
+
+    def test_bulk_create(self):
+        NominalTransaction.objects.bulk_create([
+            self.tran(1, self.sales, self.period_1, -100),
+            self.tran(2, self.sales, self.period_1, -50),
+            self.tran(3, self.bank, self.period_2, 150),
+        ])
+        self.assertEqual(
+            self.balances(),
+            {
+                (self.sales.pk, self.period_1.pk): (Decimal("-150.00"), 2),
+                (self.bank.pk, self.period_2.pk): (Decimal("150.00"), 1),
+            }
+        )
+
+    def test_bulk_update_moves_the_balance(self):
+        trans = NominalTransaction.objects.bulk_create([
+            self.tran(1, self.sales, self.period_1, -100),
+            self.tran(2, self.sales, self.period_1, -50),
+        ])
+        trans[0].period = self.period_2
+        trans[0].value = -80
+        NominalTransaction.objects.bulk_update(trans)
+        self.assertEqual(
+            self.balances(),
+            {
+                (self.sales.pk, self.period_1.pk): (Decimal("-50.00"), 1),
+                (self.sales.pk, self.period_2.pk): (Decimal("-80.00"), 1),
+            }
+        )
+
+    def test_delete_removes_the_row(self):
+        tran = NominalTransaction.objects.create(
+            module="NL",
+            header=1,
+            line=1,
+            field="g",
+            ref="1",
+            type="nj",
+            date=date(2020, 1, 1),
+            nominal=self.sales,
+            period=self.period_1,
+            value=0
+        )
+        self.assertEqual(
+            self.balances(),
+            {
+                (self.sales.pk, self.period_1.pk): (Decimal("0.00"), 1),
+            }
+        )
+        NominalTransaction.objects.filter(pk=tran.pk).delete()
+        self.assertEqual(
+            self.balances(),
+            {}
+        )
+
+    def test_apply_to_a_row_posted_by_another_ledger(self):
+        # as if another ledger posted to the same nominal and period first
+        NominalBalance.objects.create(
+            nominal=self.sales, period=self.period_1, value=-20, transactions=1)
+        NominalBalance.apply(
+            added=[
+                (self.sales.pk, self.period_1.pk, Decimal("-100.00")),
+                (self.bank.pk, self.period_1.pk, Decimal("100.00")),
+            ]
+        )
+        self.assertEqual(
+            self.balances(),
+            {
+                (self.sales.pk, self.period_1.pk): (Decimal("-120.00"), 2),
+                (self.bank.pk, self.period_1.pk): (Decimal("100.00"), 1),
+            }
+        )
+
+    def test_rebuild_and_verify(self):
+        NominalTransaction.objects.bulk_create([
+            self.tran(1, self.sales, self.period_1, -100),
+            self.tran(2, self.bank, self.period_1, 100),
+        ])
+        NominalBalance.objects.filter(nominal=self.bank).delete()
+        self.assertEqual(
+            NominalBalance.verify(),
+            [(self.bank.pk, self.period_1.pk, (Decimal("100.00"), 1), None)]
+        )
+        with self.assertRaises(CommandError):
+            call_command("rebuild_nominal_balances", "--verify",
+                         stdout=StringIO(), stderr=StringIO())
+        call_command("rebuild_nominal_balances", stdout=StringIO())
+        self.assertEqual(
+            NominalBalance.verify(),
+            []
+        )
+
+
+class NominalTransactionSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.sales = Nominal.objects.create(name="sales", type="pl")
+        cls.vat = Nominal.objects.create(name="vat", type="b")
+
+    def tran(self, header, line, field, nominal, value):
+        return NominalTransaction(
+            module="PL",
+            header=header,
+            line=line,
+            field=field,
+            ref=str(header),
+            type="pi",
+            date=date(2020, 1, 1),
+            nominal=nominal,
+            period=self.period_1,
+            value=value
+        )
+
+    def summaries(self):
+        return sorted(
+            NominalTransactionSummary.objects.values_list(
+                "header", "nominal", "total")
+        )
+
+    def test_summary_per_header_and_nominal(self):
+        trans = NominalTransaction.objects.bulk_create([
+            self.tran(1, 1, "g", self.sales, 100),
+            self.tran(1, 1, "v", self.vat, 20),
+            self.tran(1, 2, "g", self.sales, 50),
+            self.tran(2, 3, "g", self.sales, 10),
+        ])
+        self.assertEqual(
+            self.summaries(),
+            [
+                (1, self.sales.pk, Decimal("150.00")),
+                (1, self.vat.pk, Decimal("20.00")),
+                (2, self.sales.pk, Decimal("10.00")),
+            ]
+        )
+        trans[2].value = 60
+        NominalTransaction.objects.bulk_update([trans[2]])
+        NominalTransaction.objects.filter(pk=trans[3].pk).delete()
+        self.assertEqual(
+            self.summaries(),
+            [
+                (1, self.sales.pk, Decimal("160.00")),
+                (1, self.vat.pk, Decimal("20.00")),
+            ]
+        )
+
+    def test_rebuild_command(self):
+        NominalTransaction.objects.bulk_create([
+            self.tran(1, 1, "g", self.sales, 100),
+        ])
+        NominalTransactionSummary.objects.all().delete()
+        call_command("rebuild_transaction_summaries",
+                     "nominals.NominalTransaction", stdout=StringIO())
+        self.assertEqual(
+            self.summaries(),
+            [
+                (1, self.sales.pk, Decimal("100.00")),
+            ]
+        )
+
+
+class SystemNominalsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        liabilities = Nominal.objects.create(name="Liabilities")
+        cls.vat = Nominal.objects.create(parent=liabilities, name="Vat")
+
+    def setUp(self):
+        system_nominals.clear()
+
+    def test_looked_up_once(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Nominal.get_system_nominal("Vat"), self.vat)
+            self.assertEqual(Nominal.get_system_nominal("Vat"), self.vat)
+
+    def test_does_not_exist_looked_up_once(self):
+        with self.assertNumQueries(1):
+            for _ in range(2):
+                with self.assertRaises(Nominal.DoesNotExist):
+                    Nominal.get_system_nominal("Vat Control")
+
+    def test_cleared_on_rename(self):
+        Nominal.get_system_nominal("Vat")
+        self.vat.name = "Old Vat"
+        self.vat.save()
+        with self.assertRaises(Nominal.DoesNotExist):
+            Nominal.get_system_nominal("Vat")
+        vat = Nominal.objects.create(parent=self.vat.parent, name="Vat")
+        self.assertEqual(Nominal.get_system_nominal("Vat"), vat)
+
+    def test_cleared_on_delete(self):
+        Nominal.get_system_nominal("Vat")
+        self.vat.delete()
+        with self.assertRaises(Nominal.DoesNotExist):
+            Nominal.get_system_nominal("Vat")
+
+    @override_settings(SYSTEM_NOMINALS_CACHE_TIMEOUT=0)
+    def test_timeout(self):
+        with self.assertNumQueries(2):
+            Nominal.get_system_nominal("Vat")
+            time.sleep(0.01)
+            Nominal.get_system_nominal("Vat")
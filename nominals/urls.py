@@ -1,17 +1,22 @@
 from django.urls import path
 
-from .views import (CreateTransaction, EditTransaction, FinaliseFY,
-                    LoadNominal, NominalCreate, NominalDetail, NominalEdit,
-                    NominalList, RollbackFY, TransactionEnquiry, TrialBalance,
+from .views import (CreateBulkTransaction, CreateTransaction, EditTransaction, FinaliseFY,
+                    ImportTransactions, LoadNominal, NominalActivity, NominalCreate,
+                    NominalDetail, NominalEdit, NominalList, NominalPivot,
+                    RollbackFY, TransactionEnquiry, TrialBalance,
                     ViewTransaction, VoidTransaction)
 
 app_name = "nominals"
 urlpatterns = [
     path("create", CreateTransaction.as_view(), name="create"),
+    path("import", ImportTransactions.as_view(), name="import"),
+    path("create_bulk", CreateBulkTransaction.as_view(), name="create_bulk"),
     path("edit/<int:pk>", EditTransaction.as_view(), name="edit"),
     path("view/<int:pk>", ViewTransaction.as_view(), name="view"),
     path("void/<int:pk>", VoidTransaction.as_view(), name="void"),
     path("trial_balance", TrialBalance.as_view(), name="trial_balance"),
+    path("pivot", NominalPivot.as_view(), name="pivot"),
+    path("activity", NominalActivity.as_view(), name="activity"),
 
     path("finalise_fy", FinaliseFY.as_view(), name="finalise_fy"),
     path("rollback_fy", RollbackFY.as_view(), name="rollback_fy"),
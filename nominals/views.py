@@ -1,37 +1,48 @@
 import collections
+import csv
 from json import loads
 
 from accountancy.contrib.mixins import TransactionPermissionMixin
 from accountancy.forms import BaseVoidTransactionForm
+from accountancy.helpers import Echo
 from accountancy.mixins import SingleObjectAuditDetailViewMixin
-from accountancy.views import (BaseCreateTransaction, BaseEditTransaction,
+from accountancy.views import (BaseCreateTransaction,
+                               BaseCreateTransactionFromPayload,
+                               BaseEditTransaction, BaseImportTransactions,
                                BaseViewTransaction, BaseVoidTransaction,
                                NominalTransList)
 from controls.mixins import QueuePostsMixin
-from controls.models import ModuleSettings, Period
+from controls.models import ModuleSettings, Period, QueuePosts
 from crispy_forms.utils import render_crispy_form
 from django.conf import settings
+from django.core import signing
 from django.contrib.auth.mixins import (LoginRequiredMixin,
                                         PermissionRequiredMixin)
 from django.contrib.postgres.search import TrigramSimilarity
-from django.db.models import Sum
-from django.http import HttpResponse, JsonResponse
+from django.db.models import F
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.context_processors import csrf
 from django.urls import reverse_lazy
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import (CreateView, DetailView, FormView, ListView,
-                                  UpdateView)
+                                  TemplateView, UpdateView)
 from mptt.utils import get_cached_trees
 from users.mixins import LockDuringEditMixin, LockTransactionDuringEditMixin
 from vat.forms import VatForm
 from vat.models import VatTransaction
 
-from nominals.forms import (FinaliseFYForm, NominalTransactionSearchForm,
+from nominals.forms import (FinaliseFYForm, NominalActivityForm,
+                            NominalPivotForm, NominalTransactionSearchForm,
                             RollbackFYForm, TrialBalanceForm)
+from nominals.imports import NominalImport
+from nominals.services import NominalService
 
 from .forms import NominalForm, NominalHeaderForm, NominalLineForm, enter_lines
-from .models import Nominal, NominalHeader, NominalLine, NominalTransaction
+from .helpers import (NominalActivityReport, NominalPivotReport,
+                      roll_up_trial_balance)
+from .models import (Nominal, NominalBalance, NominalHeader, NominalLine,
+                     NominalTransaction, NominalTransactionSummary)
 
 
 class CreateTransaction(
@@ -57,13 +68,22 @@ class CreateTransaction(
     }
     template_name = "nominals/create.html"
     success_url = reverse_lazy("nominals:transaction_enquiry")
-    nominal_model = Nominal
-    nominal_transaction_model = NominalTransaction
-    vat_transaction_model = VatTransaction
+    service_class = NominalService
     module = "NL"
     default_type = "nj"
 
 
+class ImportTransactions(LoginRequiredMixin, BaseImportTransactions):
+    importer_class = NominalImport
+
+
+class CreateBulkTransaction(LoginRequiredMixin, BaseCreateTransactionFromPayload):
+    """
+    For journals with too many lines for the formset e.g. payroll and allocations
+    """
+    service_class = NominalService
+
+
 class EditTransaction(
         LoginRequiredMixin,
         TransactionPermissionMixin,
@@ -87,9 +107,8 @@ class EditTransaction(
     }
     template_name = "nominals/edit.html"
     success_url = reverse_lazy("nominals:transaction_enquiry")
-    nominal_model = Nominal
+    service_class = NominalService
     nominal_transaction_model = NominalTransaction
-    vat_transaction_model = VatTransaction
     module = "NL"
 
 
@@ -128,6 +147,7 @@ class TransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, NominalTra
         "period__fy_and_period": lambda p: (p[4:] + " " + p[:4]) if p else ""
     }
     permission_required = 'nominals.view_transactions_enquiry'
+    export_filename = "nominal_transactions"
 
     def load_page(self):
         context_data = super().load_page()
@@ -151,18 +171,13 @@ class TransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, NominalTra
 
     # this should belong to the parent class
     def get_queryset(self, **kwargs):
-        # from querystring_parser import parser
-        # d = parser.parse(self.request.GET.urlencode())
-        # print(d)
+        # the summary is already at the grain of the enquiry so there is nothing to group
         return (
-            NominalTransaction.objects
-            .select_related('nominal__name')
-            .select_related('period__fy_and_period')
-            .all()
+            NominalTransactionSummary.objects
             .values(
-                *[field[0] for field in self.fields[:-1]]
+                'id',
+                *[field[0] for field in self.fields]
             )
-            .annotate(total=Sum("value"))
             .order_by(*self.order_by())
         )
 
@@ -226,56 +241,31 @@ class TrialBalance(LoginRequiredMixin, PermissionRequiredMixin, ListView):
             else:
                 self.object_list = context["report"] = []  # show empty table
                 return context
-        nominals = Nominal.objects.all().prefetch_related("children")
-        # hits the DB but will cache result
-        root_nominals = get_cached_trees(nominals)
-        # this means we can use get_ancestors() on the nodes now without hitting the DB again
-        nominal_map = {nominal.pk: nominal for nominal in nominals}
-        nominal_totals_for_period_range = (
-            NominalTransaction.objects
-            .values("nominal")
-            .annotate(total=Sum("value"))
-            .filter(period__gte=from_period)
-            .filter(period__lte=to_period)
-        )
-        # get the start of the financial year the to_period is in
-        from_period = first_period
-        nominal_ytd_totals = (
-            NominalTransaction.objects
-            .values("nominal")
-            .annotate(total=Sum("value"))
-            .filter(period__gte=from_period)
-            .filter(period__lte=to_period)
+        rows = NominalBalance.objects.trial_balance(from_period, to_period)
+        # only the nominals with children are needed to roll up the totals
+        ancestors = (
+            Nominal.objects
+            .filter(rght__gt=F("lft") + 1)
+            .values("name", "tree_id", "lft", "rght", "level")
+            .order_by("tree_id", "lft")
         )
-        report = []
+        report, subtotals = roll_up_trial_balance(rows, ancestors)
         debit_total = 0
         credit_total = 0
         ytd_debit_total = 0
         ytd_credit_total = 0
-        for nominal_total in nominal_totals_for_period_range:
-            nominal_pk = nominal_total["nominal"]
-            total = nominal_total["total"]
+        for nominal_report in report:
+            total = nominal_report["total"]
+            ytd = nominal_report["ytd"]
             if total > 0:
                 debit_total += total
             else:
                 credit_total += total
-            parents = [
-                parent.name for parent in nominal_map[nominal_pk].get_ancestors()]
-            for ytd in nominal_ytd_totals:
-                if ytd["nominal"] == nominal_pk:
-                    ytd = ytd["total"]
-                    if ytd > 0:
-                        ytd_debit_total += ytd
-                    else:
-                        ytd_credit_total += ytd
-                    break
-            nominal_report = {
-                "nominal": nominal_map[nominal_pk].name,
-                "total": total,
-                "parents": parents,
-                "ytd": ytd
-            }
-            report.append(nominal_report)
+            if ytd > 0:
+                ytd_debit_total += ytd
+            else:
+                ytd_credit_total += ytd
+        context["subtotals"] = subtotals
         context["debit_total"] = debit_total
         context["credit_total"] = credit_total
         context["ytd_debit_total"] = ytd_debit_total
@@ -284,6 +274,220 @@ class TrialBalance(LoginRequiredMixin, PermissionRequiredMixin, ListView):
         return context
 
 
+class NominalPivot(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
+    """
+    Ad-hoc breakdown of the nominal transactions by the dimensions the user picks.
+    Add export=csv to the GET parameters to download the pivot instead.
+    """
+    template_name = "nominals/pivot.html"
+    permission_required = 'nominals.view_trial_balance_report'
+    export_chunk_size = 2000
+
+    def get_form(self):
+        form_kwargs = {
+            "dimensions": NominalPivotReport.dimensions,
+            "initial": {
+                "row_1": "nominal",
+                "column": "period"
+            }
+        }
+        if self.request.GET:
+            form_kwargs["data"] = self.request.GET
+        return NominalPivotForm(**form_kwargs)
+
+    def get_report(self, form):
+        transactions = NominalTransaction.objects.all()
+        if from_period := form.cleaned_data.get("from_period"):
+            transactions = transactions.filter(
+                period__fy_and_period__gte=from_period.fy_and_period)
+        if to_period := form.cleaned_data.get("to_period"):
+            transactions = transactions.filter(
+                period__fy_and_period__lte=to_period.fy_and_period)
+        return NominalPivotReport(
+            transactions,
+            form.cleaned_data["rows"],
+            form.cleaned_data["columns"]
+        )
+
+    def iter_table(self, report):
+        """
+        The header and then each row of the pivot as its level - how many of the row
+        dimensions are totalled - and its cells
+        """
+        columns, rows = report.pivot(chunk_size=self.export_chunk_size)
+        header = [report.dimensions[dimension][0] for dimension in report.rows]
+        header += [", ".join(str(key) for key in column) for column in columns]
+        header.append("Total")
+        yield header
+        for row in rows:
+            keys = [
+                "Total" if i >= len(report.rows) - row["level"] else key
+                for i, key in enumerate(row["keys"])
+            ]
+            yield row["level"], (
+                keys
+                + [row["cells"].get(column, "") for column in columns]
+                + [row["total"]]
+            )
+
+    def get_table(self, report):
+        """
+        The header and then each row of the pivot as a list of cells
+        """
+        table = self.iter_table(report)
+        yield next(table)
+        for level, cells in table:
+            yield cells
+
+    def export(self, report):
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in self.get_table(report)),
+            content_type="text/csv"
+        )
+        response["Content-Disposition"] = 'attachment; filename="nominal_pivot.csv"'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        form = self.get_form()
+        context = {"form": form}
+        if self.request.GET:
+            if not form.is_valid():
+                return self.render_to_response(context)
+            report = self.get_report(form)
+            if request.GET.get("export") == "csv":
+                return self.export(report)
+            table = self.iter_table(report)
+            context["header"] = next(table)
+            # read now rather than as the template renders.  The cursor for the pivot is
+            # opened within the transaction for the request and is closed once it commits.
+            context["rows"] = [
+                {"level": level, "cells": cells}
+                for level, cells in table
+            ]
+        return self.render_to_response(context)
+
+
+class NominalActivity(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
+    """
+    Opening balance, transactions with the running balance, and closing balance per nominal.
+
+    GET parameters, other than the form fields -
+
+        after - the cursor for the next page, returned with each page
+        length - rows per page
+        export - csv to download the whole report
+    """
+    template_name = "nominals/activity.html"
+    permission_required = 'nominals.view_trial_balance_report'
+    default_length = 100
+    max_length = 1000
+    export_chunk_size = 2000
+    export_columns = [
+        ("Nominal", "nominal_name"),
+        ("Period", "period"),
+        ("Date", "date"),
+        ("Module", "module"),
+        ("Ref", "ref"),
+        ("Type", "type"),
+        ("Value", "value"),
+        ("Balance", "balance"),
+    ]
+
+    def get_form(self):
+        mod_settings = ModuleSettings.objects.select_related(
+            'nominals_period', 'nominals_period__fy').first()
+        current_period = mod_settings.nominals_period
+        form_kwargs = {
+            "initial": {
+                "from_period": current_period.fy.first_period(),
+                "to_period": current_period
+            }
+        }
+        if self.request.GET:
+            form_kwargs["data"] = self.request.GET
+        return NominalActivityForm(**form_kwargs)
+
+    def get_report(self, form):
+        return NominalActivityReport(
+            form.cleaned_data["from_period"],
+            form.cleaned_data["to_period"],
+            form.cleaned_data.get("from_nominal"),
+            form.cleaned_data.get("to_nominal")
+        )
+
+    def get_length(self):
+        try:
+            length = int(self.request.GET.get("length", self.default_length))
+        except ValueError:
+            length = self.default_length
+        return max(1, min(length, self.max_length))
+
+    def get_export_rows(self, report):
+        yield [label for label, _ in self.export_columns]
+        for row in report.iter_rows(chunk_size=self.export_chunk_size):
+            if row["row_type"] == "transaction":
+                yield [row[field] for _, field in self.export_columns]
+            else:
+                label = "Opening Balance" if row["row_type"] == "opening" else "Closing Balance"
+                yield [row["nominal_name"], "", "", "", label, "", "", row["balance"]]
+
+    def export(self, report):
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in self.get_export_rows(report)),
+            content_type="text/csv"
+        )
+        response["Content-Disposition"] = 'attachment; filename="nominal_activity.csv"'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        form = self.get_form()
+        context = {"form": form}
+        if not self.request.GET:
+            return self.render_to_response(context)
+        if not form.is_valid():
+            if request.is_ajax():
+                return JsonResponse(
+                    data={
+                        "success": False,
+                        "errors": form.errors.get_json_data()
+                    },
+                    status=400
+                )
+            return self.render_to_response(context)
+        report = self.get_report(form)
+        if request.GET.get("export") == "csv":
+            return self.export(report)
+        try:
+            rows, after = report.page(
+                self.get_length(), request.GET.get("after"))
+        except signing.BadSignature:
+            return JsonResponse(
+                data={
+                    "success": False,
+                    "errors": {"after": "Invalid cursor"}
+                },
+                status=400
+            )
+        if request.is_ajax():
+            return JsonResponse(
+                data={
+                    "success": True,
+                    "rows": rows,
+                    "after": after
+                }
+            )
+        next_page = None
+        if after:
+            params = self.request.GET.copy()
+            params["after"] = after
+            next_page = params.urlencode()
+        context["rows"] = rows
+        context["next_page"] = next_page
+        return self.render_to_response(context)
+
+
 class LoadNominal(LoginRequiredMixin, ListView):
     paginate_by = 50
     model = Nominal
@@ -294,9 +498,11 @@ class LoadNominal(LoginRequiredMixin, ListView):
     def get_queryset(self):
         if q := self.request.GET.get('q'):
             return (
-                self.get_model().objects.annotate(
-                    similarity=TrigramSimilarity('name', q),
-                ).filter(similarity__gt=0.3).order_by('-similarity')
+                self.get_model().objects
+                # the % operator finds the candidates through the trigram index
+                .filter(name__trigram_similar=q)
+                .annotate(similarity=TrigramSimilarity('name', q))
+                .order_by('-similarity')
             )
         return self.get_model().objects.none()
 
@@ -409,6 +615,13 @@ class NominalEdit(
     prefix = "nominal"
     permission_required = 'nominals.change_nominal'
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        # the nominal transaction enquiry shows the nominal name and is cached
+        # against the ledger version
+        QueuePosts.bump_version('n')
+        return response
+
 
 class FinaliseFY(FormView):
     template_name = "nominals/finalise_fy.html"
@@ -428,6 +641,7 @@ class FinaliseFY(FormView):
             if period < first_period_of_next_fy:
                 setattr(mod_settings, setting, first_period_of_next_fy)
         mod_settings.save()
+        QueuePosts.bump_version('n')
         return super().form_valid(form)
 
 
@@ -440,4 +654,5 @@ class RollbackFY(FormView):
     def form_valid(self, form):
         fy = form.cleaned_data.get("financial_year")
         NominalTransaction.objects.rollback_fy(fy.financial_year + 1)
+        QueuePosts.bump_version('n')
         return super().form_valid(form)
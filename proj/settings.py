@@ -192,6 +192,12 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static'), ]
 
 DEFAULT_VAT_NOMINAL = "Vat"
 DEFAULT_SYSTEM_SUSPENSE = "System Suspense Account"
+DEFAULT_RETAINED_EARNINGS = "Retained Earnings"
+
+# Seconds a process holds on to a system nominal, e.g. the vat nominal, before looking it up
+# again.  Saving a nominal clears them in that process straight away; this bounds how long
+# the other processes post to a nominal which has since been renamed.
+SYSTEM_NOMINALS_CACHE_TIMEOUT = 300
 
 # This dictionary is used for NL and CB and VT tran enquiries
 # so the user can click on a transaction and view it
@@ -204,6 +210,19 @@ ACCOUNTANCY_MODULES = {
     'VL': 'vat'
 }
 
+# Upper bound, in days overdue, of each bucket in the aged creditors and debtors reports
+# by days.  E.g. [30, 60, 90] gives 0 - 30, 31 - 60, 61 - 90 and 90+
+AGED_REPORT_DAY_BUCKETS = [30, 60, 90]
+
+# Threshold of the pg_trgm % operator the searches use to find candidates through the
+# trigram indexes.  The autocompletes use it as is; the enquiry searches then keep only
+# the candidates more similar than 0.5.  An enquiry search summed over more fields than
+# 0.5 / this compares every row instead, see accountancy.views.trigram_search.
+TRIGRAM_SIMILARITY_THRESHOLD = 0.3
+
+# Use the planner's row estimate for the unfiltered total of the transaction enquiries
+ESTIMATE_ENQUIRY_TOTALS = int(os.environ.get('ESTIMATE_ENQUIRY_TOTALS', default=0))
+
 NEW_USERS_ARE_SUPERUSERS = int(os.environ.get('NEW_USERS_ARE_SUPERUSERS', default=0))
 FIRST_USER_IS_SUPERUSER = int(os.environ.get('FIRST_USER_IS_SUPERUSER', default=1))
 
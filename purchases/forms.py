@@ -1,7 +1,8 @@
 from accountancy.fields import (ModelChoiceFieldChooseIterator,
                                 ModelChoiceIteratorWithFields,
                                 RootAndLeavesModelChoiceIterator)
-from accountancy.forms import (BaseAjaxFormMixin, BaseLineFormset,
+from accountancy.forms import (AgedByDaysFormMixin, BaseAjaxFormMixin,
+                               BaseLineFormset,
                                BaseTransactionHeaderForm,
                                BaseTransactionLineForm, BaseTransactionMixin,
                                BaseTransactionModelFormSet,
@@ -255,6 +256,10 @@ class CreditorsForm(BaseAjaxFormMixin, forms.Form):
         )
 
 
+class CreditorsByDaysForm(AgedByDaysFormMixin, CreditorsForm):
+    pass
+
+
 class PurchaseTransactionSearchForm(BaseAjaxFormMixin, SalesAndPurchaseTransactionSearchForm):
     """
     This is not a model form.  The Meta attribute is only for the Ajax
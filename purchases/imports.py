@@ -0,0 +1,19 @@
+from accountancy.imports import TransactionImport
+from cashbook.models import CashBookTransaction
+from nominals.models import Nominal, NominalTransaction
+from vat.models import VatTransaction
+
+from purchases.forms import PurchaseHeaderForm
+from purchases.models import PurchaseHeader, PurchaseLine
+
+
+class PurchaseImport(TransactionImport):
+    header_model = PurchaseHeader
+    line_model = PurchaseLine
+    header_form = PurchaseHeaderForm
+    header_form_kwargs = {"contact_model_name": "supplier"}
+    nominal_model = Nominal
+    nominal_transaction_model = NominalTransaction
+    vat_transaction_model = VatTransaction
+    cash_book_transaction_model = CashBookTransaction
+    control_nominal_name = "Purchase Ledger Control"
@@ -0,0 +1,88 @@
+import time
+
+from controls.models import ModuleSettings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from nominals.models import Nominal
+from vat.models import Vat
+
+from purchases.models import PurchaseLine, Supplier
+from purchases.services import PurchaseService
+
+
+class Command(BaseCommand):
+    help = (
+        "Time editing a purchase invoice with many lines.  A tenth of the lines are deleted, a tenth "
+        "are added and the rest are changed.  Everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, default=10000, help="The lines on the invoice")
+
+    def handle(self, *args, **options):
+        n = options["lines"]
+        supplier = Supplier.objects.first()
+        nominal = Nominal.objects.filter(children__isnull=True, type="pl").first()
+        vat_code = Vat.objects.first()
+        module_settings = ModuleSettings.objects.first()
+        if not (supplier and nominal and vat_code and module_settings):
+            raise CommandError(
+                "A supplier, a profit and loss nominal, a vat code and the module settings are needed e.g. run scripts.setup first")
+        period = module_settings.purchases_period
+        service = PurchaseService()
+        header, lines = service.validate({
+            "type": "pi",
+            "supplier": supplier,
+            "ref": "BENCHMARK",
+            "date": period.month_start,
+            "period": period.fy_and_period,
+            "total": 0,
+            "lines": [
+                {"description": str(i), "goods": 100, "nominal": nominal, "vat_code": vat_code.code, "vat": 20}
+                for i in range(n)
+            ]
+        })
+        with transaction.atomic():
+            start = time.perf_counter()
+            service.create_transaction(header, lines)
+            self.stdout.write(f"Created {n} lines in {time.perf_counter() - start:.2f}s")
+
+            lines = list(PurchaseLine.objects.filter(header=header).order_by("line_no"))
+            deleted_lines = lines[::10]
+            lines_to_update = [line for i, line in enumerate(lines) if i % 10]
+            for line in lines_to_update:
+                line.goods = 200
+                line.vat = 40
+            new_lines = [
+                PurchaseLine(
+                    header=header,
+                    type=header.type,
+                    description=str(n + i),
+                    goods=100,
+                    vat=20,
+                    nominal=nominal,
+                    vat_code=vat_code
+                )
+                for i in range(len(deleted_lines))
+            ]
+            for i, line in enumerate(lines_to_update + new_lines, 1):
+                line.line_no = i
+            header.goods = sum(line.goods for line in lines_to_update + new_lines)
+            header.vat = sum(line.vat for line in lines_to_update + new_lines)
+            header.total = header.due = header.goods + header.vat
+
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                service.edit_transaction(
+                    header,
+                    new_lines=new_lines,
+                    lines_to_update=lines_to_update,
+                    deleted_lines=deleted_lines
+                )
+                elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"Edited {len(lines_to_update)}, added {len(new_lines)} and deleted {len(deleted_lines)} lines "
+                f"in {elapsed:.2f}s with {len(queries)} queries"
+            )
+            transaction.set_rollback(True)
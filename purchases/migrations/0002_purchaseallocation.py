@@ -0,0 +1,47 @@
+# Generated by Django 3.1.14 on 2026-10-17 04:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_allocations(apps, schema_editor):
+    PurchaseMatching = apps.get_model('purchases', 'PurchaseMatching')
+    PurchaseAllocation = apps.get_model('purchases', 'PurchaseAllocation')
+    allocations = {}
+    matches = PurchaseMatching.objects.filter(period__isnull=False)
+    for match in matches.values('matched_to', 'period').annotate(total=models.Sum('value')):
+        key = (match["matched_to"], match["period"])
+        allocations[key] = allocations.get(key, 0) + match["total"]
+    for match in matches.values('matched_by', 'period').annotate(total=models.Sum('value')):
+        key = (match["matched_by"], match["period"])
+        allocations[key] = allocations.get(key, 0) - match["total"]
+    PurchaseAllocation.objects.bulk_create([
+        PurchaseAllocation(header_id=header, period_id=period, value=value)
+        for (header, period), value in allocations.items()
+        if value != 0
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controls', '0001_initial'),
+        ('purchases', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseAllocation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('header', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='purchases.purchaseheader')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='controls.period')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='purchaseallocation',
+            constraint=models.UniqueConstraint(fields=('header', 'period'), name='purchases_allocation_unique'),
+        ),
+        migrations.RunPython(build_allocations, migrations.RunPython.noop),
+    ]
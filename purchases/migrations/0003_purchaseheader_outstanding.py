@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0002_purchaseallocation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchaseheader',
+            index=models.Index(condition=models.Q(_negated=True, due=0), fields=['due_date'], name='purchaseheader_outstanding_idx'),
+        ),
+    ]
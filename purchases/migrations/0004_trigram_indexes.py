@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-17 10:12
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0003_purchaseheader_outstanding'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchaseheader',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ref'], name='purchaseheader_ref_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
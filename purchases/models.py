@@ -4,10 +4,12 @@ from accountancy.mixins import (CashBookEntryMixin,
                                 ControlAccountInvoiceTransactionMixin,
                                 ControlAccountPaymentTransactionMixin,
                                 VatTransactionMixin)
-from accountancy.models import (MatchedHeaders, Transaction, TransactionHeader,
+from accountancy.models import (MatchedHeaders, MatchedHeadersAllocation,
+                                Transaction, TransactionHeader,
                                 TransactionLine)
 from contacts.models import Contact
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.db.models import Q
 from django.shortcuts import reverse
@@ -139,6 +141,9 @@ class PurchaseHeader(ModuleTransactions, TransactionHeader):
     matched_to = models.ManyToManyField(
         'self', through='PurchaseMatching', symmetrical=False)
 
+    module = "PL"
+    contact_field = "supplier"
+
     class Meta:
         permissions = [
             # enquiry perms
@@ -185,6 +190,17 @@ class PurchaseHeader(ModuleTransactions, TransactionHeader):
             ("void_payment_transaction", "Can void payment"),
             ("void_refund_transaction", "Can void refund"),
         ]
+        indexes = [
+            # the awaiting payment and overdue tabs of the enquiry
+            models.Index(
+                fields=["due_date"],
+                condition=~Q(due=0),
+                name="purchaseheader_outstanding_idx"
+            ),
+            # the reference search of the enquiry
+            GinIndex(fields=["ref"], opclasses=["gin_trgm_ops"],
+                     name="purchaseheader_ref_trgm_idx")
+        ]
 
     @property
     def cashbook_transaction_factor(self):
@@ -250,6 +266,20 @@ class PurchaseLine(ModuleTransactions, TransactionLine):
         ]
 
 
+class PurchaseAllocation(MatchedHeadersAllocation):
+    header = models.ForeignKey(
+        PurchaseHeader,
+        on_delete=models.CASCADE,
+        related_name="allocations"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['header', 'period'], name="purchases_allocation_unique")
+        ]
+
+
 class PurchaseMatching(MatchedHeaders):
     # matched_by is the header record through which
     # all the other transactions were matched
@@ -279,6 +309,8 @@ class PurchaseMatching(MatchedHeaders):
     # t1.matched_to_these.all()
     # t2.matched_by_these.all()
 
+    allocation_model = PurchaseAllocation
+
     @classmethod
     def get_not_fully_matched_at_period(cls, headers, period):
         return super(PurchaseMatching, cls).get_not_fully_matched_at_period(headers, period)
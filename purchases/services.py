@@ -0,0 +1,19 @@
+from accountancy.services import TransactionService
+from cashbook.models import CashBookTransaction
+from nominals.models import Nominal, NominalTransaction
+from vat.models import VatTransaction
+
+from purchases.imports import PurchaseImport
+from purchases.models import PurchaseHeader, PurchaseLine, PurchaseMatching
+
+
+class PurchaseService(TransactionService):
+    header_model = PurchaseHeader
+    line_model = PurchaseLine
+    match_model = PurchaseMatching
+    nominal_model = Nominal
+    nominal_transaction_model = NominalTransaction
+    vat_transaction_model = VatTransaction
+    cash_book_transaction_model = CashBookTransaction
+    control_nominal_name = "Purchase Ledger Control"
+    importer_class = PurchaseImport
@@ -1,9 +1,11 @@
+import csv
 import json
 from datetime import date
 
 from accountancy.testing.helpers import dict_to_url
-from controls.models import FinancialYear, Period
+from controls.models import FinancialYear, ModuleSettings, Period, QueuePosts
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.shortcuts import reverse
 from django.test import TestCase
 from purchases.models import PurchaseHeader, PurchaseMatching, Supplier
@@ -31,6 +33,11 @@ class AgedCreditorReportWithTransactionsTests(TestCase):
         cls.period_5 = Period.objects.create(
             fy=fy, period="05", fy_and_period="202005", month_start=date(2020, 5, 31))      
 
+    def setUp(self):
+        # the report is cached against the ledger version which is only bumped by posting
+        # through the views.  The tests create the transactions directly.
+        cache.clear()
+
     def test_void_is_excluded(self):
         self.client.force_login(self.user)
         voided_payment = PurchaseHeader.objects.create(
@@ -1354,6 +1361,11 @@ class AgedCreditorReportWithOutTransactionsTests(TestCase):
         cls.period_5 = Period.objects.create(
             fy=fy, period="05", fy_and_period="202005", month_start=date(2020, 5, 31))      
 
+    def setUp(self):
+        # the report is cached against the ledger version which is only bumped by posting
+        # through the views.  The tests create the transactions directly.
+        cache.clear()
+
     def test_void_is_excluded(self):
         self.client.force_login(self.user)
         voided_payment = PurchaseHeader.objects.create(
@@ -2576,4 +2588,416 @@ class AgedCreditorReportWithOutTransactionsTests(TestCase):
         self.assertEqual(
             DT_RowData["href"],
             None
-        )
\ No newline at end of file
+        )
+
+class AgedCreditorReportExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(code='1', name='1')
+        cls.other_supplier = Supplier.objects.create(code='2', name='2')
+        cls.url = reverse("purchases:creditors_report")
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        cls.fy = fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.period_2 = Period.objects.create(
+            fy=fy, period="02", fy_and_period="202002", month_start=date(2020, 2, 29))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        PurchaseHeader.objects.create(
+            type="pi",
+            supplier=self.supplier,
+            ref="1",
+            period=self.period_1,
+            date=date(2020, 1, 1),
+            due_date=date(2020, 2, 1),
+            due=100,
+            total=100,
+            paid=0
+        )
+        PurchaseHeader.objects.create(
+            type="pi",
+            supplier=self.supplier,
+            ref="2",
+            period=self.period_2,
+            date=date(2020, 2, 1),
+            due_date=date(2020, 3, 1),
+            due=50,
+            total=50,
+            paid=0
+        )
+        PurchaseHeader.objects.create(
+            type="pp",
+            supplier=self.other_supplier,
+            ref="3",
+            period=self.period_2,
+            date=date(2020, 2, 1),
+            due=-20,
+            total=-20,
+            paid=0
+        )
+
+    def export(self, **kwargs):
+        d = {
+            'from_supplier': '',
+            'to_supplier': '',
+            'period': f'{self.period_2.pk}',
+            'use_adv_search': 'yes',
+            'export': 'csv'
+        }
+        d.update(kwargs)
+        response = self.client.get(self.url + "?" + dict_to_url(d))
+        self.assertEqual(
+            response.status_code,
+            200
+        )
+        self.assertEqual(
+            response["Content-Type"],
+            "text/csv"
+        )
+        content = b"".join(response.streaming_content).decode("utf")
+        return response, list(csv.reader(content.splitlines()))
+
+    def test_export_with_transactions(self):
+        response, rows = self.export(show_transactions='yes')
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="aged_creditors_202002.csv"'
+        )
+        self.assertEqual(
+            rows,
+            [
+                ['Supplier', 'Date', 'Due Date', 'Ref', 'Total', 'Unallocated',
+                    'Current', '1 Month', '2 Month', '3 Month', '4 Month & Older'],
+                ['1', date(2020, 1, 1).strftime(DATE_OUTPUT_FORMAT), date(2020, 2, 1).strftime(DATE_OUTPUT_FORMAT),
+                    '1', '100.00', '0', '0', '100.00', '0', '0', '0'],
+                ['1', date(2020, 2, 1).strftime(DATE_OUTPUT_FORMAT), date(2020, 3, 1).strftime(DATE_OUTPUT_FORMAT),
+                    '2', '50.00', '0', '50.00', '0', '0', '0', '0'],
+                ['2', date(2020, 2, 1).strftime(DATE_OUTPUT_FORMAT), '',
+                    '3', '-20.00', '-20.00', '0', '0', '0', '0', '0'],
+            ]
+        )
+
+    def test_export_without_transactions(self):
+        response, rows = self.export()
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="aged_creditors_202002_summary.csv"'
+        )
+        self.assertEqual(
+            rows,
+            [
+                ['Supplier', 'Total', 'Unallocated', 'Current',
+                    '1 Month', '2 Month', '3 Month', '4 Month & Older'],
+                ['1', '150.00', '0', '50.00', '100.00', '0', '0', '0'],
+                ['2', '-20.00', '-20.00', '0', '0', '0', '0', '0'],
+            ]
+        )
+
+    def test_export_with_contact_range(self):
+        response, rows = self.export(
+            show_transactions='yes',
+            from_supplier=self.other_supplier.pk,
+            to_supplier=self.other_supplier.pk
+        )
+        self.assertEqual(
+            len(rows),
+            2
+        )
+        self.assertEqual(
+            rows[1][0],
+            '2'
+        )
+
+    def test_export_with_invalid_form(self):
+        d = {
+            'from_supplier': '',
+            'to_supplier': '',
+            'period': '',
+            'use_adv_search': 'yes',
+            'export': 'csv'
+        }
+        response = self.client.get(self.url + "?" + dict_to_url(d))
+        self.assertEqual(
+            response.status_code,
+            400
+        )
+
+
+class AgedCreditorReportCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(code='1', name='1')
+        cls.url = reverse("purchases:creditors_report")
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        cls.fy = fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.create_invoice("1")
+
+    def create_invoice(self, ref):
+        return PurchaseHeader.objects.create(
+            type="pi",
+            supplier=self.supplier,
+            ref=ref,
+            period=self.period_1,
+            date=date(2020, 1, 1),
+            due=100,
+            total=100,
+            paid=0
+        )
+
+    def get_report(self, start=0, length=25):
+        d = {
+            'draw': '1',
+            'columns': {
+                0: {'data': 'supplier', 'name': '', 'searchable': 'true', 'orderable': 'true', 'search': {'value': '', 'regex': 'false'}},
+                1: {'data': 'ref', 'name': '', 'searchable': 'true', 'orderable': 'true', 'search': {'value': '', 'regex': 'false'}},
+            },
+            'order': {0: {'column': '1', 'dir': 'desc'}},
+            'start': f'{start}',
+            'length': f'{length}',
+            'search': {'value': '', 'regex': 'false'},
+            'from_supplier': '',
+            'to_supplier': '',
+            'period': f'{self.period_1.pk}',
+            'show_transactions': 'yes',
+            'use_adv_search': 'yes'
+        }
+        response = self.client.get(
+            self.url + "?" + dict_to_url(d),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        return json.loads(response.content.decode("utf"))
+
+    def test_report_is_cached(self):
+        data = self.get_report()
+        self.assertEqual(
+            data["recordsTotal"],
+            1
+        )
+        # not posted through the views so the ledger version does not change
+        self.create_invoice("2")
+        data = self.get_report()
+        self.assertEqual(
+            data["recordsTotal"],
+            1
+        )
+
+    def test_cache_is_invalidated_when_ledger_is_posted_to(self):
+        self.get_report()
+        self.create_invoice("2")
+        QueuePosts.bump_version('p')
+        data = self.get_report()
+        self.assertEqual(
+            data["recordsTotal"],
+            2
+        )
+
+    def test_scroll_slices_the_cached_report(self):
+        self.create_invoice("2")
+        self.create_invoice("3")
+        data = self.get_report(start=1, length=1)
+        self.assertEqual(
+            data["recordsTotal"],
+            3
+        )
+        self.assertEqual(
+            data["recordsFiltered"],
+            3
+        )
+        self.assertEqual(
+            [row["ref"] for row in data["data"]],
+            ["2"]
+        )
+        data = self.get_report(start=2, length=1)
+        self.assertEqual(
+            [row["ref"] for row in data["data"]],
+            ["1"]
+        )
+
+
+class AgedCreditorByDaysReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(code='1', name='1')
+        cls.url = reverse("purchases:creditors_report_by_days")
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        cls.fy = fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        PurchaseHeader.objects.create(
+            type="pi",
+            supplier=self.supplier,
+            ref="1",
+            period=self.period_1,
+            date=date(2020, 1, 1),
+            due_date=date(2020, 1, 15),
+            due=100,
+            total=100,
+            paid=0
+        )
+
+    def get_data(self, **kwargs):
+        d = {
+            'draw': '1',
+            'columns': {
+                0: {'data': 'supplier', 'name': '', 'searchable': 'true', 'orderable': 'true', 'search': {'value': '', 'regex': 'false'}},
+            },
+            'order': {0: {'column': '0', 'dir': 'asc'}},
+            'start': '0',
+            'length': '25',
+            'search': {'value': '', 'regex': 'false'},
+            'from_supplier': '',
+            'to_supplier': '',
+            'period': f'{self.period_1.pk}',
+            'as_at': '2020-03-01',
+            'show_transactions': 'yes',
+            'use_adv_search': 'yes'
+        }
+        d.update(kwargs)
+        return d
+
+    def test_report(self):
+        response = self.client.get(
+            self.url + "?" + dict_to_url(self.get_data()),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        data = json.loads(response.content.decode("utf"))
+        self.assertEqual(
+            data["recordsTotal"],
+            1
+        )
+        tran = data["data"][0]
+        self.assertEqual(
+            tran["unallocated"],
+            0
+        )
+        self.assertEqual(
+            tran["0 - 30"],
+            0
+        )
+        self.assertEqual(
+            tran["31 - 60"],
+            "100.00"
+        )
+        self.assertEqual(
+            tran["61 - 90"],
+            0
+        )
+        self.assertEqual(
+            tran["90+"],
+            0
+        )
+
+    def test_as_at_is_required(self):
+        response = self.client.get(
+            self.url + "?" + dict_to_url(self.get_data(as_at='')),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        data = json.loads(response.content.decode("utf"))
+        self.assertEqual(
+            len(data["data"]),
+            0
+        )
+
+    def test_export(self):
+        d = self.get_data(export='csv')
+        response = self.client.get(self.url + "?" + dict_to_url(d))
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="aged_creditors_by_days_202001.csv"'
+        )
+        content = b"".join(response.streaming_content).decode("utf")
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(
+            rows[0],
+            ['Supplier', 'Date', 'Due Date', 'Ref', 'Total',
+                'Unallocated', '0 - 30', '31 - 60', '61 - 90', '90+']
+        )
+        self.assertEqual(
+            rows[1][4:],
+            ['100.00', '0', '0', '100.00', '0', '0']
+        )
+
+
+class AgedCreditorTrendTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(code='1', name='1')
+        cls.url = reverse("purchases:creditors_trend")
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        cls.fy = fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.period_2 = Period.objects.create(
+            fy=fy, period="02", fy_and_period="202002", month_start=date(2020, 2, 29))
+        ModuleSettings.objects.create(
+            cash_book_period=cls.period_2,
+            nominals_period=cls.period_2,
+            purchases_period=cls.period_2,
+            sales_period=cls.period_2
+        )
+        PurchaseHeader.objects.create(
+            type="pi",
+            supplier=cls.supplier,
+            ref="1",
+            period=cls.period_1,
+            date=date(2020, 1, 1),
+            due=100,
+            total=100,
+            paid=0
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_trend_defaults_to_current_period(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response.status_code,
+            200
+        )
+        trend = json.loads(response.content.decode("utf"))["trend"]
+        self.assertEqual(
+            [t["period"] for t in trend],
+            ["01 2020", "02 2020"]
+        )
+        self.assertEqual(
+            trend[0]["current"],
+            "100.00"
+        )
+        self.assertEqual(
+            trend[1]["1 month"],
+            "100.00"
+        )
+
+    def test_trend_for_period(self):
+        response = self.client.get(
+            self.url + f"?period={self.period_1.pk}&periods=1")
+        trend = json.loads(response.content.decode("utf"))["trend"]
+        self.assertEqual(
+            len(trend),
+            1
+        )
+        self.assertEqual(
+            trend[0]["total"],
+            "100.00"
+        )
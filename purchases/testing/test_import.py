@@ -0,0 +1,185 @@
+import io
+import json
+import tempfile
+from datetime import date
+
+from accountancy.imports import read_transactions
+from controls.models import FinancialYear, ModuleSettings, Period
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.shortcuts import reverse
+from django.test import TestCase
+from nominals.models import Nominal, NominalTransaction
+from purchases.imports import PurchaseImport
+from purchases.models import PurchaseHeader, PurchaseLine, Supplier
+from vat.models import Vat, VatTransaction
+
+
+class ImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        cls.supplier = Supplier.objects.create(code="ACME", name="acme")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        ModuleSettings.objects.create(
+            cash_book_period=cls.period,
+            nominals_period=cls.period,
+            purchases_period=cls.period,
+            sales_period=cls.period
+        )
+        expenses = Nominal.objects.create(name="Expenses")
+        cls.nominal = Nominal.objects.create(parent=expenses, name="Stock")
+        liabilities = Nominal.objects.create(name="Liabilities")
+        current_liabilities = Nominal.objects.create(
+            parent=liabilities, name="Current Liabilities")
+        cls.purchase_control = Nominal.objects.create(
+            parent=current_liabilities, name="Purchase Ledger Control")
+        cls.vat_nominal = Nominal.objects.create(
+            parent=current_liabilities, name="Vat")
+        cls.vat_code = Vat.objects.create(
+            code="1", name="standard rate", rate=20)
+
+    def invoice(self, **kwargs):
+        record = {
+            "type": "pi",
+            "supplier": "ACME",
+            "ref": "INV1",
+            "date": "2020-01-15",
+            "total": 240,
+            "lines": [
+                {"description": "widgets", "goods": 100,
+                    "nominal": "Stock", "vat_code": "1", "vat": 20},
+                {"description": "gadgets", "goods": 100,
+                    "nominal": "Stock", "vat_code": "1", "vat": 20},
+            ]
+        }
+        record.update(kwargs)
+        return json.dumps(record)
+
+    def test_jsonl(self):
+        f = io.StringIO(
+            self.invoice() + "\n" + self.invoice(supplier="UNKNOWN", ref="INV2") + "\n")
+        report = PurchaseImport(user=self.user).run(read_transactions(f, "jsonl"))
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(len(report["errors"]), 1)
+        self.assertEqual(report["errors"][0]["row"], 2)
+        self.assertIn("supplier", report["errors"][0]["errors"])
+
+        header = PurchaseHeader.objects.get()
+        self.assertEqual(header.ref, "INV1")
+        self.assertEqual(header.period, self.period)
+        self.assertEqual(header.goods, 200)
+        self.assertEqual(header.vat, 40)
+        self.assertEqual(header.total, 240)
+        self.assertEqual(header.due, 240)
+
+        lines = PurchaseLine.objects.all()
+        self.assertEqual(len(lines), 2)
+        nom_trans = NominalTransaction.objects.all()
+        # goods, vat and control per line
+        self.assertEqual(len(nom_trans), 6)
+        self.assertEqual(sum(tran.value for tran in nom_trans), 0)
+        self.assertEqual(VatTransaction.objects.count(), 2)
+        for line in lines:
+            self.assertEqual(
+                line.goods_nominal_transaction.nominal, self.nominal)
+            self.assertEqual(
+                line.vat_nominal_transaction.nominal, self.vat_nominal)
+            self.assertEqual(
+                line.total_nominal_transaction.nominal, self.purchase_control)
+            self.assertEqual(line.vat_transaction.line, line.pk)
+
+    def test_line_total_must_agree(self):
+        f = io.StringIO(self.invoice(total=100) + "\n")
+        report = PurchaseImport(user=self.user).run(read_transactions(f, "jsonl"))
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(
+            report["errors"][0]["errors"]["__all__"],
+            ["The total of the lines does not equal the total you entered."]
+        )
+        self.assertEqual(PurchaseHeader.objects.count(), 0)
+
+    def test_amounts_must_fit_the_fields(self):
+        f = io.StringIO(
+            self.invoice(total=12345678901) + "\n"
+            + self.invoice(ref="INV2", total=240.005, lines=[
+                {"description": "widgets", "goods": 200.005,
+                    "nominal": "Stock", "vat_code": "1", "vat": 40},
+            ]) + "\n"
+            + self.invoice(ref="INV3") + "\n"
+        )
+        report = PurchaseImport(user=self.user).run(read_transactions(f, "jsonl"))
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(
+            report["errors"][0]["errors"]["total"],
+            ["Ensure that there are no more than 10 digits in total."]
+        )
+        self.assertEqual(
+            report["errors"][1]["errors"]["line-0-goods"],
+            ["Ensure that there are no more than 2 decimal places."]
+        )
+        self.assertEqual(PurchaseHeader.objects.get().ref, "INV3")
+
+    def test_values_must_be_single_values(self):
+        f = io.StringIO(
+            self.invoice(supplier={}) + "\n"
+            + self.invoice(ref="INV2", lines=[
+                {"description": "widgets", "goods": 100,
+                    "nominal": ["Stock"], "vat_code": "1", "vat": 20},
+            ]) + "\n"
+            + self.invoice(ref="INV3", lines=5) + "\n"
+            + self.invoice(ref="INV4") + "\n"
+        )
+        report = PurchaseImport(user=self.user).run(read_transactions(f, "jsonl"))
+        self.assertEqual(report["created"], 1)
+        errors = [error["errors"] for error in report["errors"]]
+        self.assertEqual(errors[0], {"supplier": ["Enter a single value."]})
+        self.assertEqual(errors[1], {"line-0-nominal": ["Enter a single value."]})
+        self.assertEqual(errors[2], {"lines": ["Enter a list of lines."]})
+        self.assertEqual(PurchaseHeader.objects.get().ref, "INV4")
+
+    def test_csv(self):
+        f = io.StringIO(
+            "type,supplier,ref,date,total,description,goods,nominal,vat_code,vat\n"
+            "pi,ACME,INV1,2020-01-15,240,widgets,100,Stock,1,20\n"
+            "pi,ACME,INV1,2020-01-15,240,gadgets,100,Stock,1,20\n"
+            "pc,ACME,CN1,2020-01-15,120,widgets,100,Stock,1,20\n"
+        )
+        report = PurchaseImport(user=self.user).run(read_transactions(f, "csv"))
+        self.assertEqual(report["created"], 2)
+        invoice = PurchaseHeader.objects.get(ref="INV1")
+        self.assertEqual(invoice.total, 240)
+        self.assertEqual(invoice.purchaseline_set.count(), 2)
+        credit_note = PurchaseHeader.objects.get(ref="CN1")
+        self.assertEqual(credit_note.total, -120)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        f = io.BytesIO((self.invoice() + "\n").encode("utf-8"))
+        f.name = "invoices.jsonl"
+        response = self.client.post(reverse("purchases:import"), {"file": f})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["created"], 1)
+        self.assertEqual(PurchaseHeader.objects.count(), 1)
+
+    def test_view_not_utf8(self):
+        self.client.force_login(self.user)
+        f = io.BytesIO((self.invoice() + "\n").encode("utf-16"))
+        f.name = "invoices.jsonl"
+        response = self.client.post(reverse("purchases:import"), {"file": f})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"], "The file could not be read as jsonl")
+        self.assertEqual(PurchaseHeader.objects.count(), 0)
+
+    def test_command_not_utf8(self):
+        with tempfile.NamedTemporaryFile(suffix=".jsonl") as f:
+            f.write((self.invoice() + "\n").encode("utf-16"))
+            f.flush()
+            with self.assertRaisesMessage(CommandError, "The file could not be read as jsonl"):
+                call_command("import_transactions", "PL", f.name, stderr=io.StringIO())
+        self.assertEqual(PurchaseHeader.objects.count(), 0)
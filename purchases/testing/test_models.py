@@ -7,7 +7,8 @@ from nominals.models import Nominal
 from vat.models import Vat
 
 from ..helpers import create_invoices, create_lines
-from ..models import PurchaseHeader, PurchaseLine, Supplier
+from ..models import (PurchaseAllocation, PurchaseHeader, PurchaseLine,
+                      PurchaseMatching, Supplier)
 
 DATE_INPUT_FORMAT = '%d-%m-%Y'
 MODEL_DATE_INPUT_FORMAT = '%Y-%m-%d'
@@ -56,4 +57,147 @@ class PurchaseLineModelTest(TestCase):
                 line.line_no,
                 index + 1
             )
-        
\ No newline at end of file
+        
+
+
+class PurchaseAllocationModelTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(name="test_supplier")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period_1 = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        cls.period_2 = Period.objects.create(
+            fy=fy, period="02", fy_and_period="202002", month_start=date(2020, 2, 29))
+
+    def setUp(self):
+        self.invoice = PurchaseHeader.objects.create(
+            type="pi",
+            supplier=self.supplier,
+            ref="1",
+            period=self.period_1,
+            date=date(2020, 1, 1),
+            total=100,
+            paid=100,
+            due=0
+        )
+        self.payment = PurchaseHeader.objects.create(
+            type="pp",
+            supplier=self.supplier,
+            ref="2",
+            period=self.period_2,
+            date=date(2020, 2, 1),
+            total=-100,
+            paid=-100,
+            due=0
+        )
+
+    def test_match_save_creates_allocations(self):
+        PurchaseMatching.objects.create(
+            matched_by=self.payment,
+            matched_to=self.invoice,
+            value=100,
+            period=self.period_2
+        )
+        allocations = PurchaseAllocation.objects.all().order_by("header")
+        self.assertEqual(
+            len(allocations),
+            2
+        )
+        invoice_allocation, payment_allocation = allocations
+        self.assertEqual(
+            invoice_allocation.header,
+            self.invoice
+        )
+        self.assertEqual(
+            invoice_allocation.period,
+            self.period_2
+        )
+        self.assertEqual(
+            invoice_allocation.value,
+            100
+        )
+        self.assertEqual(
+            payment_allocation.header,
+            self.payment
+        )
+        self.assertEqual(
+            payment_allocation.value,
+            -100
+        )
+
+    def test_match_delete_removes_allocations(self):
+        match = PurchaseMatching.objects.create(
+            matched_by=self.payment,
+            matched_to=self.invoice,
+            value=100,
+            period=self.period_2
+        )
+        match.delete()
+        self.assertEqual(
+            len(PurchaseAllocation.objects.all()),
+            0
+        )
+
+    def test_update_allocations_after_bulk_update(self):
+        match = PurchaseMatching.objects.create(
+            matched_by=self.payment,
+            matched_to=self.invoice,
+            value=100,
+            period=self.period_2
+        )
+        match.value = 50
+        PurchaseMatching.objects.bulk_update([match], ['value'])
+        PurchaseMatching.update_allocations([match])
+        self.assertEqual(
+            PurchaseAllocation.objects.get(header=self.invoice).value,
+            50
+        )
+        self.assertEqual(
+            PurchaseAllocation.objects.get(header=self.payment).value,
+            -50
+        )
+
+    def test_get_not_fully_matched_at_period(self):
+        PurchaseMatching.objects.create(
+            matched_by=self.payment,
+            matched_to=self.invoice,
+            value=100,
+            period=self.period_2
+        )
+        headers = PurchaseMatching.get_not_fully_matched_at_period(
+            list(PurchaseHeader.objects.filter(period=self.period_1)),
+            self.period_1
+        )
+        self.assertEqual(
+            len(headers),
+            1
+        )
+        self.assertEqual(
+            headers[0].due,
+            100
+        )
+        self.assertEqual(
+            PurchaseMatching.get_not_fully_matched_at_period(
+                list(PurchaseHeader.objects.all()), self.period_2),
+            []
+        )
+
+    def test_rebuild(self):
+        PurchaseMatching.objects.create(
+            matched_by=self.payment,
+            matched_to=self.invoice,
+            value=100,
+            period=self.period_2
+        )
+        PurchaseAllocation.objects.all().delete()
+        PurchaseAllocation.rebuild(PurchaseMatching)
+        self.assertEqual(
+            PurchaseAllocation.objects.get(header=self.invoice).value,
+            100
+        )
+        self.assertEqual(
+            PurchaseAllocation.objects.get(header=self.payment).value,
+            -100
+        )
@@ -0,0 +1,174 @@
+from datetime import date
+
+from cashbook.models import CashBook, CashBookTransaction
+from controls.models import FinancialYear, ModuleSettings, Period
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from nominals.models import Nominal, NominalTransaction
+from purchases.models import PurchaseHeader, PurchaseLine, Supplier
+from purchases.services import PurchaseService
+from vat.models import Vat, VatTransaction
+
+
+class PurchaseServiceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(
+            username="dummy", password="dummy")
+        cls.supplier = Supplier.objects.create(code="ACME", name="acme")
+        fy = FinancialYear.objects.create(financial_year=2020)
+        cls.period = Period.objects.create(
+            fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
+        ModuleSettings.objects.create(
+            cash_book_period=cls.period,
+            nominals_period=cls.period,
+            purchases_period=cls.period,
+            sales_period=cls.period
+        )
+        assets = Nominal.objects.create(name="Assets")
+        current_assets = Nominal.objects.create(
+            parent=assets, name="Current Assets")
+        cls.bank_nominal = Nominal.objects.create(
+            parent=current_assets, name="Bank Account")
+        expenses = Nominal.objects.create(name="Expenses")
+        cls.nominal = Nominal.objects.create(parent=expenses, name="Stock")
+        liabilities = Nominal.objects.create(name="Liabilities")
+        current_liabilities = Nominal.objects.create(
+            parent=liabilities, name="Current Liabilities")
+        cls.purchase_control = Nominal.objects.create(
+            parent=current_liabilities, name="Purchase Ledger Control")
+        cls.vat_nominal = Nominal.objects.create(
+            parent=current_liabilities, name="Vat")
+        cls.vat_code = Vat.objects.create(
+            code="1", name="standard rate", rate=20)
+        cls.cash_book = CashBook.objects.create(
+            name="Cash Book", nominal=cls.bank_nominal)
+
+    def test_create_invoice(self):
+        header = PurchaseService(user=self.user).create({
+            "type": "pi",
+            "supplier": self.supplier,
+            "ref": "INV1",
+            "date": date(2020, 1, 15),
+            "total": 120,
+            "lines": [
+                {"description": "widgets", "goods": 100,
+                    "nominal": self.nominal, "vat_code": "1", "vat": 20},
+            ]
+        })
+        self.assertEqual(header, PurchaseHeader.objects.get())
+        self.assertEqual(header.total, 120)
+        self.assertEqual(header.due, 120)
+        line = PurchaseLine.objects.get()
+        self.assertEqual(line.line_no, 1)
+        self.assertEqual(line.header, header)
+        nom_trans = NominalTransaction.objects.all()
+        self.assertEqual(len(nom_trans), 3)
+        self.assertEqual(
+            {tran.field: (tran.nominal, tran.value) for tran in nom_trans},
+            {
+                "g": (self.nominal, 100),
+                "v": (self.vat_nominal, 20),
+                "t": (self.purchase_control, -120)
+            }
+        )
+        self.assertEqual(line.goods_nominal_transaction.field, "g")
+        self.assertEqual(line.vat_transaction, VatTransaction.objects.get())
+        self.assertEqual(header.history.get().history_user, self.user)
+        # the line is inserted once, already linked to its transactions
+        self.assertEqual(line.history.get().history_user, self.user)
+
+    def test_create_payment(self):
+        header = PurchaseService(user=self.user).create({
+            "type": "pp",
+            "supplier": "ACME",
+            "cash_book": "Cash Book",
+            "ref": "PAY1",
+            "date": "2020-01-15",
+            "total": 50,
+        })
+        self.assertEqual(header.total, -50)
+        nom_trans = NominalTransaction.objects.order_by("line")
+        self.assertEqual(len(nom_trans), 2)
+        self.assertEqual(nom_trans[0].nominal, self.bank_nominal)
+        self.assertEqual(nom_trans[1].nominal, self.purchase_control)
+        cash_book_tran = CashBookTransaction.objects.get()
+        self.assertEqual(cash_book_tran.value, -50)
+
+    def test_create_invalid(self):
+        with self.assertRaises(ValidationError) as cm:
+            PurchaseService(user=self.user).create({
+                "type": "pi",
+                "supplier": "UNKNOWN",
+                "ref": "INV1",
+                "date": "2020-01-15",
+                "total": 100,
+                "lines": [
+                    {"description": "widgets", "goods": 100, "nominal": "Stock"},
+                ]
+            })
+        self.assertIn("supplier", cm.exception.message_dict)
+        self.assertEqual(PurchaseHeader.objects.count(), 0)
+
+    def test_edit_invoice(self):
+        service = PurchaseService(user=self.user)
+        header = service.create({
+            "type": "pi",
+            "supplier": self.supplier,
+            "ref": "INV1",
+            "date": date(2020, 1, 15),
+            "total": 360,
+            "lines": [
+                {"description": "widgets", "goods": 100,
+                    "nominal": self.nominal, "vat_code": "1", "vat": 20},
+                {"description": "gadgets", "goods": 100,
+                    "nominal": self.nominal, "vat_code": "1", "vat": 20},
+                {"description": "gizmos", "goods": 100,
+                    "nominal": self.nominal, "vat_code": "1", "vat": 20},
+            ]
+        })
+        lines = list(PurchaseLine.objects.order_by("line_no"))
+        deleted_line = lines[2]
+        # not in the order of the lines
+        lines_to_update = [lines[1], lines[0]]
+        lines[0].goods = 200
+        lines[0].vat = 40
+        lines[1].goods = 300
+        lines[1].vat = 0
+        lines[1].vat_code = None
+        new_line = PurchaseLine(
+            header=header,
+            type=header.type,
+            line_no=3,
+            description="doodads",
+            goods=50,
+            vat=10,
+            nominal=self.nominal,
+            vat_code=self.vat_code
+        )
+        header.goods = 550
+        header.vat = 50
+        header.total = header.due = 600
+        service.edit_transaction(
+            header,
+            new_lines=[new_line],
+            lines_to_update=lines_to_update,
+            deleted_lines=[deleted_line]
+        )
+        self.assertEqual(PurchaseLine.objects.count(), 3)
+        for line in PurchaseLine.objects.all():
+            nom_trans = {
+                tran.field: tran.value
+                for tran in NominalTransaction.objects.filter(line=line.pk)
+            }
+            self.assertEqual(nom_trans["g"], line.goods)
+            self.assertEqual(nom_trans.get("v", 0), line.vat)
+            self.assertEqual(nom_trans["t"], -1 * (line.goods + line.vat))
+        self.assertFalse(
+            NominalTransaction.objects.filter(line=deleted_line.pk).exists())
+        self.assertEqual(
+            sorted(VatTransaction.objects.values_list("line", flat=True)),
+            sorted([lines[0].pk, new_line.pk])
+        )
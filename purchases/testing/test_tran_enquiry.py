@@ -1,9 +1,11 @@
+import csv
 import json
-from datetime import date
+from datetime import date, timedelta
 
 from accountancy.testing.helpers import dict_to_url, encodeURI
-from controls.models import FinancialYear, Period
+from controls.models import FinancialYear, Period, QueuePosts
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.shortcuts import reverse
 from django.test import TestCase
 from purchases.models import PurchaseHeader, Supplier
@@ -22,6 +24,10 @@ class TranEnquiryTests(TestCase):
         cls.period = Period.objects.create(
             fy=fy, period="01", fy_and_period="202001", month_start=date(2020, 1, 31))
 
+    def setUp(self):
+        # enquiry counts are cached
+        cache.clear()
+
     def test_basic(self):
         p = PurchaseHeader.objects.create(
             type="pi",
@@ -324,4 +330,259 @@ class TranEnquiryTests(TestCase):
         self.assertIsNotNone(
             d["form"]
         )
-        # manually UI test the form
\ No newline at end of file
+        # manually UI test the form
+
+    def test_keyset_pages(self):
+        headers = [
+            PurchaseHeader.objects.create(
+                type="pi",
+                supplier=self.supplier,
+                ref=str(i),
+                period=self.period,
+                date=date.today(),
+                due_date=date.today(),
+                due=100,
+                total=100,
+                paid=0,
+                status="c"
+            )
+            for i in range(3)
+        ]
+        self.client.force_login(self.user)
+        url_as_dict = {
+            'draw': '1', 
+            'columns': {
+                0: {'data': '', 'name': '', 'searchable': 'false', 'orderable': 'false', 'search': {'value': '', 'regex': 'false'}}, 
+                1: {'data': 'supplier__name', 'name': '', 'searchable': 'true', 'orderable': 'true', 'search': {'value': '', 'regex': 'false'}}, 
+                2: {'data': 'ref', 'name': '', 'searchable': 'true', 'orderable': 'true', 'search': {'value': '', 'regex': 'false'}}, 
+            }, 
+            'order': {
+                0: {'column': '1', 'dir': 'asc'}
+            }, 
+            'start': '0', 
+            'length': '2', 
+            'search': {'value': '', 'regex': 'false'}, 
+            'supplier': '', 
+            'reference': '', 
+            'total': '', 
+            'period': '', 
+            'search_within': 'any', 
+            'start_date': '', 
+            'end_date': '', 
+            'use_adv_search': 'True'
+        }
+        response = self.client.get(
+            self.url + "?" + dict_to_url(url_as_dict),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        d = json.loads(response.content.decode("utf"))
+        self.assertEqual(
+            [tran['id'] for tran in d['data']],
+            [headers[0].pk, headers[1].pk]
+        )
+        cursor = d['cursor']
+        self.assertEqual(
+            cursor['start'],
+            2
+        )
+        # the supplier is the same for every header so the id decides the order
+        url_as_dict['start'] = '2'
+        url_as_dict['cursor'] = cursor['value']
+        response = self.client.get(
+            self.url + "?" + dict_to_url(url_as_dict),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        d = json.loads(response.content.decode("utf"))
+        self.assertEqual(
+            [tran['id'] for tran in d['data']],
+            [headers[2].pk]
+        )
+        self.assertEqual(
+            d['recordsFiltered'],
+            3
+        )
+        self.assertIsNone(
+            d['cursor']
+        )
+
+    def test_cached_response(self):
+        PurchaseHeader.objects.create(
+            type="pi",
+            supplier=self.supplier,
+            ref="1",
+            period=self.period,
+            date=date.today(),
+            due_date=date.today(),
+            due=100,
+            total=100,
+            paid=0,
+            status="c"
+        )
+        self.client.force_login(self.user)
+        url_as_dict = {
+            'draw': '1', 
+            'columns': {
+                0: {'data': '', 'name': '', 'searchable': 'false', 'orderable': 'false', 'search': {'value': '', 'regex': 'false'}}, 
+                1: {'data': 'supplier__name', 'name': '', 'searchable': 'true', 'orderable': 'true', 'search': {'value': '', 'regex': 'false'}}, 
+            }, 
+            'order': {
+                0: {'column': '1', 'dir': 'asc'}
+            }, 
+            'start': '0', 
+            'length': '10', 
+            'search': {'value': '', 'regex': 'false'}, 
+            'use_adv_search': 'True'
+        }
+        response = self.client.get(
+            self.url + "?" + dict_to_url(url_as_dict),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        etag = response["ETag"]
+        PurchaseHeader.objects.create(
+            type="pi",
+            supplier=self.supplier,
+            ref="2",
+            period=self.period,
+            date=date.today(),
+            due_date=date.today(),
+            due=100,
+            total=100,
+            paid=0,
+            status="c"
+        )
+        # not posted through the ledger so the cached response is returned
+        url_as_dict['draw'] = '2'
+        response = self.client.get(
+            self.url + "?" + dict_to_url(url_as_dict),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        d = json.loads(response.content.decode("utf"))
+        self.assertEqual(
+            d['draw'],
+            2
+        )
+        self.assertEqual(
+            len(d['data']),
+            1
+        )
+        self.assertEqual(
+            response["ETag"],
+            etag
+        )
+        response = self.client.get(
+            self.url + "?" + dict_to_url(url_as_dict),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(
+            response.status_code,
+            304
+        )
+        QueuePosts.bump_version('p')
+        response = self.client.get(
+            self.url + "?" + dict_to_url(url_as_dict),
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(
+            response.status_code,
+            200
+        )
+        d = json.loads(response.content.decode("utf"))
+        self.assertEqual(
+            len(d['data']),
+            2
+        )
+        self.assertNotEqual(
+            response["ETag"],
+            etag
+        )
+
+    def test_group_totals(self):
+        for ref, due, due_date, status in [
+            ("1", 100, date(2020, 1, 1), "c"),
+            ("2", 50, date.today() + timedelta(days=30), "c"),
+            ("3", 0, date.today(), "c"),
+            ("4", 0, date(2020, 1, 1), "v"),
+        ]:
+            PurchaseHeader.objects.create(
+                type="pi",
+                supplier=self.supplier,
+                ref=ref,
+                period=self.period,
+                date=date.today(),
+                due_date=due_date,
+                due=due,
+                total=100,
+                paid=100 - due,
+                status=status
+            )
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        group_totals = response.context["group_totals"]
+        self.assertEqual(
+            {group: totals["count"] for group, totals in group_totals.items()},
+            {"a": 3, "ap": 2, "o": 1, "p": 1}
+        )
+        self.assertEqual(
+            {group: totals["due"] for group, totals in group_totals.items()},
+            {"a": 150, "ap": 150, "o": 100, "p": 0}
+        )
+
+    def test_export_csv(self):
+        other_supplier = Supplier.objects.create(code='2', name='2')
+        for ref, supplier in [("a", self.supplier), ("b", other_supplier), ("c", self.supplier)]:
+            PurchaseHeader.objects.create(
+                type="pi",
+                supplier=supplier,
+                ref=ref,
+                period=self.period,
+                date=date(2020, 1, 1),
+                due_date=date(2020, 1, 31),
+                due=100,
+                total=100,
+                paid=0,
+                status="c"
+            )
+        self.client.force_login(self.user)
+        url_as_dict = {
+            'columns': {
+                0: {'data': '', 'name': '', 'searchable': 'false', 'orderable': 'false', 'search': {'value': '', 'regex': 'false'}}, 
+                1: {'data': 'ref', 'name': '', 'searchable': 'true', 'orderable': 'true', 'search': {'value': '', 'regex': 'false'}}, 
+            }, 
+            'order': {
+                0: {'column': '1', 'dir': 'desc'}
+            }, 
+            'search': {'value': '', 'regex': 'false'}, 
+            'supplier': self.supplier.pk, 
+            'reference': '', 
+            'total': '', 
+            'period': '', 
+            'search_within': 'any', 
+            'start_date': '', 
+            'end_date': '', 
+            'use_adv_search': 'True',
+            'export': 'csv'
+        }
+        response = self.client.get(self.url + "?" + dict_to_url(url_as_dict))
+        self.assertEqual(
+            response.status_code,
+            200
+        )
+        self.assertEqual(
+            response["Content-Type"],
+            "text/csv"
+        )
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="purchase_transactions.csv"'
+        )
+        content = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(
+            list(csv.reader(content.splitlines())),
+            [
+                ["Supplier", "Reference", "Period", "Date", "Due Date", "Total", "Paid", "Due"],
+                ["1", "c", "01 2020", "01 Jan 2020", "31 Jan 2020", "100.00", "0.00", "100.00"],
+                ["1", "a", "01 2020", "01 Jan 2020", "31 Jan 2020", "100.00", "0.00", "100.00"],
+            ]
+        )
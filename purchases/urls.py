@@ -1,16 +1,22 @@
 from django.urls import path
 
-from .views import (AgeCreditorsReport, CreateTransaction, EditTransaction,
-                    LoadPurchaseMatchingTransactions, LoadSuppliers,
-                    TransactionEnquiry, ViewTransaction, VoidTransaction)
+from .views import (AgeCreditorsByDaysReport, AgeCreditorsReport,
+                    AgeCreditorsTrend, CreateTransaction, EditTransaction,
+                    ImportTransactions, LoadPurchaseMatchingTransactions,
+                    LoadSuppliers, TransactionEnquiry, ViewTransaction,
+                    VoidTransaction)
 
 app_name = "purchases"
 urlpatterns = [
     path("create", CreateTransaction.as_view(), name="create"),
+    path("import", ImportTransactions.as_view(), name="import"),
     path("edit/<int:pk>", EditTransaction.as_view(), name="edit"),
     path("view/<int:pk>", ViewTransaction.as_view(), name="view"),
     path("void/<int:pk>", VoidTransaction.as_view(), name="void"),
     path("creditors_report", AgeCreditorsReport.as_view(), name="creditors_report"),
+    path("creditors_report_by_days", AgeCreditorsByDaysReport.as_view(),
+         name="creditors_report_by_days"),
+    path("creditors_trend", AgeCreditorsTrend.as_view(), name="creditors_trend"),
     path("load_matching_transactions", LoadPurchaseMatchingTransactions.as_view(),
          name="load_matching_transactions"),
     path("load_suppliers", LoadSuppliers.as_view(), name="load_suppliers"),
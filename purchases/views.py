@@ -6,7 +6,9 @@ from accountancy.contrib.mixins import TransactionPermissionMixin
 from accountancy.forms import (BaseVoidTransactionForm,
                                SaleAndPurchaseVoidTransactionForm)
 from accountancy.helpers import AuditTransaction
-from accountancy.views import (AgeMatchingReportMixin, BaseVoidTransaction,
+from accountancy.views import (AgeMatchingDaysReportMixin,
+                               AgeMatchingReportMixin, AgeMatchingTrendMixin,
+                               BaseImportTransactions, BaseVoidTransaction,
                                CreatePurchaseOrSalesTransaction,
                                DeleteCashBookTransMixin,
                                EditPurchaseOrSalesTransaction,
@@ -28,20 +30,22 @@ from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
                          JsonResponse)
 from django.shortcuts import get_object_or_404, redirect, render, reverse
 from django.urls import reverse_lazy
-from django.utils import timezone
 from django.views.generic import ListView
 from nominals.forms import NominalForm
-from nominals.models import Nominal, NominalTransaction
+from nominals.models import NominalTransaction
 from querystring_parser import parser
 from users.mixins import LockTransactionDuringEditMixin
 from vat.forms import VatForm
 from vat.models import Vat, VatTransaction
 
-from purchases.forms import (CreditorsForm, PurchaseHeaderForm,
+from purchases.forms import (CreditorsByDaysForm, CreditorsForm,
+                             PurchaseHeaderForm,
                              PurchaseLineForm, PurchaseTransactionSearchForm,
                              enter_lines, match)
+from purchases.imports import PurchaseImport
 from purchases.models import (PurchaseHeader, PurchaseLine, PurchaseMatching,
                               Supplier)
+from purchases.services import PurchaseService
 
 
 class SupplierMixin:
@@ -87,15 +91,15 @@ class CreateTransaction(
     }
     template_name = "purchases/create.html"
     success_url = reverse_lazy("purchases:transaction_enquiry")
-    nominal_model = Nominal
-    nominal_transaction_model = NominalTransaction
-    vat_transaction_model = VatTransaction
+    service_class = PurchaseService
     module = "PL"
-    control_nominal_name = "Purchase Ledger Control"
-    cash_book_transaction_model = CashBookTransaction
     default_type = "pi"
 
 
+class ImportTransactions(LoginRequiredMixin, BaseImportTransactions):
+    importer_class = PurchaseImport
+
+
 class EditTransaction(
         LoginRequiredMixin,
         TransactionPermissionMixin,
@@ -125,12 +129,9 @@ class EditTransaction(
     }
     template_name = "purchases/edit.html"
     success_url = reverse_lazy("purchases:transaction_enquiry")
-    nominal_model = Nominal
+    service_class = PurchaseService
     nominal_transaction_model = NominalTransaction
     module = "PL"
-    control_nominal_name = "Purchase Ledger Control"
-    cash_book_transaction_model = CashBookTransaction
-    vat_transaction_model = VatTransaction
 
 
 class ViewTransaction(LoginRequiredMixin, TransactionPermissionMixin, SaleAndPurchaseViewTransaction):
@@ -204,6 +205,7 @@ class TransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, SalesAndPu
     contact_name = "supplier"
     template_name = "purchases/transactions.html"
     permission_required = 'purchases.view_transactions_enquiry'
+    export_filename = "purchase_transactions"
 
     def load_page(self):
         context_data = super().load_page()
@@ -236,24 +238,6 @@ class TransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, SalesAndPu
             queryset = queryset.filter(supplier=supplier)
         return queryset
 
-    def get_querysets(self):
-        group = self.request.GET.get("group", 'a')
-        # add querysets to the instance
-        # in context_data get the summed value for each
-        self.all_queryset = PurchaseHeader.objects.all()
-        self.awaiting_payment_queryset = PurchaseHeader.objects.exclude(due=0)
-        self.overdue_queryset = PurchaseHeader.objects.exclude(
-            due=0).filter(due_date__lt=timezone.now())
-        self.paid_queryset = PurchaseHeader.objects.filter(due=0)
-        if group == "a":
-            return self.all_queryset
-        elif group == "ap":
-            return self.awaiting_payment_queryset
-        elif group == "o":
-            return self.overdue_queryset
-        elif group == "p":
-            return self.paid_queryset
-
 
 class AgeCreditorsReport(LoginRequiredMixin, PermissionRequiredMixin, AgeMatchingReportMixin):
     model = PurchaseHeader
@@ -264,9 +248,23 @@ class AgeCreditorsReport(LoginRequiredMixin, PermissionRequiredMixin, AgeMatchin
     contact_field_name = "supplier"
     permission_required = 'purchases.view_age_creditors_report'
     module_setting_name = "purchases_period"
+    export_filename = "aged_creditors"
 
     def load_page(self, **kwargs):
         context = super().load_page(**kwargs)
         context["contact_form"] = ModalContactForm(
             action=reverse_lazy("contacts:create"), prefix="contact")
         return context
+
+
+class AgeCreditorsByDaysReport(AgeMatchingDaysReportMixin, AgeCreditorsReport):
+    filter_form_class = CreditorsByDaysForm
+    export_filename = "aged_creditors_by_days"
+
+
+class AgeCreditorsTrend(LoginRequiredMixin, PermissionRequiredMixin, AgeMatchingTrendMixin):
+    model = PurchaseHeader
+    match_model = PurchaseMatching
+    contact_field_name = "supplier"
+    permission_required = 'purchases.view_age_creditors_report'
+    module_setting_name = "purchases_period"
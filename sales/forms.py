@@ -1,7 +1,8 @@
 from accountancy.fields import (ModelChoiceFieldChooseIterator,
                                 ModelChoiceIteratorWithFields,
                                 RootAndLeavesModelChoiceIterator)
-from accountancy.forms import (BaseAjaxFormMixin, BaseTransactionHeaderForm,
+from accountancy.forms import (AgedByDaysFormMixin, BaseAjaxFormMixin,
+                               BaseTransactionHeaderForm,
                                SaleAndPurchaseHeaderFormMixin,
                                SaleAndPurchaseLineForm,
                                SaleAndPurchaseLineFormset,
@@ -166,6 +167,11 @@ class DebtorsForm(CreditorsForm):
             "from_customer": {}
         }
 
+
+class DebtorsByDaysForm(AgedByDaysFormMixin, DebtorsForm):
+    pass
+
+
 class SaleTransactionSearchForm(BaseAjaxFormMixin, SalesAndPurchaseTransactionSearchForm):
     """
     This is not a model form.  The Meta attribute is only for the Ajax
@@ -0,0 +1,19 @@
+from accountancy.imports import TransactionImport
+from cashbook.models import CashBookTransaction
+from nominals.models import Nominal, NominalTransaction
+from vat.models import VatTransaction
+
+from sales.forms import SaleHeaderForm
+from sales.models import SaleHeader, SaleLine
+
+
+class SaleImport(TransactionImport):
+    header_model = SaleHeader
+    line_model = SaleLine
+    header_form = SaleHeaderForm
+    header_form_kwargs = {"contact_model_name": "customer"}
+    nominal_model = Nominal
+    nominal_transaction_model = NominalTransaction
+    vat_transaction_model = VatTransaction
+    cash_book_transaction_model = CashBookTransaction
+    control_nominal_name = "Sales Ledger Control"
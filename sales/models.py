@@ -4,11 +4,14 @@ from accountancy.mixins import (CashBookEntryMixin,
                                 ControlAccountInvoiceTransactionMixin,
                                 ControlAccountPaymentTransactionMixin,
                                 VatTransactionMixin)
-from accountancy.models import (MatchedHeaders, Transaction, TransactionHeader,
+from accountancy.models import (MatchedHeaders, MatchedHeadersAllocation,
+                                Transaction, TransactionHeader,
                                 TransactionLine)
 from contacts.models import Contact
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models import Q
 from django.shortcuts import reverse
 from simple_history import register
 from vat.models import Vat
@@ -138,6 +141,9 @@ class SaleHeader(ModuleTransactions, TransactionHeader):
     matched_to = models.ManyToManyField(
         'self', through='SaleMatching', symmetrical=False)
 
+    module = "SL"
+    contact_field = "customer"
+
     class Meta:
         permissions = [
             # enquiry perms
@@ -194,6 +200,17 @@ class SaleHeader(ModuleTransactions, TransactionHeader):
             ("void_receipt_transaction", "Can void receipt"),
             ("void_refund_transaction", "Can void refund"),
         ]
+        indexes = [
+            # the awaiting payment and overdue tabs of the enquiry
+            models.Index(
+                fields=["due_date"],
+                condition=~Q(due=0),
+                name="saleheader_outstanding_idx"
+            ),
+            # the reference search of the enquiry
+            GinIndex(fields=["ref"], opclasses=["gin_trgm_ops"],
+                     name="saleheader_ref_trgm_idx")
+        ]
 
     @property
     def cashbook_transaction_factor(self):
@@ -259,6 +276,20 @@ class SaleLine(ModuleTransactions, TransactionLine):
         ]
 
 
+class SaleAllocation(MatchedHeadersAllocation):
+    header = models.ForeignKey(
+        SaleHeader,
+        on_delete=models.CASCADE,
+        related_name="allocations"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['header', 'period'], name="sales_allocation_unique")
+        ]
+
+
 class SaleMatching(MatchedHeaders):
     # matched_by is the header record through which
     # all the other transactions were matched
@@ -288,3 +319,5 @@ class SaleMatching(MatchedHeaders):
     # So we can do for two trans, t1 and t2
     # t1.matched_to_these.all()
     # t2.matched_by_these.all()
+
+    allocation_model = SaleAllocation
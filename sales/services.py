@@ -0,0 +1,19 @@
+from accountancy.services import TransactionService
+from cashbook.models import CashBookTransaction
+from nominals.models import Nominal, NominalTransaction
+from vat.models import VatTransaction
+
+from sales.imports import SaleImport
+from sales.models import SaleHeader, SaleLine, SaleMatching
+
+
+class SaleService(TransactionService):
+    header_model = SaleHeader
+    line_model = SaleLine
+    match_model = SaleMatching
+    nominal_model = Nominal
+    nominal_transaction_model = NominalTransaction
+    vat_transaction_model = VatTransaction
+    cash_book_transaction_model = CashBookTransaction
+    control_nominal_name = "Sales Ledger Control"
+    importer_class = SaleImport
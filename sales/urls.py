@@ -1,16 +1,22 @@
 from django.urls import path
 
-from .views import (AgeDebtorsReport, CreateTransaction, EditTransaction,
-                    LoadCustomers, LoadSaleMatchingTransactions,
-                    TransactionEnquiry, ViewTransaction, VoidTransaction)
+from .views import (AgeDebtorsByDaysReport, AgeDebtorsReport,
+                    AgeDebtorsTrend, CreateTransaction, EditTransaction,
+                    ImportTransactions, LoadCustomers,
+                    LoadSaleMatchingTransactions, TransactionEnquiry,
+                    ViewTransaction, VoidTransaction)
 
 app_name = "sales"
 urlpatterns = [
     path("create", CreateTransaction.as_view(), name="create"),
+    path("import", ImportTransactions.as_view(), name="import"),
     path("edit/<int:pk>", EditTransaction.as_view(), name="edit"),
     path("view/<int:pk>", ViewTransaction.as_view(), name="view"),
     path("void/<int:pk>", VoidTransaction.as_view(), name="void"),
     path("debtors_report", AgeDebtorsReport.as_view(), name="debtors_report"),
+    path("debtors_report_by_days", AgeDebtorsByDaysReport.as_view(),
+         name="debtors_report_by_days"),
+    path("debtors_trend", AgeDebtorsTrend.as_view(), name="debtors_trend"),
 
     path("load_matching_transactions", LoadSaleMatchingTransactions.as_view(),
          name="load_matching_transactions"),
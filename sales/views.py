@@ -1,7 +1,8 @@
 from accountancy.contrib.mixins import TransactionPermissionMixin
 from accountancy.forms import (BaseVoidTransactionForm,
                                SaleAndPurchaseVoidTransactionForm)
-from accountancy.views import (BaseVoidTransaction,
+from accountancy.views import (AgeMatchingDaysReportMixin,
+                               BaseImportTransactions, BaseVoidTransaction,
                                CreatePurchaseOrSalesTransaction,
                                DeleteCashBookTransMixin,
                                EditPurchaseOrSalesTransaction,
@@ -16,19 +17,19 @@ from controls.mixins import QueuePostsMixin
 from django.contrib.auth.mixins import (LoginRequiredMixin,
                                         PermissionRequiredMixin)
 from django.urls import reverse_lazy
-from django.utils import timezone
 from nominals.forms import NominalForm
-from nominals.models import Nominal, NominalTransaction
-from purchases.views import AgeCreditorsReport
+from nominals.models import NominalTransaction
+from purchases.views import AgeCreditorsReport, AgeCreditorsTrend
 from users.mixins import LockTransactionDuringEditMixin
 from vat.forms import VatForm
 from vat.models import VatTransaction
 
-from sales.forms import (DebtorsForm, SaleHeaderForm, SaleLineForm,
-                         SaleTransactionSearchForm, enter_lines, match)
+from sales.forms import (DebtorsByDaysForm, DebtorsForm, SaleHeaderForm,
+                         SaleLineForm, SaleTransactionSearchForm,
+                         enter_lines, match)
+from sales.imports import SaleImport
 from sales.models import Customer, SaleHeader, SaleLine, SaleMatching
-
-SALES_CONTROL_ACCOUNT = "Sales Ledger Control"
+from sales.services import SaleService
 
 
 class CustomerMixin:
@@ -74,13 +75,13 @@ class CreateTransaction(
     }
     template_name = "sales/create.html"
     success_url = reverse_lazy("sales:transaction_enquiry")
-    nominal_model = Nominal
-    nominal_transaction_model = NominalTransaction
+    service_class = SaleService
     module = "SL"
-    control_nominal_name = SALES_CONTROL_ACCOUNT
-    cash_book_transaction_model = CashBookTransaction
     default_type = "si"
-    vat_transaction_model = VatTransaction
+
+
+class ImportTransactions(LoginRequiredMixin, BaseImportTransactions):
+    importer_class = SaleImport
 
 
 class EditTransaction(
@@ -112,12 +113,9 @@ class EditTransaction(
     }
     template_name = "sales/edit.html"
     success_url = reverse_lazy("sales:transaction_enquiry")
-    nominal_model = Nominal
+    service_class = SaleService
     nominal_transaction_model = NominalTransaction
     module = "SL"
-    control_nominal_name = SALES_CONTROL_ACCOUNT
-    cash_book_transaction_model = CashBookTransaction
-    vat_transaction_model = VatTransaction
 
 
 class ViewTransaction(LoginRequiredMixin, TransactionPermissionMixin, SaleAndPurchaseViewTransaction):
@@ -189,6 +187,7 @@ class TransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, SalesAndPu
     contact_name = "customer"
     template_name = "sales/transactions.html"
     permission_required = 'sales.view_transactions_enquiry'
+    export_filename = "sale_transactions"
 
     def load_page(self):
         context_data = super().load_page()
@@ -203,7 +202,7 @@ class TransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, SalesAndPu
 
     def get_queryset(self, **kwargs):
         return (
-            self.get_querysets(**kwargs)
+            self.get_querysets()
             .select_related('customer__name')
             .select_related('period__fy_and_period')
             .all()
@@ -220,24 +219,6 @@ class TransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, SalesAndPu
             queryset = queryset.filter(customer=customer)
         return queryset
 
-    def get_querysets(self, **kwargs):
-        group = self.request.GET.get("group", 'a')
-        # add querysets to the instance
-        # in context_data get the summed value for each
-        self.all_queryset = SaleHeader.objects.all()
-        self.awaiting_payment_queryset = SaleHeader.objects.exclude(due=0)
-        self.overdue_queryset = SaleHeader.objects.exclude(
-            due=0).filter(due_date__lt=timezone.now())
-        self.paid_queryset = SaleHeader.objects.filter(due=0)
-        if group == "a":
-            return self.all_queryset
-        elif group == "ap":
-            return self.awaiting_payment_queryset
-        elif group == "o":
-            return self.overdue_queryset
-        elif group == "p":
-            return self.paid_queryset
-
 
 class AgeDebtorsReport(AgeCreditorsReport):
     model = SaleHeader
@@ -246,4 +227,18 @@ class AgeDebtorsReport(AgeCreditorsReport):
     contact_range_field_names = ['from_customer', 'to_customer']
     contact_field_name = "customer"
     permission_required = 'sales.view_aged_debtors_report'
-    module_setting_name = "sales_period"
\ No newline at end of file
+    module_setting_name = "sales_period"
+    export_filename = "aged_debtors"
+
+
+class AgeDebtorsByDaysReport(AgeMatchingDaysReportMixin, AgeDebtorsReport):
+    filter_form_class = DebtorsByDaysForm
+    export_filename = "aged_debtors_by_days"
+
+
+class AgeDebtorsTrend(AgeCreditorsTrend):
+    model = SaleHeader
+    match_model = SaleMatching
+    contact_field_name = "customer"
+    permission_required = 'sales.view_aged_debtors_report'
+    module_setting_name = "sales_period"
@@ -0,0 +1,61 @@
+# Generated by Django 3.1.14 on 2026-10-17 07:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_summaries(apps, schema_editor):
+    VatTransaction = apps.get_model('vat', 'VatTransaction')
+    VatTransactionSummary = apps.get_model('vat', 'VatTransactionSummary')
+    rows = (
+        VatTransaction.objects
+        .values('module', 'header', 'ref', 'period', 'date', 'vat_type')
+        .annotate(goods_total=models.Sum('goods'), vat_total=models.Sum('vat'))
+        .order_by()
+    )
+    VatTransactionSummary.objects.bulk_create(
+        [
+            VatTransactionSummary(
+                module=row["module"],
+                header=row["header"],
+                ref=row["ref"],
+                period_id=row["period"],
+                date=row["date"],
+                vat_type=row["vat_type"],
+                goods=row["goods_total"],
+                vat=row["vat_total"]
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('controls', '0002_queueposts_version'),
+        ('vat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VatTransactionSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('module', models.CharField(max_length=3)),
+                ('header', models.PositiveIntegerField()),
+                ('ref', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('vat_type', models.CharField(choices=[('i', 'Input'), ('o', 'Output')], max_length=2)),
+                ('goods', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('vat', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('period', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='controls.period')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vattransactionsummary',
+            index=models.Index(fields=['module', 'header'], name='vat_summary_header_idx'),
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
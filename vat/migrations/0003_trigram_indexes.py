@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-17 10:12
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vat', '0002_vattransactionsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vat',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['code'], name='vat_code_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='vattransactionsummary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ref'], name='vat_summary_ref_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from accountancy.mixins import AuditMixin
-from accountancy.models import MultiLedgerTransactions
+from accountancy.models import MultiLedgerTransactions, TransactionSummary
 from django.apps import apps
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from simple_history import register
 from django.shortcuts import reverse
@@ -16,6 +17,13 @@ class Vat(AuditMixin, models.Model):
     )
     registered = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # the vat code autocomplete
+            GinIndex(fields=["code"], opclasses=["gin_trgm_ops"],
+                     name="vat_code_trgm_idx")
+        ]
+
     def __str__(self):
         return f"{self.code} - {self.name} - {self.rate}%"
 
@@ -82,4 +90,35 @@ class VatTransaction(MultiLedgerTransactions):
 
     def update_details_from_header(self, header):
         super().update_details_from_header(header)
-        self.tran_type = header.type
\ No newline at end of file
+        self.tran_type = header.type
+
+
+class VatTransactionSummary(TransactionSummary):
+    """
+    The vat transactions per header and vat type for the vat transaction enquiry
+    """
+    vat_type = models.CharField(max_length=2, choices=VatTransaction.vat_types)
+    goods = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+        default=0
+    )
+    vat = models.DecimalField(
+        decimal_places=2,
+        max_digits=14,
+        default=0
+    )
+
+    grain = ["vat_type"]
+    sums = {"goods": "goods", "vat": "vat"}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['module', 'header'],
+                         name="vat_summary_header_idx"),
+            GinIndex(fields=["ref"], opclasses=["gin_trgm_ops"],
+                     name="vat_summary_ref_trgm_idx")
+        ]
+
+
+VatTransaction.summary_model = VatTransactionSummary
\ No newline at end of file
@@ -5,7 +5,7 @@ from django.conf import settings
 from django.contrib.auth.mixins import (LoginRequiredMixin,
                                         PermissionRequiredMixin)
 from django.contrib.postgres.search import TrigramSimilarity
-from django.db.models import Sum
+from django.db.models import F
 from django.http import JsonResponse
 from django.template.context_processors import csrf
 from django.urls import reverse_lazy
@@ -13,7 +13,7 @@ from django.views.generic import CreateView, DetailView, ListView, UpdateView
 from users.mixins import LockDuringEditMixin
 
 from vat.forms import VatForm, VatTransactionSearchForm
-from vat.models import Vat, VatTransaction
+from vat.models import Vat, VatTransaction, VatTransactionSummary
 
 
 class VatTransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, VatTransList):
@@ -34,12 +34,13 @@ class VatTransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, VatTran
     filter_form_class = VatTransactionSearchForm
     template_name = "vat/transactions.html"
     column_transformers = {
-        "vat_type": lambda t: {vat_type[0]: vat_type[1] for vat_type in VatTransaction.vat_types}[t],
+        "vat_type": dict(VatTransaction.vat_types).__getitem__,
         "date": lambda d: d.strftime('%d %b %Y'),
         "period__fy_and_period": lambda p: (p[4:] + " " + p[:4]) if p else ""
     }
     row_identifier = "header"
     permission_required = 'vat.view_transactions_enquiry'
+    export_filename = "vat_transactions"
 
     def load_page(self, **kwargs):
         ctx = super().load_page(**kwargs)
@@ -55,14 +56,14 @@ class VatTransactionEnquiry(LoginRequiredMixin, PermissionRequiredMixin, VatTran
 
     def get_queryset(self, **kwargs):
         q = (
-            VatTransaction.objects
-            .select_related('period__fy_and_period')
-            .all()
+            VatTransactionSummary.objects
             .values(
+                'id',
                 *[field[0] for field in self.fields[:-2]]
             )
-            .annotate(Sum("goods"))
-            .annotate(Sum("vat"))
+            # keep the names of the sums the enquiry used when it grouped the transactions
+            .annotate(goods__sum=F("goods"))
+            .annotate(vat__sum=F("vat"))
             .order_by(*self.order_by())
         )
         return q
@@ -78,9 +79,11 @@ class LoadVatCodes(LoginRequiredMixin, ListView):
     def get_queryset(self):
         if q := self.request.GET.get('q'):
             return (
-                self.get_model().objects.annotate(
-                    similarity=TrigramSimilarity('code', q),
-                ).filter(similarity__gt=0.3).order_by('-similarity')
+                self.get_model().objects
+                # the % operator finds the candidates through the trigram index
+                .filter(code__trigram_similar=q)
+                .annotate(similarity=TrigramSimilarity('code', q))
+                .order_by('-similarity')
             )
         return self.get_model().objects.all()
 